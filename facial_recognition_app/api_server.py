@@ -1,106 +1,951 @@
+import base64
+import binascii
 import cv2
+import functools
+import numpy as np
+import os
+import sys
 import threading
 import time
-from flask import Flask, jsonify
+from collections import deque
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
-from src.face_detector import FaceDetector
-from src.camera_manager import CameraManager
+
+# Adiciona o diretório src ao path para importar os módulos
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from face_detector import FaceDetector
+from face_encoder import FaceEncoder
+from camera_manager import CameraManager
+from detector_pool import DetectorPool
+from motion_gate import MotionGate
+from face_quality import BestShotSelector, FaceQualityScorer
+from face_gallery import FaceGallery
+from identity_cache import IdentityCache
+from presence_analytics import PresenceAnalytics
+from clip_recorder import ClipRecorder
+from face_redactor import FaceRedactor
+from enrollment import STATUS_DUPLICATE, STATUS_OK, encode_enrollment_image, new_encodings
+from event_publisher import EventPublisher, MqttTransport, UdpMulticastTransport
+from pipeline import DEFAULT_PIPELINES, build_pipeline, load_pipeline_config
+from reid_fusion import CrossCameraFusion
+from result_codec import MIME_JSON, encode_payload, negotiate, payload_faces
+from sampling_profiler import SamplingProfiler
+from memory_monitor import MemoryMonitor, release_free_memory
 
 app = Flask(__name__)
 CORS(app)  # Habilita CORS para aceitar requisições de qualquer origem
 
+# Configurações de captura: índice da câmera ou arquivo/URL de vídeo,
+# formatos em ordem de preferência (vazio mantém o padrão do driver),
+# frames no buffer do driver e backend (auto, v4l2, dshow, msmf, ffmpeg...)
+CAMERA_SOURCE = os.environ.get("CAMERA_SOURCE", "0")
+CAMERA_WIDTH = int(os.environ.get("CAMERA_WIDTH", "640"))
+CAMERA_HEIGHT = int(os.environ.get("CAMERA_HEIGHT", "480"))
+CAMERA_FPS = int(os.environ.get("CAMERA_FPS", "30"))
+CAMERA_FOURCC = [f for f in os.environ.get("CAMERA_FOURCC", "MJPG,YUYV").split(",") if f]
+CAMERA_BUFFER_SIZE = int(os.environ.get("CAMERA_BUFFER_SIZE", "1"))
+CAMERA_BACKEND = os.environ.get("CAMERA_BACKEND", "auto")
+# Thread de captura: obtém frames continuamente e só decodifica os que a detecção usa
+CAMERA_CAPTURE_THREAD = os.environ.get("CAMERA_CAPTURE_THREAD", "1") != "0"
+
+# Configurações do pool e da pausa da câmera
+DETECTOR_POOL_SIZE = int(os.environ.get("DETECTOR_POOL_SIZE", "1"))
+# Segundos com a detecção parada até liberar a câmera por completo
+# (0 libera imediatamente; valor negativo mantém a câmera sempre aberta)
+CAMERA_IDLE_TIMEOUT = float(os.environ.get("CAMERA_IDLE_TIMEOUT", "300"))
+IDLE_POLL_INTERVAL = 0.1
+
+# Estratégia de detecção: short (padrão), full (longo alcance), tiled
+# (recortes sobrepostos) ou scheduled (longo alcance a cada N frames)
+DETECTION_MODE = os.environ.get("DETECTION_MODE", "short")
+DETECTION_TILE_SIZE = int(os.environ.get("DETECTION_TILE_SIZE", "480"))
+DETECTION_WORKERS = int(os.environ.get("DETECTION_WORKERS", "1"))
+FULL_RANGE_INTERVAL = int(os.environ.get("FULL_RANGE_INTERVAL", "5"))
+
+# Estágios do pipeline de detecção (arquivo TOML/YAML/JSON; seção 'api' se existir)
+PIPELINE_CONFIG = os.environ.get("PIPELINE_CONFIG")
+PIPELINE_STAGES = (load_pipeline_config(PIPELINE_CONFIG, "api") if PIPELINE_CONFIG
+                   else DEFAULT_PIPELINES["api"])
+# Sobrecarga: latência máxima (s) da captura à publicação e degradação automática
+# dos estágios opcionais (codificação, malha, desenho, streaming) quando excedida
+PIPELINE_MAX_LATENCY = float(os.environ.get("PIPELINE_MAX_LATENCY", "0.5"))
+PIPELINE_SHEDDING = os.environ.get("PIPELINE_SHEDDING", "1") != "0"
+# Opcional: fração de frames da câmera pulados a partir da qual há sobrecarga
+# (a captura pula frames por projeto quando a inferência é mais lenta que a câmera)
+PIPELINE_MAX_SKIP_RATIO = float(os.environ["PIPELINE_MAX_SKIP_RATIO"]) \
+    if os.environ.get("PIPELINE_MAX_SKIP_RATIO") else None
+
+# Configurações do filtro de movimento (pula a inferência em cenas estáticas)
+MOTION_GATE_ENABLED = os.environ.get("MOTION_GATE", "1") != "0"
+MOTION_PIXEL_THRESHOLD = int(os.environ.get("MOTION_PIXEL_THRESHOLD", "25"))
+MOTION_MIN_CHANGED_RATIO = float(os.environ.get("MOTION_MIN_CHANGED_RATIO", "0.01"))
+MOTION_RECHECK_INTERVAL = float(os.environ.get("MOTION_RECHECK_INTERVAL", "2.0"))
+
+# Seleção da melhor captura por trilha antes da codificação
+BEST_SHOT_WINDOW = float(os.environ.get("BEST_SHOT_WINDOW", "1.5"))
+BEST_SHOT_MIN_QUALITY = float(os.environ.get("BEST_SHOT_MIN_QUALITY", "0.45"))
+
+# Galeria de identidades: armazenamento int8 (padrão), float16 ou float32
+GALLERY_STORAGE = os.environ.get("GALLERY_STORAGE", "int8")
+# Arquivo da galeria (carregado na inicialização e regravado a cada cadastro)
+GALLERY_PATH = os.environ.get("GALLERY_PATH")
+ENROLL_MIN_QUALITY = float(os.environ.get("ENROLL_MIN_QUALITY", "0.5"))
+MAX_ENROLL_IMAGES = 20
+
+# Cache de identidade por trilha (evita reidentificar a mesma face a cada frame)
+IDENTITY_CACHE_SIZE = 256
+IDENTITY_CACHE_TTL = float(os.environ.get("IDENTITY_CACHE_TTL", "30"))
+IDENTITY_REVERIFY_INTERVAL = float(os.environ.get("IDENTITY_REVERIFY_INTERVAL", "10"))
+IDENTITY_DRIFT_THRESHOLD = float(os.environ.get("IDENTITY_DRIFT_THRESHOLD", "0.8"))
+
+# Histórico de presença (/api/stats): retenção em memória, arquivo e intervalo de gravação
+PRESENCE_RETENTION = float(os.environ.get("PRESENCE_RETENTION", "86400"))
+PRESENCE_PATH = os.environ.get("PRESENCE_PATH")
+PRESENCE_PERSIST_INTERVAL = float(os.environ.get("PRESENCE_PERSIST_INTERVAL", "60"))
+DEFAULT_STATS_WINDOW = 300.0
+
+# Fusão entre câmeras (/api/fusion): esta câmera entra como CAMERA_ID e outras
+# instâncias enviam suas trilhas por POST /api/fusion/tracks; a mesma pessoa
+# vista por várias câmeras (correlação >= FUSION_THRESHOLD dentro de
+# FUSION_WINDOW segundos) é contada uma vez
+CAMERA_ID = os.environ.get("CAMERA_ID", "local")
+FUSION_THRESHOLD = float(os.environ.get("FUSION_THRESHOLD", "0.6"))
+FUSION_WINDOW = float(os.environ.get("FUSION_WINDOW", "60"))
+FUSION_PRESENCE_TIMEOUT = float(os.environ.get("FUSION_PRESENCE_TIMEOUT", "5"))
+FUSION_MAX_IDENTITIES = int(os.environ.get("FUSION_MAX_IDENTITIES", "1024"))
+FUSION_MAX_TRACKS = int(os.environ.get("FUSION_MAX_TRACKS", "4096"))
+MAX_FUSION_TRACKS_PER_REQUEST = 256
+
+# Gravação de clipes disparada por faces (desligada sem CLIP_DIR); CLIP_REDACT
+# (pixelate ou blur) anonimiza as faces antes da compressão
+CLIP_DIR = os.environ.get("CLIP_DIR")
+CLIP_PRE_ROLL = float(os.environ.get("CLIP_PRE_ROLL", "5"))
+CLIP_POST_ROLL = float(os.environ.get("CLIP_POST_ROLL", "5"))
+CLIP_FPS = float(os.environ.get("CLIP_FPS", "10"))
+CLIP_BUFFER_MB = float(os.environ.get("CLIP_BUFFER_MB", "32"))
+CLIP_REDACT = os.environ.get("CLIP_REDACT")
+
+# Profiler por amostragem (/api/profile/start|stop): amostras por segundo e
+# duração máxima de uma execução esquecida ligada
+PROFILE_RATE = float(os.environ.get("PROFILE_RATE", "100"))
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", "300"))
+
+# Orçamento de memória (RSS, 0 apenas mede): acima dele os detectores ociosos
+# são recriados e, se não bastar, a detecção é reiniciada
+MEMORY_BUDGET_MB = float(os.environ.get("MEMORY_BUDGET_MB", "0"))
+MEMORY_CHECK_INTERVAL = float(os.environ.get("MEMORY_CHECK_INTERVAL", "30"))
+
+# Publicação de eventos para controladores IoT (desligada se nada for configurado)
+MQTT_HOST = os.environ.get("MQTT_HOST")
+MQTT_PORT = int(os.environ.get("MQTT_PORT", "1883"))
+MQTT_TOPIC_PREFIX = os.environ.get("MQTT_TOPIC_PREFIX", "facial_recognition")
+UDP_MULTICAST_GROUP = os.environ.get("UDP_MULTICAST_GROUP")
+UDP_MULTICAST_PORT = int(os.environ.get("UDP_MULTICAST_PORT", "5007"))
+EVENT_BATCH_INTERVAL = float(os.environ.get("EVENT_BATCH_INTERVAL", "0.5"))
+
 # Variáveis globais para armazenar o estado da detecção
 face_detection_data = {
     "faces_detected": False,
     "face_count": 0,
     "timestamp": None,
     "last_detection": None,
-    "camera_active": False
+    "camera_active": False,
+    "sequence": 0,
+    "frame_size": None,
+    "faces": []
 }
 
+# Últimos resultados publicados, usados como base da codificação em delta
+DETECTION_HISTORY_SIZE = 32
+detection_history = deque(maxlen=DETECTION_HISTORY_SIZE)
+
 # Instâncias globais
 camera_manager = None
 face_detector = None
 detection_thread = None
-stop_detection = False
+detection_pipeline = None
+event_publisher = None
+detector_pool = DetectorPool(size=DETECTOR_POOL_SIZE, factory=functools.partial(
+    FaceDetector,
+    detection_mode=DETECTION_MODE,
+    detection_options={
+        'tile_size': DETECTION_TILE_SIZE,
+        'workers': DETECTION_WORKERS,
+        'full_range_interval': FULL_RANGE_INTERVAL
+    }
+))
+motion_gate = MotionGate(
+    pixel_threshold=MOTION_PIXEL_THRESHOLD,
+    min_changed_ratio=MOTION_MIN_CHANGED_RATIO,
+    recheck_interval=MOTION_RECHECK_INTERVAL
+) if MOTION_GATE_ENABLED else None
+best_shot_selector = BestShotSelector(window=BEST_SHOT_WINDOW, min_quality=BEST_SHOT_MIN_QUALITY)
+if GALLERY_PATH and os.path.exists(GALLERY_PATH):
+    face_gallery = FaceGallery.load(GALLERY_PATH)
+else:
+    face_gallery = FaceGallery(storage=GALLERY_STORAGE)
+identity_cache = IdentityCache(
+    face_gallery.identify,
+    max_entries=IDENTITY_CACHE_SIZE,
+    ttl=IDENTITY_CACHE_TTL,
+    reverify_interval=IDENTITY_REVERIFY_INTERVAL,
+    drift_threshold=IDENTITY_DRIFT_THRESHOLD
+)
+presence_analytics = PresenceAnalytics(
+    retention=PRESENCE_RETENTION,
+    path=PRESENCE_PATH,
+    persist_interval=PRESENCE_PERSIST_INTERVAL
+)
+fusion = CrossCameraFusion(
+    threshold=FUSION_THRESHOLD,
+    window=FUSION_WINDOW,
+    presence_timeout=FUSION_PRESENCE_TIMEOUT,
+    max_identities=FUSION_MAX_IDENTITIES,
+    max_tracks=FUSION_MAX_TRACKS,
+    # Fixo no tamanho do codificador local: envios de outro tamanho são recusados
+    dimensions=FaceEncoder().dimensions
+)
+clip_recorder = ClipRecorder(
+    CLIP_DIR,
+    pre_roll=CLIP_PRE_ROLL,
+    post_roll=CLIP_POST_ROLL,
+    record_fps=CLIP_FPS,
+    max_buffer_bytes=int(CLIP_BUFFER_MB * 1024 * 1024),
+    redactor=FaceRedactor(mode=CLIP_REDACT) if CLIP_REDACT else None
+) if CLIP_DIR else None
 
+profiler = SamplingProfiler(rate=PROFILE_RATE, max_duration=PROFILE_MAX_SECONDS)
 
-def start_face_detection():
+# Detector próprio do cadastro (fotos avulsas), criado no primeiro uso
+enroll_detector = None
+enroll_scorer = FaceQualityScorer()
+enroll_lock = threading.Lock()
+
+
+def recycle_detectors():
     """
-    Inicia a detecção facial em uma thread separada.
+    Recria os detectores ociosos do pool e libera o detector do cadastro
+    (recriado no próximo uso). Ação 'recycle' do orçamento de memória.
     """
-    global camera_manager, face_detector, detection_thread, stop_detection
+    global enroll_detector
     
-    stop_detection = False
-    
-    # Inicializa os componentes
-    camera_manager = CameraManager()
-    face_detector = FaceDetector()
+    with enroll_lock:
+        if enroll_detector is not None:
+            enroll_detector.release()
+            enroll_detector = None
+    detector_pool.recycle()
+
+
+def restart_detection():
+    """
+    Reinício controlado da detecção: libera câmera e detector, recria os
+    detectores e retoma a detecção se estava ativa. Ação 'restart' do
+    orçamento de memória.
+    """
+    global resume_after_restart
     
-    if not camera_manager.start_camera():
-        return False
+    # O estado é lido e a detecção parada sob o mesmo lock: um /api/stop
+    # durante o reinício (que zera resume_after_restart) não é desfeito
+    with state_lock:
+        resume_after_restart = detection_active.is_set()
+        detection_active.clear()
+        face_detection_data["camera_active"] = False
+        release_resources()
+    # O detector liberado só volta ao pool quando a thread termina: recicla depois dela
+    wait_retired_thread()
+    recycle_detectors()
+    release_free_memory()
+    with state_lock:
+        resume = resume_after_restart and not detection_active.is_set()
+        resume_after_restart = False
+    if resume:
+        start_face_detection()
+
+
+memory_monitor = MemoryMonitor(
+    budget_bytes=int(MEMORY_BUDGET_MB * 1024 * 1024),
+    check_interval=MEMORY_CHECK_INTERVAL,
+    recycle=recycle_detectors,
+    restart=restart_detection
+)
+
+# Estado de execução: a thread de detecção fica ociosa enquanto o evento
+# estiver desligado e termina quando a geração muda (recursos liberados)
+detection_active = threading.Event()
+detection_generation = 0
+paused_since = None
+# Retomar a detecção ao fim de restart_detection (cancelado por um stop no meio)
+resume_after_restart = False
+state_lock = threading.Lock()
+
+# Funções chamadas (na thread de detecção) a cada novo resultado
+detection_listeners = [presence_analytics.on_detection]
+# Consumidores de streaming (broadcaster ASGI/SSE, eventos): com o streaming
+# degradado pela sobrecarga, recebem só parte dos resultados
+stream_listeners = []
+
+
+def start_face_detection():
+    """
+    Inicia (ou retoma) a detecção facial em uma thread separada.
     
-    # Inicia a thread de detecção
-    detection_thread = threading.Thread(target=detection_loop, daemon=True)
-    detection_thread.start()
+    Se a câmera estiver apenas pausada, a captura é retomada sem reabrir o
+    dispositivo; o detector vem do pool de detectores pré-aquecidos.
+    """
+    global camera_manager, face_detector, detection_thread, paused_since
     
-    face_detection_data["camera_active"] = True
-    return True
+    # Uma thread de uma geração encerrada ainda pode estar com a câmera aberta
+    wait_retired_thread()
+    with state_lock:
+        if camera_manager is not None and camera_manager.is_opened:
+            camera_manager.resume_camera()
+        else:
+            camera_manager = create_camera()
+            if not camera_manager.start_camera():
+                camera_manager = None
+                return False
+            if CAMERA_CAPTURE_THREAD:
+                camera_manager.start_capture_thread()
+        
+        if face_detector is None:
+            face_detector = detector_pool.acquire()
+        
+        paused_since = None
+        if motion_gate is not None:
+            # A cena pode ter mudado durante a pausa
+            motion_gate.reset()
+        detection_active.set()
+        
+        # Inicia a thread de detecção se não houver uma da geração atual
+        if (detection_thread is None or not detection_thread.is_alive()
+                or detection_thread.generation != detection_generation):
+            detection_thread = threading.Thread(
+                target=detection_loop, args=(detection_generation,), name="detection", daemon=True
+            )
+            detection_thread.generation = detection_generation
+            detection_thread.retired = []
+            detection_thread.finished = False
+            detection_thread.start()
+        
+        face_detection_data["camera_active"] = True
+        notify_detection_listeners()
+        return True
+
+
+def wait_retired_thread(timeout=2.0):
+    """
+    Aguarda (sem state_lock) a thread de detecção de uma geração já encerrada.
+    """
+    thread = detection_thread
+    if (thread is not None and thread is not threading.current_thread()
+            and thread.generation != detection_generation):
+        thread.join(timeout=timeout)
+
 
+def create_camera():
+    """
+    Cria o gerenciador de câmera com as configurações de captura (CAMERA_*).
+    """
+    source = int(CAMERA_SOURCE) if CAMERA_SOURCE.isdigit() else CAMERA_SOURCE
+    return CameraManager(source, CAMERA_WIDTH, CAMERA_HEIGHT,
+                         fps=CAMERA_FPS,
+                         fourcc=CAMERA_FOURCC or None,
+                         buffer_size=CAMERA_BUFFER_SIZE if CAMERA_BUFFER_SIZE > 0 else None,
+                         backend=CAMERA_BACKEND)
 
-def detection_loop():
+
+def detection_loop(generation):
     """
     Loop contínuo de detecção facial.
+    
+    Cada frame passa pelo pipeline configurado (PIPELINE_CONFIG); o pipeline
+    é montado com a câmera e o detector da geração e encerrado com ela.
+    
+    Args:
+        generation: Geração de recursos à qual esta thread pertence
     """
-    global camera_manager, face_detector, stop_detection, face_detection_data
+    global detection_pipeline
     
-    while not stop_detection and camera_manager:
-        try:
-            ret, frame = camera_manager.read_frame()
+    pipeline = None
+    try:
+        while generation == detection_generation:
+            if not detection_active.is_set():
+                # Detecção pausada: libera a câmera após o tempo ocioso configurado
+                if idle_timeout_expired() and state_lock.acquire(blocking=False):
+                    try:
+                        if generation == detection_generation and not detection_active.is_set():
+                            release_resources()
+                            print("Câmera liberada após tempo ocioso")
+                    finally:
+                        state_lock.release()
+                    continue
+                detection_active.wait(IDLE_POLL_INTERVAL)
+                continue
             
-            if ret and frame is not None:
-                # Processa detecção facial
-                annotated_frame, faces_info = face_detector.detect_faces(frame)
-                
-                # Atualiza os dados globais
-                face_detection_data["faces_detected"] = len(faces_info) > 0
-                face_detection_data["face_count"] = len(faces_info)
-                face_detection_data["timestamp"] = time.time()
+            camera, detector = camera_manager, face_detector
+            if camera is None or detector is None:
+                break
+            
+            try:
+                if pipeline is None:
+                    pipeline = create_pipeline(camera, detector)
+                    pipeline.start()
+                    detection_pipeline = pipeline
+                if pipeline.step():
+                    continue
                 
-                if faces_info:
-                    face_detection_data["last_detection"] = {
-                        "count": len(faces_info),
-                        "timestamp": time.time()
-                    }
+                # Leitura falhou sem esperar (fim do vídeo ou thread de captura parada)
+                if camera.source_ended:
+                    print("Fim do vídeo: detecção encerrada")
+                    with state_lock:
+                        if generation == detection_generation:
+                            release_resources()
+                    break
+                time.sleep(IDLE_POLL_INTERVAL)
                 
+            except Exception as e:
+                print(f"Erro na detecção facial: {e}")
+                # Finaliza a câmera
+                with state_lock:
+                    if generation == detection_generation:
+                        release_resources()
+                break
+    finally:
+        if pipeline is not None:
+            # Os estágios em thread própria usam o detector: param antes de ele voltar ao pool
+            pipeline.stop()
+            if detection_pipeline is pipeline:
+                detection_pipeline = None
+        # Recursos liberados enquanto esta thread ainda os usava (ver release_resources)
+        current = threading.current_thread()
+        with state_lock:
+            current.finished = True
+            retired, current.retired = current.retired, []
+        for camera, detector in retired:
+            close_resources(camera, detector)
+
+
+def create_pipeline(camera, detector):
+    """
+    Monta o pipeline de detecção (PIPELINE_STAGES) com os serviços do servidor.
+    """
+    return build_pipeline(PIPELINE_STAGES, {
+        "camera": camera,
+        "detector": detector,
+        "motion_gate": motion_gate,
+        "best_shot": best_shot_selector,
+        "identity_cache": identity_cache,
+        "clip_recorder": clip_recorder,
+        "fusion": fusion,
+        "camera_id": CAMERA_ID,
+        "publish": publish_result
+    }, overload={"max_latency": PIPELINE_MAX_LATENCY, "max_skip_ratio": PIPELINE_MAX_SKIP_RATIO,
+                "shedding": PIPELINE_SHEDDING})
+
+
+def publish_result(item):
+    """
+    Atualiza o resultado publicado pela API com um frame do pipeline.
+    
+    Frames não analisados (cena estática) só atualizam o instante do resultado;
+    com o streaming degradado (sobrecarga), apenas parte dos frames vai aos ouvintes.
+    """
+    face_detection_data["timestamp"] = item.timestamp
+    faces_info = item.faces_info
+    if faces_info is None:
+        return
+    
+    # Atualiza os dados globais
+    face_detection_data["faces_detected"] = len(faces_info) > 0
+    face_detection_data["face_count"] = len(faces_info)
+    face_detection_data["sequence"] += 1
+    face_detection_data["frame_size"] = [item.frame.shape[1], item.frame.shape[0]]
+    face_detection_data["faces"] = payload_faces(faces_info)
+    
+    if faces_info:
+        face_detection_data["last_detection"] = {
+            "count": len(faces_info),
+            "timestamp": item.timestamp
+        }
+    
+    detection_history.append(get_detection_payload())
+    notify_detection_listeners(stream=item.stream)
+
+
+def decode_image(data):
+    """
+    Decodifica uma imagem enviada ao cadastro (bytes ou texto base64/data URL).
+    
+    Returns:
+        Imagem BGR ou None se inválida
+    """
+    if isinstance(data, str):
+        if data.startswith("data:"):
+            data = data.split(",", 1)[-1]
+        try:
+            data = base64.b64decode(data, validate=True)
+        except (binascii.Error, ValueError):
+            return None
+    
+    buffer = np.frombuffer(data or b"", dtype=np.uint8)
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR) if buffer.size else None
+
+
+def enroll_images(name, images):
+    """
+    Cadastra uma pessoa a partir de uma ou mais fotos.
+    
+    Cada foto passa pela detecção, pela verificação de qualidade e pela
+    codificação alinhada; as aceitas são gravadas na galeria de uma vez.
+    
+    Args:
+        name: Nome da pessoa
+        images: Lista de fotos (bytes ou base64)
+        
+    Returns:
+        Tuple (resposta, código HTTP)
+    """
+    global enroll_detector
+    
+    name = (name or "").strip()
+    if not name:
+        return {"success": False, "message": "Informe o nome da pessoa"}, 400
+    if not images:
+        return {"success": False, "message": "Envie ao menos uma imagem"}, 400
+    if len(images) > MAX_ENROLL_IMAGES:
+        return {"success": False, "message": f"Máximo de {MAX_ENROLL_IMAGES} imagens por cadastro"}, 400
+    
+    accepted, rejected = [], []
+    with enroll_lock:
+        if enroll_detector is None:
+            enroll_detector = FaceDetector(track_faces=False, static_image_mode=True)
+            enroll_detector.update_parameters(show_landmarks=False, show_bounding_box=False,
+                                              show_face_id=False)
+        
+        for index, data in enumerate(images):
+            result = encode_enrollment_image(enroll_detector, enroll_scorer, decode_image(data),
+                                             ENROLL_MIN_QUALITY)
+            if result["status"] == STATUS_OK:
+                accepted.append((index, result["encoding"], result["quality"]))
+            else:
+                rejected.append({"index": index, "reason": result["status"],
+                                 "quality": round(result["quality"], 3)})
+        
+        if accepted:
+            # Fotos quase idênticas às já cadastradas (ou entre si) não são gravadas
+            encodings = np.stack([encoding for _, encoding, _ in accepted])
+            kept = set(new_encodings(face_gallery, name, encodings))
+            rejected += [{"index": index, "reason": STATUS_DUPLICATE, "quality": round(quality, 3)}
+                         for i, (index, _, quality) in enumerate(accepted) if i not in kept]
+            accepted = [accepted[i] for i in sorted(kept)]
+        
+        if accepted:
+            face_gallery.add_many([name] * len(accepted), np.stack([e for _, e, _ in accepted]))
+            # Trilhas já resolvidas podem corresponder à nova pessoa
+            identity_cache.clear()
+            if GALLERY_PATH:
+                face_gallery.save(GALLERY_PATH)
+    
+    if not accepted:
+        return {
+            "success": False,
+            "message": "Nenhuma imagem aceita para cadastro",
+            "rejected": rejected
+        }, 422
+    
+    return {
+        "success": True,
+        "message": f"{name} cadastrado com {len(accepted)} imagem(ns)",
+        "name": name,
+        "added": len(accepted),
+        "rejected": rejected
+    }, 200
+
+
+def get_detection_payload():
+    """
+    Monta o resultado de detecção exposto pela API.
+    """
+    return {
+        "faces_detected": face_detection_data["faces_detected"],
+        "face_count": face_detection_data["face_count"],
+        "timestamp": face_detection_data["timestamp"],
+        "last_detection": face_detection_data["last_detection"],
+        "camera_active": face_detection_data["camera_active"],
+        "sequence": face_detection_data["sequence"],
+        "frame_size": face_detection_data["frame_size"],
+        "faces": face_detection_data["faces"]
+    }
+
+
+def find_detection(sequence):
+    """
+    Procura um resultado recente pelo número de sequência.
+    
+    Returns:
+        O resultado encontrado ou None se já saiu do histórico
+    """
+    for payload in reversed(detection_history):
+        if payload["sequence"] == sequence:
+            return payload
+    return None
+
+
+def encode_detection(payload, accept, format_param=None, delta_from=None):
+    """
+    Serializa um resultado de detecção conforme a negociação de conteúdo.
+    
+    Args:
+        payload: Resultado de detecção
+        accept: Cabeçalho Accept da requisição
+        format_param: Parâmetro ?format= (json, binary, msgpack)
+        delta_from: Sequência do resultado base para codificação em delta
+        
+    Returns:
+        Tuple (MIME type, bytes)
+    """
+    mime = negotiate(accept, format_param)
+    previous = None
+    if delta_from is not None:
+        try:
+            previous = find_detection(int(delta_from))
+        except ValueError:
+            previous = None
+    return mime, encode_payload(payload, mime, previous)
+
+
+def get_status_payload():
+    """
+    Monta o status geral do servidor exposto pela API.
+    """
+    camera = camera_manager
+    detector = face_detector
+    pipeline = detection_pipeline
+    return {
+        "status": "online",
+        "camera_active": face_detection_data["camera_active"],
+        "camera_paused": paused_since is not None,
+        "camera": camera.get_camera_info() if camera is not None else None,
+        "detector_pool": detector_pool.get_stats(),
+        "detection": detector.face_detection.get_stats() if detector is not None else None,
+        "pipeline": pipeline.get_stats() if pipeline is not None else None,
+        "overload": pipeline.overload.get_stats() if pipeline is not None else None,
+        "motion_gate": motion_gate.get_stats() if motion_gate is not None else None,
+        "event_publisher": event_publisher.get_stats() if event_publisher is not None else None,
+        "best_shot": best_shot_selector.get_stats(),
+        "identity_cache": identity_cache.get_stats(),
+        "gallery": face_gallery.get_stats(),
+        "presence": presence_analytics.get_stats(),
+        "fusion": fusion.get_stats(),
+        "clip_recorder": clip_recorder.get_stats() if clip_recorder is not None else None,
+        "profiler": profiler.get_stats(),
+        "memory": memory_monitor.get_stats(),
+        "message": "Servidor de Reconhecimento Facial ativo"
+    }
+
+
+def get_stats_payload(window=None, step=None):
+    """
+    Monta os agregados de presença de uma janela (?window= e ?step= em segundos).
+    
+    Returns:
+        Tuple (corpo da resposta, status HTTP)
+    """
+    try:
+        window = float(window) if window not in (None, "") else DEFAULT_STATS_WINDOW
+        step = float(step) if step not in (None, "") else None
+    except ValueError:
+        return {"success": False, "message": "window e step devem ser números (segundos)"}, 400
+    
+    if not window > 0 or (step is not None and not step > 0):
+        return {"success": False, "message": "window e step devem ser positivos"}, 400
+    
+    return presence_analytics.stats(window, step=step), 200
+
+
+def get_fusion_payload():
+    """
+    Monta as contagens da fusão entre câmeras (pessoas únicas presentes,
+    trilhas por câmera) após expirar trilhas e identidades antigas.
+    """
+    fusion.sweep()
+    return fusion.get_stats()
+
+
+def add_fusion_tracks(options):
+    """
+    Recebe as trilhas de outra câmera:
+    {"camera_id": "...", "tracks": [{"track_id": 1, "encoding": [...]}], "ended": [2]}.
+    
+    Trilhas sem "encoding" apenas continuam presentes. O instante é o do
+    recebimento (os relógios das câmeras não são comparados).
+    
+    Returns:
+        Tuple (corpo da resposta, status HTTP)
+    """
+    camera_id = options.get("camera_id")
+    tracks = options.get("tracks") or []
+    ended = options.get("ended") or []
+    if not camera_id or not isinstance(tracks, list) or not isinstance(ended, list):
+        return {"success": False, "message": "Informe camera_id e as listas tracks e ended"}, 400
+    if str(camera_id) == CAMERA_ID:
+        # As trilhas desta câmera vêm só do pipeline local
+        return {"success": False, "message": f"camera_id '{CAMERA_ID}' é a câmera local"}, 400
+    if len(tracks) > MAX_FUSION_TRACKS_PER_REQUEST or len(ended) > MAX_FUSION_TRACKS_PER_REQUEST:
+        return {"success": False, "message": f"No máximo {MAX_FUSION_TRACKS_PER_REQUEST} trilhas por envio"}, 400
+    
+    # Tudo é validado antes de chegar à fusão (tamanho e valores finitos)
+    try:
+        parsed = []
+        for track in tracks:
+            track_id, encoding = track["track_id"], track.get("encoding")
+            if not isinstance(track_id, (int, str)):
+                raise ValueError("track_id deve ser número ou texto")
+            if encoding is not None:
+                encoding = np.asarray(encoding, dtype=np.float32)
+                if encoding.shape != (fusion.dimensions,):
+                    raise ValueError(f"encoding deve ter {fusion.dimensions} valores")
+                if not np.isfinite(encoding).all():
+                    raise ValueError("encoding com valores não finitos")
+            parsed.append((track_id, encoding))
+        if not all(isinstance(track_id, (int, str)) for track_id in ended):
+            raise ValueError("ended deve conter números ou textos")
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return {"success": False, "message": f"Trilhas inválidas: {e}"}, 400
+    
+    global_ids = fusion.update(str(camera_id), parsed, ended)
+    
+    return {
+        "success": True,
+        "global_ids": [{"track_id": track_id, "global_id": global_id}
+                       for track_id, global_id in global_ids.items()],
+        "counts": fusion.counts()
+    }, 200
+
+
+def start_profile(options):
+    """
+    Inicia o profiler com as opções do corpo ({"rate": ..., "duration": ...}).
+    
+    Returns:
+        Tuple (corpo da resposta, status HTTP)
+    """
+    try:
+        rate = float(options["rate"]) if options.get("rate") is not None else None
+        duration = float(options["duration"]) if options.get("duration") is not None else None
+        started = profiler.start(rate=rate, duration=duration)
+    except (TypeError, ValueError) as e:
+        return {"success": False, "message": f"Opções do profiler inválidas: {e}"}, 400
+    
+    if not started:
+        return {"success": False, "message": "Profiler já está em execução"}, 400
+    return {"success": True, "message": "Profiler iniciado", "profiler": profiler.get_stats()}, 200
+
+
+def stop_profile():
+    """
+    Para o profiler e retorna as pilhas colapsadas (formato de flamegraph.pl).
+    
+    Returns:
+        Tuple (texto, status HTTP); vazio se nada foi amostrado
+    """
+    if profiler.started_at is None:
+        return "", 400
+    return profiler.stop(), 200
+
+
+def get_memory_payload(graphs=None, top=None):
+    """
+    Monta a contabilidade de memória (?graphs=1 conta os grafos nativos vivos;
+    ?top=N inclui os maiores crescimentos do tracemalloc, se ativo).
+    
+    Returns:
+        Tuple (corpo da resposta, status HTTP)
+    """
+    try:
+        top = int(top) if top not in (None, "") else 0
+    except ValueError:
+        return {"success": False, "message": "top deve ser um número inteiro"}, 400
+    
+    return memory_monitor.get_stats(graphs=graphs not in (None, "", "0", "false"), top=max(0, top)), 200
+
+
+def set_memory_tracing(options):
+    """
+    Liga ou desliga o tracemalloc ({"enabled": true, "frames": 10}).
+    
+    Returns:
+        Tuple (corpo da resposta, status HTTP)
+    """
+    if options.get("enabled", True):
+        try:
+            memory_monitor.start_tracing(int(options.get("frames", 10)))
+        except (TypeError, ValueError) as e:
+            return {"success": False, "message": f"Opções de rastreamento inválidas: {e}"}, 400
+    else:
+        memory_monitor.stop_tracing()
+    return {"success": True, "tracing": memory_monitor.get_stats()["tracing"]}, 200
+
+
+def notify_detection_listeners(stream=True):
+    """
+    Repassa o resultado atual para os ouvintes registrados em detection_listeners
+    e, se stream for True, também para os de stream_listeners.
+    
+    Os ouvintes rodam na thread de detecção e não devem bloquear.
+    """
+    payload = get_detection_payload()
+    listeners = detection_listeners + stream_listeners if stream else list(detection_listeners)
+    for listener in listeners:
+        try:
+            listener(payload)
         except Exception as e:
-            print(f"Erro na detecção facial: {e}")
-            break
+            print(f"Erro ao notificar ouvinte de detecção: {e}")
+
+
+def start_event_publisher():
+    """
+    Cria o publicador de eventos com os transportes configurados
+    (MQTT_HOST e/ou UDP_MULTICAST_GROUP) e o registra como ouvinte.
     
-    # Finaliza a câmera
-    if camera_manager:
-        camera_manager.stop_camera()
+    Returns:
+        O publicador criado ou None se nenhum transporte estiver configurado
+    """
+    global event_publisher
     
-    face_detection_data["camera_active"] = False
+    if event_publisher is not None:
+        return event_publisher
+    
+    transports = []
+    if MQTT_HOST:
+        try:
+            transports.append(MqttTransport.connect(MQTT_HOST, MQTT_PORT, MQTT_TOPIC_PREFIX))
+            print(f"Publicando eventos via MQTT em {MQTT_HOST}:{MQTT_PORT}/{MQTT_TOPIC_PREFIX}")
+        except Exception as e:
+            print(f"Erro ao configurar MQTT: {e}")
+    
+    if UDP_MULTICAST_GROUP:
+        try:
+            transports.append(UdpMulticastTransport(UDP_MULTICAST_GROUP, UDP_MULTICAST_PORT))
+            print(f"Publicando eventos via UDP multicast em {UDP_MULTICAST_GROUP}:{UDP_MULTICAST_PORT}")
+        except OSError as e:
+            print(f"Erro ao configurar UDP multicast: {e}")
+    
+    if not transports:
+        return None
+    
+    event_publisher = EventPublisher(transports, batch_interval=EVENT_BATCH_INTERVAL)
+    stream_listeners.append(event_publisher.on_detection)
+    fusion.listeners.append(event_publisher.on_event)
+    event_publisher.start()
+    return event_publisher
 
 
-def stop_face_detection():
+def stop_event_publisher():
     """
-    Para a detecção facial.
+    Encerra o publicador de eventos, enviando o que estiver pendente.
     """
-    global stop_detection, camera_manager, face_detector
+    global event_publisher
     
-    stop_detection = True
+    if event_publisher is None:
+        return
     
-    if camera_manager:
-        camera_manager.stop_camera()
-        camera_manager = None
+    if event_publisher.on_detection in stream_listeners:
+        stream_listeners.remove(event_publisher.on_detection)
+    if event_publisher.on_event in fusion.listeners:
+        fusion.listeners.remove(event_publisher.on_event)
+    event_publisher.stop()
+    event_publisher = None
+
+
+def idle_timeout_expired():
+    """
+    Verifica se a detecção está pausada há mais tempo que CAMERA_IDLE_TIMEOUT.
+    """
+    if CAMERA_IDLE_TIMEOUT < 0 or paused_since is None:
+        return False
+    return time.time() - paused_since >= CAMERA_IDLE_TIMEOUT
+
+
+def release_resources():
+    """
+    Libera a câmera e devolve o detector ao pool. Deve ser chamada com
+    state_lock adquirido.
     
-    if face_detector:
-        face_detector.release()
-        face_detector = None
+    Não espera a thread de detecção: se ela ainda estiver viva, câmera e
+    detector ficam com ela e são liberados quando termina o frame atual e
+    para o pipeline (ver detection_loop), sem segurar o lock nesse meio-tempo.
+    """
+    global camera_manager, face_detector, detection_generation, paused_since
+    
+    detection_generation += 1
+    detection_active.clear()
+    paused_since = None
+    
+    camera, detector = camera_manager, face_detector
+    camera_manager = face_detector = None
+    thread = detection_thread
+    if thread is not None and thread.is_alive() and not thread.finished:
+        thread.retired.append((camera, detector))
+    else:
+        close_resources(camera, detector)
     
     face_detection_data["camera_active"] = False
+    notify_detection_listeners()
+
+
+def close_resources(camera, detector):
+    """
+    Fecha a câmera e devolve o detector ao pool, já fora de uso por qualquer thread.
+    """
+    if camera:
+        camera.stop_camera()
+    
+    if detector:
+        retire_tracks(detector)
+        detector_pool.release(detector)
+
+
+def retire_tracks(detector):
+    """
+    Encerra as trilhas vivas de um detector que sai de uso e as remove dos
+    caches por trilha (identidade, melhor captura, fusão entre câmeras).
+    """
+    tracker = getattr(detector, "tracker", None)
+    if tracker is None or not tracker.tracks:
+        return
+    tracker.reset()
+    ended = tracker.ended_tracks
+    identity_cache.evict(ended)
+    best_shot_selector.discard(ended)
+    fusion.update(CAMERA_ID, [], ended)
+
+
+def stop_face_detection(release=False):
+    """
+    Para a detecção facial.
+    
+    Por padrão a câmera é apenas pausada e o detector permanece carregado,
+    tornando o próximo início instantâneo.
+    
+    Args:
+        release: Se True, libera a câmera e o detector imediatamente
+    """
+    global paused_since, resume_after_restart
+    
+    with state_lock:
+        resume_after_restart = False
+        detection_active.clear()
+        face_detection_data["camera_active"] = False
+        
+        if release or CAMERA_IDLE_TIMEOUT == 0:
+            release_resources()
+        else:
+            if camera_manager is not None:
+                camera_manager.pause_camera()
+                paused_since = time.time()
+            notify_detection_listeners()
 
 
 # ==================== ENDPOINTS DA API ====================
@@ -110,11 +955,7 @@ def get_status():
     """
     Retorna o status geral do servidor.
     """
-    return jsonify({
-        "status": "online",
-        "camera_active": face_detection_data["camera_active"],
-        "message": "Servidor de Reconhecimento Facial ativo"
-    }), 200
+    return jsonify(get_status_payload()), 200
 
 
 @app.route("/api/start", methods=["POST"])
@@ -144,8 +985,11 @@ def start_detection():
 def stop_detection():
     """
     Para a detecção facial.
+    
+    Corpo opcional: {"release": true} para liberar a câmera imediatamente.
     """
-    stop_face_detection()
+    options = request.get_json(silent=True) or {}
+    stop_face_detection(release=bool(options.get("release", False)))
     return jsonify({
         "success": True,
         "message": "Detecção facial parada"
@@ -156,13 +1000,113 @@ def stop_detection():
 def get_detection():
     """
     Retorna o status atual da detecção facial.
+    
+    O formato segue o cabeçalho Accept ou o parâmetro ?format=: JSON (padrão),
+    binário compacto (application/x-face-detection) ou MessagePack. No formato
+    binário, ?delta_from=<sequência> codifica as faces em relação a um
+    resultado anterior.
     """
-    return jsonify({
-        "faces_detected": face_detection_data["faces_detected"],
-        "face_count": face_detection_data["face_count"],
-        "timestamp": face_detection_data["timestamp"],
-        "last_detection": face_detection_data["last_detection"]
-    }), 200
+    payload = get_detection_payload()
+    mime = negotiate(request.headers.get("Accept"), request.args.get("format"))
+    if mime == MIME_JSON:
+        return jsonify(payload), 200
+    
+    mime, body = encode_detection(payload, request.headers.get("Accept"),
+                                  request.args.get("format"), request.args.get("delta_from"))
+    return Response(body, status=200, mimetype=mime)
+
+
+@app.route("/api/stats", methods=["GET"])
+def get_stats():
+    """
+    Retorna os agregados de presença da janela ?window= (segundos, padrão 300).
+    
+    ?step= inclui a série de ocupação média (ex.: 60 para ocupação por minuto).
+    """
+    body, status = get_stats_payload(request.args.get("window"), request.args.get("step"))
+    return jsonify(body), status
+
+
+@app.route("/api/fusion", methods=["GET"])
+def get_fusion():
+    """
+    Retorna as pessoas únicas presentes em todas as câmeras (fusão entre câmeras).
+    """
+    return jsonify(get_fusion_payload()), 200
+
+
+@app.route("/api/fusion/tracks", methods=["POST"])
+def fusion_tracks():
+    """
+    Recebe as trilhas (com codificações) e as trilhas encerradas de outra câmera.
+    """
+    body, status = add_fusion_tracks(request.get_json(silent=True) or {})
+    return jsonify(body), status
+
+
+@app.route("/api/enroll", methods=["POST"])
+def enroll():
+    """
+    Cadastra uma pessoa na galeria.
+    
+    Aceita multipart/form-data (campo "name" e um ou mais arquivos "image")
+    ou JSON: {"name": "...", "image": "<base64>"} ou {"name": "...", "images": [...]}.
+    """
+    if request.files:
+        name = request.form.get("name")
+        images = [f.read() for f in request.files.getlist("image") + request.files.getlist("images")]
+    else:
+        data = request.get_json(silent=True) or {}
+        name = data.get("name")
+        images = data.get("images") or ([data["image"]] if data.get("image") else [])
+    
+    body, status = enroll_images(name, images)
+    return jsonify(body), status
+
+
+@app.route("/api/profile/start", methods=["POST"])
+def profile_start():
+    """
+    Inicia o profiler por amostragem de todas as threads.
+    
+    Corpo opcional: {"rate": <amostras/s>, "duration": <segundos até parar sozinho>}.
+    """
+    body, status = start_profile(request.get_json(silent=True) or {})
+    return jsonify(body), status
+
+
+@app.route("/api/profile/stop", methods=["POST"])
+def profile_stop():
+    """
+    Para o profiler e retorna as pilhas colapsadas (text/plain), prontas para
+    flamegraph.pl, speedscope ou inferno. A raiz de cada pilha é a thread
+    (detection, camera-capture, pipeline-<estágio>, process_request_thread...).
+    """
+    text, status = stop_profile()
+    if status != 200:
+        return jsonify({"success": False, "message": "Profiler não foi iniciado"}), status
+    return Response(text, status=200, mimetype="text/plain")
+
+
+@app.route("/api/memory", methods=["GET"])
+def get_memory():
+    """
+    Retorna RSS, orçamento e ações de memória.
+    
+    ?graphs=1 conta os grafos do MediaPipe vivos; ?top=N lista os maiores
+    crescimentos desde o início do tracemalloc (POST /api/memory/trace).
+    """
+    body, status = get_memory_payload(request.args.get("graphs"), request.args.get("top"))
+    return jsonify(body), status
+
+
+@app.route("/api/memory/trace", methods=["POST"])
+def memory_trace():
+    """
+    Liga ou desliga o tracemalloc: {"enabled": true|false, "frames": 10}.
+    """
+    body, status = set_memory_tracing(request.get_json(silent=True) or {})
+    return jsonify(body), status
 
 
 @app.route("/api/health", methods=["GET"])
@@ -186,7 +1130,29 @@ if __name__ == "__main__":
     print("  POST /api/start        - Iniciar detecção facial")
     print("  POST /api/stop         - Parar detecção facial")
     print("  GET  /api/detection    - Obter status da detecção")
+    print("  GET  /api/stats        - Estatísticas de presença (?window=)")
+    print("  POST /api/enroll       - Cadastrar pessoa na galeria")
+    print("  GET  /api/fusion       - Pessoas únicas em todas as câmeras")
+    print("  POST /api/fusion/tracks - Trilhas de outra câmera (fusão)")
+    print("  POST /api/profile/start - Iniciar profiler por amostragem")
+    print("  POST /api/profile/stop  - Parar profiler (pilhas colapsadas)")
+    print("  GET  /api/memory       - Memória do processo (?graphs=1&top=N)")
+    print("  POST /api/memory/trace - Ligar/desligar tracemalloc")
     print("  GET  /api/health       - Health check")
     
+    # Pré-aquece os detectores para que o primeiro /api/start seja rápido
+    detector_pool.warm_up()
+    start_event_publisher()
+    presence_analytics.start()
+    memory_monitor.start()
+    if clip_recorder is not None:
+        clip_recorder.start()
+    
     # Inicia o servidor Flask
-    app.run(host="0.0.0.0", port=5000, debug=False, threaded=True)
\ No newline at end of file
+    try:
+        app.run(host="0.0.0.0", port=5000, debug=False, threaded=True)
+    finally:
+        presence_analytics.stop()
+        memory_monitor.stop()
+        if clip_recorder is not None:
+            clip_recorder.stop()
\ No newline at end of file
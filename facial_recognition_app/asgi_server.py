@@ -0,0 +1,503 @@
+"""
+Versão assíncrona (ASGI) do servidor de reconhecimento facial.
+
+Expõe os mesmos endpoints de api_server.py, além de long-poll em
+/api/detection?wait=<segundos> e streaming via Server-Sent Events em
+/api/stream. A detecção continua rodando na thread de api_server; os
+resultados chegam ao event loop por call_soon_threadsafe e são serializados
+uma única vez para todos os clientes conectados.
+
+Execução:
+    uvicorn asgi_server:app --host 0.0.0.0 --port 5000
+ou
+    python asgi_server.py
+"""
+
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+import api_server as core
+from result_codec import MIME_JSON, negotiate
+
+# Tempo máximo de espera de um long-poll
+LONG_POLL_MAX_WAIT = 30.0
+# Intervalo mínimo entre eventos enviados a um mesmo cliente SSE
+STREAM_MIN_INTERVAL = 0.1
+# Intervalo entre comentários de keep-alive no stream SSE
+STREAM_KEEPALIVE = 15.0
+
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+    (b"access-control-allow-headers", b"Content-Type")
+]
+
+
+class DetectionBroadcaster:
+    """
+    Distribui os resultados da thread de detecção para os clientes do event loop.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.version = 0
+        self.message = b"{}"
+        self.sse_message = b""
+        self._changed = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """
+        Associa o broadcaster ao event loop e passa a ouvir a thread de detecção.
+        """
+        self.loop = loop
+        self._changed = asyncio.Event()
+        self._update(core.get_detection_payload())
+        core.stream_listeners.append(self.on_detection)
+
+    def detach(self):
+        """
+        Para de ouvir a thread de detecção.
+        """
+        if self.on_detection in core.stream_listeners:
+            core.stream_listeners.remove(self.on_detection)
+        self.loop = None
+
+    def on_detection(self, payload: dict):
+        """
+        Ouvinte chamado na thread de detecção; apenas agenda a atualização no loop.
+        """
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._update, payload)
+
+    async def wait_for_update(self, since: int, timeout: float) -> bool:
+        """
+        Aguarda uma versão mais nova que `since`.
+
+        Args:
+            since: Última versão conhecida pelo cliente
+            timeout: Tempo máximo de espera em segundos
+
+        Returns:
+            True se houve atualização, False se o tempo esgotou
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        while self.version <= since:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+
+        return True
+
+    def _update(self, payload: dict):
+        # Executado no event loop: serializa uma vez e acorda todos os clientes
+        self.version += 1
+        self.message = json.dumps(dict(payload, version=self.version)).encode()
+        self.sse_message = b"id: %d\ndata: %s\n\n" % (self.version, self.message)
+
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+
+broadcaster = DetectionBroadcaster()
+
+
+# ==================== UTILITÁRIOS HTTP ====================
+
+async def send_json(send, data, status: int = 200):
+    """
+    Envia uma resposta JSON completa.
+    """
+    body = data if isinstance(data, bytes) else json.dumps(data).encode()
+    await send_body(send, body, MIME_JSON, status)
+
+
+async def send_body(send, body: bytes, mime: str, status: int = 200):
+    """
+    Envia uma resposta completa com o MIME type informado.
+    """
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", mime.encode()),
+                    (b"content-length", str(len(body)).encode())] + CORS_HEADERS
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def read_json_body(receive) -> dict:
+    """
+    Lê o corpo da requisição como JSON, retornando {} se vazio ou inválido.
+    """
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+    try:
+        data = json.loads(body) if body else {}
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def query_param(scope, name: str, default=None):
+    """
+    Retorna o valor de um parâmetro da query string.
+    """
+    values = parse_qs(scope.get("query_string", b"").decode()).get(name)
+    return values[0] if values else default
+
+
+def header(scope, name: bytes) -> str:
+    """
+    Retorna o valor de um cabeçalho da requisição (nome em minúsculas).
+    """
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+
+def run_blocking(func, *args):
+    """
+    Executa uma função bloqueante em uma thread do executor padrão.
+    """
+    return asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+# ==================== ENDPOINTS DA API ====================
+
+async def get_status(scope, receive, send):
+    """
+    Retorna o status geral do servidor.
+
+    Executado fora do event loop: get_camera_info espera o lock da captura,
+    mantido pela thread de captura durante um grab (até um intervalo de frame).
+    """
+    await send_json(send, await run_blocking(core.get_status_payload))
+
+
+async def start_detection(scope, receive, send):
+    """
+    Inicia a detecção facial sem bloquear o event loop.
+    """
+    if core.face_detection_data["camera_active"]:
+        await send_json(send, {
+            "success": False,
+            "message": "Detecção facial já está ativa"
+        }, 400)
+        return
+
+    if await run_blocking(core.start_face_detection):
+        await send_json(send, {
+            "success": True,
+            "message": "Detecção facial iniciada com sucesso"
+        })
+    else:
+        await send_json(send, {
+            "success": False,
+            "message": "Erro ao iniciar a detecção facial"
+        }, 500)
+
+
+async def stop_detection(scope, receive, send):
+    """
+    Para a detecção facial.
+
+    Corpo opcional: {"release": true} para liberar a câmera imediatamente.
+    """
+    options = await read_json_body(receive)
+    await run_blocking(core.stop_face_detection, bool(options.get("release", False)))
+    await send_json(send, {
+        "success": True,
+        "message": "Detecção facial parada"
+    })
+
+
+async def get_detection(scope, receive, send):
+    """
+    Retorna o status atual da detecção facial.
+
+    Parâmetros opcionais:
+        wait: segundos a aguardar por um novo resultado (long-poll)
+        since: última versão recebida pelo cliente
+        format: json, binary ou msgpack (alternativa ao cabeçalho Accept)
+        delta_from: sequência base para codificação binária em delta
+    """
+    try:
+        wait = min(float(query_param(scope, "wait", 0)), LONG_POLL_MAX_WAIT)
+        since = int(query_param(scope, "since", broadcaster.version))
+    except ValueError:
+        await send_json(send, {
+            "success": False,
+            "message": "Parâmetros wait/since inválidos"
+        }, 400)
+        return
+
+    if wait > 0:
+        await broadcaster.wait_for_update(since, wait)
+
+    accept = header(scope, b"accept")
+    format_param = query_param(scope, "format")
+    if negotiate(accept, format_param) == MIME_JSON:
+        if wait > 0:
+            # Long-poll: JSON já serializado pelo broadcaster, com a versão
+            await send_json(send, broadcaster.message)
+        else:
+            # Mesmo resultado de api_server (o broadcaster não vê os frames
+            # pulados pelo filtro de movimento nem os do streaming degradado)
+            await send_json(send, core.get_detection_payload())
+        return
+
+    mime, body = core.encode_detection(core.get_detection_payload(), accept,
+                                       format_param, query_param(scope, "delta_from"))
+    await send_body(send, body, mime)
+
+
+async def stream_detection(scope, receive, send):
+    """
+    Transmite os resultados de detecção via Server-Sent Events.
+    """
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache")] + CORS_HEADERS
+    })
+
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+                return
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    version = 0
+
+    try:
+        while not disconnected.is_set():
+            if broadcaster.version > version:
+                # Envia sempre o resultado mais recente, descartando os intermediários
+                version = broadcaster.version
+                await send({"type": "http.response.body",
+                            "body": broadcaster.sse_message,
+                            "more_body": True})
+                await asyncio.sleep(STREAM_MIN_INTERVAL)
+                continue
+
+            if not await broadcaster.wait_for_update(version, STREAM_KEEPALIVE):
+                await send({"type": "http.response.body",
+                            "body": b": keep-alive\n\n",
+                            "more_body": True})
+    except OSError:
+        pass
+    finally:
+        watcher.cancel()
+
+
+async def get_stats(scope, receive, send):
+    """
+    Retorna os agregados de presença da janela ?window= (segundos, padrão 300).
+    """
+    body, status = core.get_stats_payload(query_param(scope, "window"), query_param(scope, "step"))
+    await send_json(send, body, status)
+
+
+async def enroll(scope, receive, send):
+    """
+    Cadastra uma pessoa na galeria.
+    
+    Corpo JSON: {"name": "...", "image": "<base64>"} ou {"name": "...", "images": [...]}.
+    """
+    data = await read_json_body(receive)
+    images = data.get("images") or ([data["image"]] if data.get("image") else [])
+    body, status = await run_blocking(core.enroll_images, data.get("name"), images)
+    await send_json(send, body, status)
+
+
+async def profile_start(scope, receive, send):
+    """
+    Inicia o profiler por amostragem de todas as threads.
+    """
+    body, status = core.start_profile(await read_json_body(receive))
+    await send_json(send, body, status)
+
+
+async def profile_stop(scope, receive, send):
+    """
+    Para o profiler e retorna as pilhas colapsadas (text/plain).
+    """
+    text, status = await run_blocking(core.stop_profile)
+    if status != 200:
+        await send_json(send, {"success": False, "message": "Profiler não foi iniciado"}, status)
+        return
+    await send_body(send, text.encode(), "text/plain; charset=utf-8")
+
+
+async def get_fusion(scope, receive, send):
+    """
+    Retorna as pessoas únicas presentes em todas as câmeras (fusão entre câmeras).
+    """
+    await send_json(send, await run_blocking(core.get_fusion_payload))
+
+
+async def fusion_tracks(scope, receive, send):
+    """
+    Recebe as trilhas (com codificações) e as trilhas encerradas de outra câmera.
+    """
+    body, status = await run_blocking(core.add_fusion_tracks, await read_json_body(receive))
+    await send_json(send, body, status)
+
+
+async def get_memory(scope, receive, send):
+    """
+    Retorna RSS, orçamento e ações de memória (?graphs=1&top=N).
+    """
+    body, status = await run_blocking(core.get_memory_payload, query_param(scope, "graphs"),
+                                      query_param(scope, "top"))
+    await send_json(send, body, status)
+
+
+async def memory_trace(scope, receive, send):
+    """
+    Liga ou desliga o tracemalloc: {"enabled": true|false, "frames": 10}.
+    """
+    body, status = core.set_memory_tracing(await read_json_body(receive))
+    await send_json(send, body, status)
+
+
+async def health_check(scope, receive, send):
+    """
+    Verifica a saúde da API.
+    """
+    await send_json(send, {
+        "status": "healthy",
+        "camera_active": core.face_detection_data["camera_active"]
+    })
+
+
+ROUTES = {
+    ("GET", "/api/status"): get_status,
+    ("POST", "/api/start"): start_detection,
+    ("POST", "/api/stop"): stop_detection,
+    ("GET", "/api/detection"): get_detection,
+    ("GET", "/api/stream"): stream_detection,
+    ("GET", "/api/stats"): get_stats,
+    ("POST", "/api/enroll"): enroll,
+    ("GET", "/api/fusion"): get_fusion,
+    ("POST", "/api/fusion/tracks"): fusion_tracks,
+    ("POST", "/api/profile/start"): profile_start,
+    ("POST", "/api/profile/stop"): profile_stop,
+    ("GET", "/api/memory"): get_memory,
+    ("POST", "/api/memory/trace"): memory_trace,
+    ("GET", "/api/health"): health_check
+}
+
+
+# ==================== APLICAÇÃO ASGI ====================
+
+async def lifespan(receive, send):
+    """
+    Trata os eventos de inicialização e encerramento do servidor.
+    """
+    while True:
+        message = await receive()
+
+        if message["type"] == "lifespan.startup":
+            broadcaster.attach(asyncio.get_running_loop())
+            # Pré-aquece os detectores para que o primeiro /api/start seja rápido
+            await run_blocking(core.detector_pool.warm_up)
+            await run_blocking(core.start_event_publisher)
+            core.presence_analytics.start()
+            core.memory_monitor.start()
+            if core.clip_recorder is not None:
+                core.clip_recorder.start()
+            await send({"type": "lifespan.startup.complete"})
+
+        elif message["type"] == "lifespan.shutdown":
+            broadcaster.detach()
+            await run_blocking(core.stop_face_detection, True)
+            await run_blocking(core.stop_event_publisher)
+            await run_blocking(core.presence_analytics.stop)
+            await run_blocking(core.memory_monitor.stop)
+            if core.clip_recorder is not None:
+                await run_blocking(core.clip_recorder.stop)
+            core.detector_pool.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """
+    Ponto de entrada ASGI.
+    """
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+
+    if scope["type"] != "http":
+        return
+
+    # Servidores sem suporte a lifespan: associa no primeiro acesso
+    if broadcaster.loop is None:
+        broadcaster.attach(asyncio.get_running_loop())
+
+    if scope["method"] == "OPTIONS":
+        await send({"type": "http.response.start", "status": 204, "headers": CORS_HEADERS})
+        await send({"type": "http.response.body", "body": b""})
+        return
+
+    handler = ROUTES.get((scope["method"], scope["path"]))
+    if handler is None:
+        await send_json(send, {
+            "success": False,
+            "message": "Endpoint não encontrado"
+        }, 404)
+        return
+
+    await handler(scope, receive, send)
+
+
+# ==================== INICIALIZAÇÃO ====================
+
+if __name__ == "__main__":
+    try:
+        import uvicorn
+    except ImportError:
+        print("uvicorn não encontrado. Instale com: pip install uvicorn")
+        raise SystemExit(1)
+
+    print("Iniciando Servidor de Reconhecimento Facial (ASGI)...")
+    print("API disponível em: http://localhost:5000")
+    print("\nEndpoints disponíveis:")
+    print("  GET  /api/status       - Status do servidor")
+    print("  POST /api/start        - Iniciar detecção facial")
+    print("  POST /api/stop         - Parar detecção facial")
+    print("  GET  /api/detection    - Obter status da detecção (?wait=&since= para long-poll)")
+    print("  GET  /api/stream       - Stream de detecções (Server-Sent Events)")
+    print("  GET  /api/stats        - Estatísticas de presença (?window=)")
+    print("  POST /api/enroll       - Cadastrar pessoa na galeria")
+    print("  GET  /api/fusion       - Pessoas únicas em todas as câmeras")
+    print("  POST /api/fusion/tracks - Trilhas de outra câmera (fusão)")
+    print("  POST /api/profile/start - Iniciar profiler por amostragem")
+    print("  POST /api/profile/stop  - Parar profiler (pilhas colapsadas)")
+    print("  GET  /api/memory       - Memória do processo (?graphs=1&top=N)")
+    print("  POST /api/memory/trace - Ligar/desligar tracemalloc")
+    print("  GET  /api/health       - Health check")
+
+    uvicorn.run(app, host="0.0.0.0", port=5000, log_level="warning")
@@ -1,27 +1,143 @@
+import sys
+import threading
+import time
 import cv2
 import numpy as np
-from typing import Optional, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple, Union
+
+
+# Backends aceitos pelo parâmetro backend (além de um cv2.CAP_* numérico)
+CAMERA_BACKENDS = {
+    'any': cv2.CAP_ANY,
+    'v4l2': cv2.CAP_V4L2,
+    'dshow': cv2.CAP_DSHOW,
+    'msmf': cv2.CAP_MSMF,
+    'ffmpeg': cv2.CAP_FFMPEG,
+    'gstreamer': cv2.CAP_GSTREAMER
+}
+
+# Resoluções testadas por probe_modes()
+COMMON_RESOLUTIONS = ((640, 480), (800, 600), (1280, 720), (1920, 1080))
+
+# Frames usados no cálculo do FPS medido
+FPS_WINDOW = 60
+
+
+def fourcc_to_str(value: float) -> str:
+    """
+    Converte o valor de CAP_PROP_FOURCC no código de quatro letras (ex.: 'MJPG').
+    """
+    code = int(value)
+    if code <= 0:
+        return ''
+    return ''.join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip('\x00 ')
 
 
 class CameraManager:
     """
     Classe para gerenciar a captura de vídeo da câmera.
+    
+    Além de câmeras (índice), aceita arquivos de vídeo ou URLs como fonte,
+    o que permite medir a captura e a decodificação sem hardware.
+    
+    A leitura é dividida em grab() (obtém o frame do driver, sem decodificar)
+    e retrieve() (decodifica o último frame obtido). Com a thread de captura
+    ativa (start_capture_thread), os frames são obtidos continuamente e só
+    os que o consumidor realmente usa são decodificados.
     """
     
-    def __init__(self, camera_index: int = 0, width: int = 640, height: int = 480):
+    def __init__(self,
+                 camera_index: Union[int, str] = 0,
+                 width: int = 640,
+                 height: int = 480,
+                 fps: int = 30,
+                 fourcc: Union[str, Sequence[str], None] = ('MJPG', 'YUYV'),
+                 buffer_size: Optional[int] = 1,
+                 backend: Union[str, int] = 'auto'):
         """
         Inicializa o gerenciador da câmera.
         
         Args:
-            camera_index: Índice da câmera (0 para câmera padrão)
+            camera_index: Índice da câmera (0 para câmera padrão), arquivo de vídeo ou URL
             width: Largura do frame
             height: Altura do frame
+            fps: FPS solicitado
+            fourcc: Formato(s) de captura em ordem de preferência ('MJPG', 'YUYV');
+                    None mantém o formato padrão do driver
+            buffer_size: Frames no buffer do driver (1 minimiza a latência; None não altera)
+            backend: 'auto' (V4L2 no Linux), nome em CAMERA_BACKENDS ou cv2.CAP_*
         """
         self.camera_index = camera_index
         self.width = width
         self.height = height
+        self.fps = fps
+        self.fourcc_preference = [fourcc] if isinstance(fourcc, str) else list(fourcc or [])
+        self.buffer_size = buffer_size
+        self.backend = backend
         self.cap = None
         self.is_opened = False
+        self.is_paused = False
+        
+        # Modo efetivamente obtido após a negociação
+        self.active_backend = None
+        self.active_fourcc = ''
+        
+        # Medição da captura: instantes dos últimos frames e tempos de grab/decodificação
+        self._frame_times = deque(maxlen=FPS_WINDOW)
+        self.grab_time_ms = 0.0
+        self.decode_time_ms = 0.0
+        self.frames_grabbed = 0
+        self.frames_decoded = 0
+        
+        # Instante (time.time()) em que o último frame foi obtido e o do último decodificado
+        self.last_grab_time = None
+        self.last_frame_time = None
+        
+        # grab() e retrieve() não podem se intercalar no mesmo VideoCapture
+        self._capture_lock = threading.Lock()
+        self._new_frame = threading.Condition()
+        self._grab_sequence = 0
+        self._decoded_sequence = 0
+        self._capture_thread = None
+        self._capture_running = False
+        self._source_ended = False
+    
+    @property
+    def is_device(self) -> bool:
+        """
+        True se a fonte é uma câmera (índice), False para arquivos/URLs.
+        """
+        return isinstance(self.camera_index, int)
+    
+    @property
+    def measured_fps(self) -> float:
+        """
+        FPS realmente obtido nos últimos frames lidos.
+        """
+        if len(self._frame_times) < 2:
+            return 0.0
+        elapsed = self._frame_times[-1] - self._frame_times[0]
+        return (len(self._frame_times) - 1) / elapsed if elapsed > 0 else 0.0
+    
+    @property
+    def frames_skipped(self) -> int:
+        """
+        Frames obtidos que nunca foram decodificados (descartados pelo consumidor).
+        """
+        return max(0, self.frames_grabbed - self.frames_decoded)
+    
+    @property
+    def source_ended(self) -> bool:
+        """
+        True quando um arquivo de vídeo chegou ao fim.
+        """
+        return self._source_ended
+    
+    @property
+    def capture_thread_active(self) -> bool:
+        return self._capture_thread is not None and self._capture_thread.is_alive()
         
     def start_camera(self) -> bool:
         """
@@ -31,18 +147,23 @@ class CameraManager:
             True se a câmera foi iniciada com sucesso, False caso contrário
         """
         try:
-            self.cap = cv2.VideoCapture(self.camera_index)
+            self.cap = None
+            for backend in self._backend_candidates():
+                cap = cv2.VideoCapture(self.camera_index, backend)
+                if cap.isOpened():
+                    self.cap, self.active_backend = cap, backend
+                    break
+                cap.release()
             
-            if not self.cap.isOpened():
+            if self.cap is None:
                 print(f"Erro: Não foi possível abrir a câmera {self.camera_index}")
                 return False
             
-            # Configura resolução
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
-            
-            # Configura FPS
-            self.cap.set(cv2.CAP_PROP_FPS, 30)
+            if self.is_device:
+                self._negotiate_format()
+            self.active_fourcc = fourcc_to_str(self.cap.get(cv2.CAP_PROP_FOURCC))
+            self._frame_times.clear()
+            self._source_ended = False
             
             self.is_opened = True
             print(f"Câmera {self.camera_index} iniciada com sucesso")
@@ -56,28 +177,176 @@ class CameraManager:
         """
         Lê um frame da câmera.
         
+        Com a thread de captura ativa, decodifica o frame mais recente obtido
+        por ela (esperando um novo, se necessário); caso contrário equivale a
+        grab() seguido de retrieve().
+        
         Returns:
             Tuple contendo:
             - bool: True se o frame foi lido com sucesso
             - np.ndarray: Frame capturado ou None se houve erro
         """
+        if self.capture_thread_active:
+            return self.read_latest()
+        
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+    
+    def grab(self) -> bool:
+        """
+        Obtém o próximo frame do driver sem decodificá-lo.
+        
+        O instante da captura fica em last_grab_time.
+        
+        Returns:
+            True se um frame foi obtido
+        """
+        if not self.is_opened or self.cap is None or self.is_paused:
+            return False
+        
+        try:
+            with self._capture_lock:
+                started = time.perf_counter()
+                ret = self.cap.grab()
+                grabbed_at = time.time()
+                elapsed_ms = (time.perf_counter() - started) * 1000.0
+            
+            if not ret:
+                if not self.is_device:
+                    # Fim do arquivo de vídeo
+                    self._source_ended = True
+                return False
+            
+            with self._new_frame:
+                self.grab_time_ms = _ema(self.grab_time_ms, elapsed_ms, self.frames_grabbed)
+                self.frames_grabbed += 1
+                self._grab_sequence += 1
+                self.last_grab_time = grabbed_at
+                self._frame_times.append(started)
+                self._new_frame.notify_all()
+            return True
+            
+        except Exception as e:
+            print(f"Erro ao obter frame: {e}")
+            return False
+    
+    def retrieve(self) -> Tuple[bool, Optional[np.ndarray]]:
+        """
+        Decodifica o último frame obtido por grab().
+        
+        O instante em que esse frame foi obtido fica em last_frame_time.
+        
+        Returns:
+            Tuple (sucesso, frame BGR espelhado ou None)
+        """
         if not self.is_opened or self.cap is None:
             return False, None
         
         try:
-            ret, frame = self.cap.read()
+            with self._capture_lock:
+                sequence, grabbed_at = self._grab_sequence, self.last_grab_time
+                if sequence == 0:
+                    return False, None
+                started = time.perf_counter()
+                ret, frame = self.cap.retrieve()
+                elapsed_ms = (time.perf_counter() - started) * 1000.0
             
-            if ret:
-                # Espelha a imagem horizontalmente para efeito de espelho
-                frame = cv2.flip(frame, 1)
-                return True, frame
-            else:
+            if not ret:
                 return False, None
-                
+            
+            if sequence != self._decoded_sequence:
+                self.decode_time_ms = _ema(self.decode_time_ms, elapsed_ms, self.frames_decoded)
+                self.frames_decoded += 1
+                self._decoded_sequence = sequence
+            self.last_frame_time = grabbed_at
+            # Espelha a imagem horizontalmente para efeito de espelho
+            return True, cv2.flip(frame, 1)
+            
         except Exception as e:
             print(f"Erro ao ler frame: {e}")
             return False, None
     
+    def read_latest(self, timeout: float = 1.0) -> Tuple[bool, Optional[np.ndarray]]:
+        """
+        Decodifica o frame mais recente da thread de captura.
+        
+        Espera até timeout segundos se o frame atual já foi entregue; os
+        frames obtidos nesse meio tempo e não lidos nunca são decodificados.
+        
+        Returns:
+            Tuple (sucesso, frame BGR espelhado ou None)
+        """
+        deadline = time.monotonic() + timeout
+        with self._new_frame:
+            while self._grab_sequence == self._decoded_sequence:
+                remaining = deadline - time.monotonic()
+                if self._source_ended or not self.capture_thread_active or remaining <= 0:
+                    return False, None
+                self._new_frame.wait(remaining)
+        return self.retrieve()
+    
+    def start_capture_thread(self) -> bool:
+        """
+        Inicia a thread que obtém frames continuamente (sem decodificar).
+        
+        Mantém o buffer do driver vazio, de modo que read_frame() sempre
+        entregue o frame mais recente. Arquivos de vídeo são lidos no ritmo
+        do seu FPS, como uma câmera.
+        
+        Returns:
+            True se a thread está em execução
+        """
+        if not self.is_opened or self.cap is None:
+            return False
+        if self.capture_thread_active:
+            return True
+        
+        self._capture_running = True
+        self._capture_thread = threading.Thread(target=self._capture_loop, name='camera-capture', daemon=True)
+        self._capture_thread.start()
+        return True
+    
+    def stop_capture_thread(self):
+        """
+        Para a thread de captura; read_frame() volta a ler de forma síncrona.
+        """
+        thread = self._capture_thread
+        self._capture_running = False
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=2.0)
+        self._capture_thread = None
+        with self._new_frame:
+            self._new_frame.notify_all()
+    
+    def _capture_loop(self):
+        interval = 0.0
+        if not self.is_device:
+            source_fps = self.cap.get(cv2.CAP_PROP_FPS)
+            interval = 1.0 / source_fps if source_fps > 0 else 1.0 / max(self.fps, 1)
+        next_grab = time.perf_counter()
+        
+        while self._capture_running and self.is_opened:
+            if self.is_paused:
+                time.sleep(0.05)
+                next_grab = time.perf_counter()
+                continue
+            
+            if interval:
+                delay = next_grab - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                # Atrasos não se acumulam: o ritmo recomeça a partir de agora
+                next_grab = max(next_grab + interval, time.perf_counter() - interval)
+            
+            if not self.grab():
+                if self._source_ended:
+                    break
+                time.sleep(0.01)
+        
+        with self._new_frame:
+            self._new_frame.notify_all()
+    
     def get_camera_info(self) -> dict:
         """
         Obtém informações da câmera.
@@ -89,16 +358,28 @@ class CameraManager:
             return {}
         
         try:
-            info = {
-                'width': int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
-                'height': int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
-                'fps': self.cap.get(cv2.CAP_PROP_FPS),
-                'brightness': self.cap.get(cv2.CAP_PROP_BRIGHTNESS),
-                'contrast': self.cap.get(cv2.CAP_PROP_CONTRAST),
-                'saturation': self.cap.get(cv2.CAP_PROP_SATURATION),
-                'hue': self.cap.get(cv2.CAP_PROP_HUE)
-            }
-            return info
+            # O driver não aceita consultas concorrentes com o grab da thread de captura
+            with self._capture_lock:
+                return {
+                    'width': int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                    'height': int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                    'fps': self.cap.get(cv2.CAP_PROP_FPS),
+                    'fps_requested': self.fps,
+                    'fps_measured': round(self.measured_fps, 2),
+                    'grab_time_ms': round(self.grab_time_ms, 3),
+                    'decode_time_ms': round(self.decode_time_ms, 3),
+                    'frames_grabbed': self.frames_grabbed,
+                    'frames_decoded': self.frames_decoded,
+                    'frames_skipped': self.frames_skipped,
+                    'capture_thread': self.capture_thread_active,
+                    'fourcc': self.active_fourcc,
+                    'backend': self.cap.getBackendName(),
+                    'buffer_size': self.cap.get(cv2.CAP_PROP_BUFFERSIZE),
+                    'brightness': self.cap.get(cv2.CAP_PROP_BRIGHTNESS),
+                    'contrast': self.cap.get(cv2.CAP_PROP_CONTRAST),
+                    'saturation': self.cap.get(cv2.CAP_PROP_SATURATION),
+                    'hue': self.cap.get(cv2.CAP_PROP_HUE)
+                }
         except Exception as e:
             print(f"Erro ao obter informações da câmera: {e}")
             return {}
@@ -118,7 +399,8 @@ class CameraManager:
             return False
         
         try:
-            return self.cap.set(property_id, value)
+            with self._capture_lock:
+                return self.cap.set(property_id, value)
         except Exception as e:
             print(f"Erro ao definir propriedade da câmera: {e}")
             return False
@@ -138,8 +420,9 @@ class CameraManager:
             return False
         
         try:
-            success_w = self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
-            success_h = self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            with self._capture_lock:
+                success_w = self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+                success_h = self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
             
             if success_w and success_h:
                 self.width = width
@@ -151,13 +434,117 @@ class CameraManager:
             print(f"Erro ao alterar resolução: {e}")
             return False
     
+    def probe_modes(self, resolutions: Sequence[Tuple[int, int]] = COMMON_RESOLUTIONS,
+                    fourccs: Optional[Sequence[str]] = None) -> List[dict]:
+        """
+        Testa quais combinações de formato e resolução o driver aceita.
+        
+        Cada modo é configurado e lido de volta; ao final o modo negociado
+        em start_camera() é restaurado. Só se aplica a câmeras (índice).
+        
+        Args:
+            resolutions: Resoluções (largura, altura) a testar
+            fourccs: Formatos a testar (padrão: os da preferência configurada)
+            
+        Returns:
+            Lista de modos aceitos: {'fourcc', 'width', 'height', 'fps'}
+        """
+        if not self.is_opened or self.cap is None or not self.is_device:
+            return []
+        
+        modes = []
+        # A thread de captura não pode obter frames no meio da troca de modos
+        with self._capture_lock:
+            for fourcc in fourccs or self.fourcc_preference or [self.active_fourcc]:
+                for width, height in resolutions:
+                    mode = self._apply_mode(fourcc, width, height)
+                    if mode['fourcc'] == fourcc and (mode['width'], mode['height']) == (width, height):
+                        if mode not in modes:
+                            modes.append(mode)
+            
+            self._negotiate_format()
+        return modes
+    
+    def _backend_candidates(self) -> List[int]:
+        if isinstance(self.backend, int):
+            return [self.backend, cv2.CAP_ANY]
+        
+        backend = CAMERA_BACKENDS.get(str(self.backend).lower())
+        if backend is not None:
+            return [backend, cv2.CAP_ANY] if backend != cv2.CAP_ANY else [backend]
+        
+        # 'auto': V4L2 direto no Linux evita a camada GStreamer/FFmpeg
+        if self.is_device and sys.platform.startswith('linux'):
+            return [cv2.CAP_V4L2, cv2.CAP_ANY]
+        return [cv2.CAP_ANY]
+    
+    def _apply_mode(self, fourcc: Optional[str], width: int, height: int) -> dict:
+        # O formato precisa ser definido antes da resolução (V4L2)
+        if fourcc:
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self.cap.set(cv2.CAP_PROP_FPS, self.fps)
+        return {
+            'fourcc': fourcc_to_str(self.cap.get(cv2.CAP_PROP_FOURCC)),
+            'width': int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'fps': self.cap.get(cv2.CAP_PROP_FPS)
+        }
+    
+    def _negotiate_format(self):
+        """
+        Escolhe o primeiro formato da preferência que entrega a resolução e o
+        FPS pedidos; se nenhum entregar, fica com o de maior taxa de pixels.
+        """
+        best, best_score = None, -1.0
+        for fourcc in self.fourcc_preference or [None]:
+            mode = self._apply_mode(fourcc, self.width, self.height)
+            if fourcc and mode['fourcc'] != fourcc:
+                continue
+            if (mode['width'], mode['height']) == (self.width, self.height) and mode['fps'] >= self.fps:
+                best = fourcc
+                break
+            score = mode['width'] * mode['height'] * max(mode['fps'], 1.0)
+            if score > best_score:
+                best, best_score = fourcc, score
+        
+        self._apply_mode(best, self.width, self.height)
+        if self.buffer_size is not None:
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size)
+    
+    def pause_camera(self):
+        """
+        Pausa a leitura de frames mantendo o dispositivo aberto, permitindo
+        retomar a captura sem reabrir a câmera.
+        """
+        if self.is_opened:
+            self.is_paused = True
+    
+    def resume_camera(self) -> bool:
+        """
+        Retoma a leitura de frames após uma pausa.
+        
+        Returns:
+            True se a câmera continua aberta e a captura foi retomada
+        """
+        if not self.is_opened or self.cap is None:
+            return False
+        
+        self.is_paused = False
+        # A pausa não entra no cálculo do FPS medido
+        self._frame_times.clear()
+        return True
+    
     def stop_camera(self):
         """
         Para a captura da câmera e libera recursos.
         """
+        self.stop_capture_thread()
         if self.cap is not None:
             self.cap.release()
             self.is_opened = False
+            self.is_paused = False
             print("Câmera parada")
     
     def __del__(self):
@@ -166,3 +553,120 @@ class CameraManager:
         """
         self.stop_camera()
 
+
+class SynchronizedCapture:
+    """
+    Captura sincronizada de várias câmeras.
+    
+    Os grabs de todas as câmeras são disparados ao mesmo tempo (uma thread
+    por câmera; grab() não decodifica e libera o GIL), o que deixa os frames
+    de um conjunto próximos no tempo. Cada frame carrega o instante da sua
+    captura, usado para correlacionar eventos entre câmeras.
+    """
+    
+    def __init__(self, cameras: Sequence[CameraManager], max_skew: float = 0.02):
+        """
+        Inicializa a captura sincronizada.
+        
+        Args:
+            cameras: Câmeras já configuradas
+            max_skew: Diferença máxima (s) entre capturas de um conjunto para
+                      considerá-lo sincronizado
+        """
+        self.cameras = list(cameras)
+        self.max_skew = max_skew
+        self._executor = None
+        # Resultado do último grab_all por câmera (None: retrieve_all sem grab_all)
+        self._grabbed: Optional[List[bool]] = None
+        
+        self.sets_captured = 0
+        self.sets_out_of_sync = 0
+        self.last_skew = 0.0
+        self.max_skew_seen = 0.0
+    
+    def start(self) -> bool:
+        """
+        Inicia todas as câmeras.
+        
+        Returns:
+            True se todas foram iniciadas
+        """
+        started = all([camera.start_camera() for camera in self.cameras])
+        if started and self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.cameras)))
+        return started
+    
+    def grab_all(self) -> List[Optional[float]]:
+        """
+        Obtém um frame de cada câmera ao mesmo tempo.
+        
+        Returns:
+            Instante da captura de cada câmera (None onde o grab falhou)
+        """
+        if self._executor is None or len(self.cameras) == 1:
+            results = [camera.grab() for camera in self.cameras]
+        else:
+            results = list(self._executor.map(lambda camera: camera.grab(), self.cameras))
+        self._grabbed = results
+        
+        timestamps = [camera.last_grab_time if ok else None
+                      for camera, ok in zip(self.cameras, results)]
+        captured = [t for t in timestamps if t is not None]
+        if len(captured) == len(self.cameras) and captured:
+            self.last_skew = max(captured) - min(captured)
+            self.max_skew_seen = max(self.max_skew_seen, self.last_skew)
+            self.sets_captured += 1
+            if self.last_skew > self.max_skew:
+                self.sets_out_of_sync += 1
+        return timestamps
+    
+    def retrieve_all(self) -> List[Tuple[bool, Optional[np.ndarray], Optional[float]]]:
+        """
+        Decodifica os frames obtidos pelo último grab_all().
+        
+        Returns:
+            Lista de (sucesso, frame, instante da captura) por câmera; câmeras
+            cujo grab falhou vêm como (False, None, None), não com o frame anterior
+        """
+        frames = []
+        for index, camera in enumerate(self.cameras):
+            if self._grabbed is not None and not self._grabbed[index]:
+                frames.append((False, None, None))
+                continue
+            ret, frame = camera.retrieve()
+            frames.append((ret, frame, camera.last_frame_time if ret else None))
+        return frames
+    
+    def read(self) -> List[Tuple[bool, Optional[np.ndarray], Optional[float]]]:
+        """
+        Obtém e decodifica um conjunto sincronizado (grab_all + retrieve_all).
+        """
+        self.grab_all()
+        return self.retrieve_all()
+    
+    def get_stats(self) -> dict:
+        """
+        Retorna a diferença entre as capturas e os contadores de conjuntos.
+        """
+        return {
+            'cameras': len(self.cameras),
+            'sets_captured': self.sets_captured,
+            'sets_out_of_sync': self.sets_out_of_sync,
+            'last_skew_ms': round(self.last_skew * 1000.0, 3),
+            'max_skew_ms': round(self.max_skew_seen * 1000.0, 3)
+        }
+    
+    def stop(self):
+        """
+        Para todas as câmeras.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for camera in self.cameras:
+            camera.stop_camera()
+
+
+def _ema(current: float, sample: float, count: int) -> float:
+    # Média móvel exponencial (a primeira amostra inicializa a média)
+    return sample if count == 0 else 0.9 * current + 0.1 * sample
@@ -0,0 +1,297 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+
+class ClipRecorder:
+    """
+    Grava clipes de vídeo disparados pela presença de faces.
+
+    A thread de detecção apenas entrega a referência do frame (submit), sem
+    cópia nem espera: frames acima do FPS de gravação são ignorados e, se a
+    fila estiver cheia, o mais antigo é descartado. Uma thread própria
+    comprime os frames em JPEG e os mantém em um buffer circular limitado
+    por tempo (pré-gravação) e por bytes. Quando uma face aparece, o buffer e
+    os frames seguintes vão para a thread de escrita até `post_roll`
+    segundos sem faces; presenças que chegam nesse intervalo estendem o
+    mesmo clipe. Disco e decodificação/codificação de vídeo só são usados
+    durante eventos; se o disco não acompanhar, a fila de escrita é limitada
+    e os frames excedentes são descartados (contados).
+    """
+
+    def __init__(self,
+                 output_dir: str,
+                 pre_roll: float = 5.0,
+                 post_roll: float = 5.0,
+                 record_fps: float = 10.0,
+                 jpeg_quality: int = 80,
+                 max_buffer_bytes: int = 32 * 1024 * 1024,
+                 max_clip_seconds: float = 300.0,
+                 fourcc: str = 'MJPG',
+                 redactor=None,
+                 queue_size: int = 4,
+                 write_queue_size: int = 256):
+        """
+        Inicializa o gravador.
+
+        Args:
+            output_dir: Diretório dos clipes (criado se não existir)
+            pre_roll: Segundos gravados antes do evento
+            post_roll: Segundos gravados após a última face
+            record_fps: FPS dos clipes (frames excedentes nem são comprimidos)
+            jpeg_quality: Qualidade JPEG dos frames no buffer (0 - 100)
+            max_buffer_bytes: Limite de memória do buffer de pré-gravação
+            max_clip_seconds: Duração máxima de um clipe (eventos longos são divididos)
+            fourcc: Codec do arquivo .avi
+            redactor: FaceRedactor opcional aplicado antes da compressão
+            queue_size: Frames aguardando compressão antes de descartar os mais antigos
+            write_queue_size: Frames comprimidos aguardando o disco antes de descartar os novos
+        """
+        self.output_dir = output_dir
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.record_fps = record_fps
+        self.jpeg_quality = jpeg_quality
+        self.max_buffer_bytes = max_buffer_bytes
+        self.max_clip_seconds = max_clip_seconds
+        self.fourcc = fourcc
+        self.redactor = redactor
+
+        self._interval = 1.0 / record_fps
+        self._last_submit = None
+        self._incoming = deque(maxlen=queue_size)
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+        self._writer_thread = None
+        # Mensagens para a thread de escrita: ('open', caminho), ('frame', jpeg), ('close', None)
+        # (limitada: frames são descartados se o disco atrasar; controle sempre entra)
+        self._writes = queue.Queue(maxsize=max(1, write_queue_size))
+
+        self._buffer = deque()
+        self._buffer_bytes = 0
+        self._present = False
+        self._clip_start = None
+        self._last_presence = None
+        # Último frame enviado a um clipe (a pré-gravação não repete frames já gravados)
+        self._written_until = None
+        self._last_arrival = None
+
+        self.frames_submitted = 0
+        self.frames_sampled = 0
+        self.frames_dropped = 0
+        self.frames_evicted = 0
+        self.frames_write_dropped = 0
+        self.events = 0
+        self.events_merged = 0
+        self.clips_written = 0
+        self.bytes_written = 0
+        self.last_clip = None
+
+    @property
+    def recording(self) -> bool:
+        return self._clip_start is not None
+
+    def submit(self, frame: np.ndarray, timestamp: float, faces_info: Optional[List[dict]] = None) -> bool:
+        """
+        Entrega um frame ao gravador (chamada pela thread de detecção).
+
+        Não copia nem bloqueia: o frame não pode ser modificado depois.
+
+        Args:
+            frame: Frame BGR
+            timestamp: Instante da captura
+            faces_info: Faces detectadas no frame; None mantém o estado de
+                        presença anterior (ex.: frame pulado pelo filtro de movimento)
+
+        Returns:
+            True se o frame foi aceito para gravação
+        """
+        self.frames_submitted += 1
+        if self._last_submit is not None and 0 <= timestamp - self._last_submit < self._interval * 0.9:
+            return False
+        self._last_submit = timestamp
+
+        if len(self._incoming) == self._incoming.maxlen:
+            self.frames_dropped += 1
+        self._incoming.append((frame, timestamp, faces_info))
+        self._wake.set()
+        return True
+
+    def start(self):
+        """
+        Inicia as threads de compressão e de escrita.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='clip-recorder', daemon=True)
+        self._writer_thread = threading.Thread(target=self._write_clips, name='clip-writer', daemon=True)
+        self._thread.start()
+        self._writer_thread.start()
+
+    def stop(self):
+        """
+        Encerra as threads, finalizando o clipe em andamento.
+        """
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        if self._writer_thread is not None:
+            self._writes.put(('stop', None))
+            self._writer_thread.join(timeout=10.0)
+            self._writer_thread = None
+
+    def get_stats(self) -> dict:
+        """
+        Retorna contadores do gravador.
+        """
+        return {
+            'recording': self.recording,
+            'frames_submitted': self.frames_submitted,
+            'frames_sampled': self.frames_sampled,
+            'frames_dropped': self.frames_dropped,
+            'frames_evicted': self.frames_evicted,
+            'frames_write_dropped': self.frames_write_dropped,
+            'write_queue': self._writes.qsize(),
+            'buffer_frames': len(self._buffer),
+            'buffer_bytes': self._buffer_bytes,
+            'events': self.events,
+            'events_merged': self.events_merged,
+            'clips_written': self.clips_written,
+            'bytes_written': self.bytes_written,
+            'last_clip': self.last_clip
+        }
+
+    # ------------------------------------------------------------ compressão
+
+    def _run(self):
+        while self._running:
+            self._wake.wait(0.5)
+            self._wake.clear()
+            while self._incoming:
+                try:
+                    frame, timestamp, faces_info = self._incoming.popleft()
+                except IndexError:
+                    break
+                try:
+                    self._process(frame, timestamp, faces_info)
+                except Exception as e:
+                    print(f"Erro ao gravar frame do clipe: {e}")
+            if self.recording and time.monotonic() - self._last_arrival > self.post_roll:
+                # Câmera parada durante o evento: nenhum frame chegará para fechar o clipe
+                self._close_clip()
+        if self.recording:
+            self._close_clip()
+
+    def _process(self, frame: np.ndarray, timestamp: float, faces_info: Optional[List[dict]]):
+        if self.redactor is not None:
+            # Cópia apenas nesta thread: o frame original pertence à detecção.
+            # Sem resultado (filtro de movimento), as caixas mantidas são
+            # reaplicadas sem envelhecer: a face continua onde estava
+            if faces_info is None:
+                frame = self.redactor.apply(frame.copy(), self.redactor.held_boxes())
+            else:
+                frame = self.redactor.redact(frame.copy(), faces_info)
+
+        ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return
+        jpeg = encoded.tobytes()
+        self.frames_sampled += 1
+        self._last_arrival = time.monotonic()
+
+        if faces_info is not None:
+            self._present = len(faces_info) > 0
+        if self._present:
+            if not self.recording:
+                self._open_clip(timestamp)
+            elif timestamp - self._last_presence > self._interval * 1.5:
+                # Nova presença durante o pós-evento: o clipe é estendido
+                self.events_merged += 1
+            self._last_presence = timestamp
+
+        self._buffer.append((timestamp, jpeg))
+        self._buffer_bytes += len(jpeg)
+        self._trim(timestamp)
+
+        if self.recording:
+            self._put_frame(jpeg)
+            self._written_until = timestamp
+            if not self._present and timestamp - self._last_presence >= self.post_roll:
+                self._close_clip()
+            elif timestamp - self._clip_start >= self.max_clip_seconds:
+                # Evento longo: fecha e abre outro clipe sem pré-gravação repetida
+                self._close_clip()
+                self._open_clip(timestamp, pre_roll=False)
+
+    def _trim(self, now: float):
+        while self._buffer:
+            if self._buffer_bytes > self.max_buffer_bytes:
+                # Limite de memória atingido antes de completar a pré-gravação
+                self.frames_evicted += 1
+            elif now - self._buffer[0][0] <= self.pre_roll:
+                break
+            _, jpeg = self._buffer.popleft()
+            self._buffer_bytes -= len(jpeg)
+
+    def _open_clip(self, timestamp: float, pre_roll: bool = True):
+        self.events += 1
+        self._clip_start = timestamp
+        self._last_presence = timestamp
+        name = time.strftime("clip_%Y%m%d_%H%M%S", time.localtime(timestamp))
+        path = os.path.join(self.output_dir, f"{name}_{int(timestamp * 1000) % 1000:03d}.avi")
+        self._writes.put(('open', path))
+        if pre_roll:
+            for frame_time, jpeg in self._buffer:
+                if self._written_until is None or frame_time > self._written_until:
+                    self._put_frame(jpeg)
+                    self._written_until = frame_time
+
+    def _close_clip(self):
+        self._clip_start = None
+        self._present = False
+        self._writes.put(('close', None))
+
+    # --------------------------------------------------------------- escrita
+
+    def _put_frame(self, jpeg: bytes):
+        try:
+            self._writes.put_nowait(('frame', jpeg))
+        except queue.Full:
+            self.frames_write_dropped += 1
+
+    def _write_clips(self):
+        writer, path = None, None
+        while True:
+            kind, value = self._writes.get()
+            try:
+                if kind == 'open':
+                    writer, path = None, value
+                elif kind == 'frame' and path is not None:
+                    image = cv2.imdecode(np.frombuffer(value, dtype=np.uint8), cv2.IMREAD_COLOR)
+                    if writer is None:
+                        height, width = image.shape[:2]
+                        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*self.fourcc),
+                                                 self.record_fps, (width, height))
+                    writer.write(image)
+                elif kind in ('close', 'stop'):
+                    if writer is not None:
+                        writer.release()
+                        self.clips_written += 1
+                        self.bytes_written += os.path.getsize(path)
+                        self.last_clip = path
+                    writer, path = None, None
+                    if kind == 'stop':
+                        return
+            except Exception as e:
+                print(f"Erro ao escrever clipe: {e}")
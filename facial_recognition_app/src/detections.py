@@ -0,0 +1,202 @@
+import numpy as np
+from typing import List, Tuple
+
+
+# Pontos-chave do detector do MediaPipe: olhos, ponta do nariz, boca e orelhas
+NUM_KEYPOINTS = 6
+
+# Detecções de um frame em um único array estruturado:
+#   box       - (x, y, largura, altura) em pixels
+#   score     - confiança do detector
+#   keypoints - NUM_KEYPOINTS pontos (x, y) em pixels
+DETECTION_DTYPE = np.dtype([
+    ('box', np.float32, (4,)),
+    ('score', np.float32),
+    ('keypoints', np.float32, (NUM_KEYPOINTS, 2))
+])
+
+
+def empty_detections(count: int = 0) -> np.ndarray:
+    """
+    Cria um array de detecções zerado.
+    """
+    return np.zeros(count, dtype=DETECTION_DTYPE)
+
+
+def from_mediapipe(detections, width: int, height: int,
+                   offset_x: float = 0.0, offset_y: float = 0.0) -> np.ndarray:
+    """
+    Converte as detecções do MediaPipe (protobuf) em um array estruturado.
+
+    Os campos de cada protobuf são lidos uma única vez para uma matriz; a
+    conversão para pixels e o deslocamento (recortes) são feitos no array.
+
+    Args:
+        detections: results.detections do FaceDetection (ou None)
+        width: Largura da imagem processada
+        height: Altura da imagem processada
+        offset_x: Posição x da imagem processada no frame (recortes)
+        offset_y: Posição y da imagem processada no frame (recortes)
+
+    Returns:
+        Array DETECTION_DTYPE com caixas e pontos em pixels do frame
+    """
+    if not detections:
+        return empty_detections()
+
+    raw = np.array([_raw_detection(detection) for detection in detections], dtype=np.float32)
+    scale = np.array([width, height], dtype=np.float32)
+    offset = np.array([offset_x, offset_y], dtype=np.float32)
+
+    result = empty_detections(len(raw))
+    result['box'][:, :2] = raw[:, 0:2] * scale + offset
+    result['box'][:, 2:] = raw[:, 2:4] * scale
+    result['score'] = raw[:, 4]
+    result['keypoints'] = raw[:, 5:].reshape(-1, NUM_KEYPOINTS, 2) * scale + offset
+    return result
+
+
+def overlap_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray, metric: str = 'iou') -> np.ndarray:
+    """
+    Calcula a sobreposição entre dois conjuntos de caixas.
+
+    Args:
+        boxes_a: Array (N, 4) com caixas (x, y, largura, altura)
+        boxes_b: Array (M, 4) com caixas (x, y, largura, altura)
+        metric: 'iou' (interseção sobre união) ou 'iom' (interseção sobre a menor área)
+
+    Returns:
+        Array (N, M) com a sobreposição de cada par
+    """
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    # Cantos de cada conjunto calculados uma vez; lados da interseção (N, M)
+    a_end, b_end = a[:, :2] + a[:, 2:], b[:, :2] + b[:, 2:]
+    iw = np.minimum(a_end[:, 0, None], b_end[:, 0]) - np.maximum(a[:, 0, None], b[:, 0])
+    ih = np.minimum(a_end[:, 1, None], b_end[:, 1]) - np.maximum(a[:, 1, None], b[:, 1])
+    intersection = np.maximum(iw, 0, out=iw)
+    intersection *= np.maximum(ih, 0, out=ih)
+    area_a, area_b = a[:, 2] * a[:, 3], b[:, 2] * b[:, 3]
+
+    if metric == 'iom':
+        denominator = np.minimum(area_a[:, None], area_b[None, :])
+    else:
+        denominator = area_a[:, None] + area_b[None, :] - intersection
+    return intersection / np.maximum(denominator, 1e-6)
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    Calcula a interseção sobre união entre dois conjuntos de caixas.
+
+    Returns:
+        Array (N, M) com o IoU de cada par
+    """
+    return overlap_matrix(boxes_a, boxes_b, 'iou')
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, threshold: float = 0.5, metric: str = 'iou') -> np.ndarray:
+    """
+    Supressão de não-máximos: mantém a caixa de maior pontuação de cada grupo sobreposto.
+
+    A sobreposição de todos os pares é calculada de uma vez; o laço apenas
+    percorre as caixas ainda não suprimidas.
+
+    Args:
+        boxes: Array (N, 4) com caixas (x, y, largura, altura)
+        scores: Array (N,) com a pontuação de cada caixa
+        threshold: Sobreposição a partir da qual a caixa de menor pontuação é suprimida
+        metric: 'iou' ou 'iom' (interseção sobre a menor área: suprime também
+                caixas parciais contidas em outra, como faces cortadas na borda de um recorte)
+
+    Returns:
+        Índices das caixas mantidas, em ordem decrescente de pontuação
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    order = np.argsort(-np.asarray(scores, dtype=np.float32), kind='stable')
+    if len(order) <= 1:
+        return order
+
+    ordered = boxes[order]
+    # Apenas pares (i, j) com j depois de i na ordem de pontuação
+    suppress = np.triu(overlap_matrix(ordered, ordered, metric) > threshold, k=1)
+    keep = np.ones(len(order), dtype=bool)
+    for i in np.flatnonzero(suppress.any(axis=1)):
+        if keep[i]:
+            keep &= ~suppress[i]
+    return order[keep]
+
+
+def match_boxes(overlaps: np.ndarray, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Associação gulosa um-para-um pelos pares de maior sobreposição.
+
+    Apenas os pares acima do limiar são ordenados e percorridos.
+
+    Args:
+        overlaps: Array (N, M) de sobreposições (ex.: iou_matrix)
+        threshold: Sobreposição mínima de um par associado
+
+    Returns:
+        Tuple (linhas, colunas) dos pares associados
+    """
+    rows, cols = np.nonzero(overlaps >= threshold)
+    if len(rows) == 0:
+        return rows, cols
+
+    order = np.argsort(-overlaps[rows, cols], kind='stable')
+    rows, cols = rows[order], cols[order]
+    if len(rows) > 1 and (len(np.unique(rows)) < len(rows) or len(np.unique(cols)) < len(cols)):
+        used_rows = np.zeros(overlaps.shape[0], dtype=bool)
+        used_cols = np.zeros(overlaps.shape[1], dtype=bool)
+        keep = np.zeros(len(rows), dtype=bool)
+        for k, (row, col) in enumerate(zip(rows.tolist(), cols.tolist())):
+            if not used_rows[row] and not used_cols[col]:
+                used_rows[row] = used_cols[col] = keep[k] = True
+        rows, cols = rows[keep], cols[keep]
+    return rows, cols
+
+
+def clip_boxes(boxes: np.ndarray, width: int, height: int) -> np.ndarray:
+    """
+    Recorta as caixas (x, y, largura, altura) aos limites do frame.
+
+    Returns:
+        Array (N, 4) int32; caixas fora do frame ficam com largura/altura 0
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    x0 = np.clip(boxes[:, 0], 0, width)
+    y0 = np.clip(boxes[:, 1], 0, height)
+    x1 = np.clip(boxes[:, 0] + boxes[:, 2], 0, width)
+    y1 = np.clip(boxes[:, 1] + boxes[:, 3], 0, height)
+    return np.round(np.stack([x0, y0, x1 - x0, y1 - y0], axis=1)).astype(np.int32)
+
+
+def to_faces_info(detections: np.ndarray) -> List[dict]:
+    """
+    Converte as detecções no formato de FaceDetector.detect_faces.
+
+    Arredondamento e centros são calculados no array; cada face recebe
+    'id' (Face_<n> na ordem das detecções), 'confidence', 'bbox' e 'center'.
+    """
+    boxes = np.round(detections['box']).astype(np.int32)
+    centers = boxes[:, :2] + boxes[:, 2:] // 2
+    return [
+        {'id': f'Face_{idx + 1}', 'confidence': score, 'bbox': tuple(box), 'center': tuple(center)}
+        for idx, (box, center, score) in enumerate(zip(boxes.tolist(), centers.tolist(),
+                                                       detections['score'].tolist()))
+    ]
+
+
+def _raw_detection(detection) -> List[float]:
+    location = detection.location_data
+    bbox = location.relative_bounding_box
+    values = [bbox.xmin, bbox.ymin, bbox.width, bbox.height, detection.score[0]]
+    keypoints = location.relative_keypoints
+    for i in range(NUM_KEYPOINTS):
+        if i < len(keypoints):
+            values.extend((keypoints[i].x, keypoints[i].y))
+        else:
+            values.extend((0.0, 0.0))
+    return values
@@ -0,0 +1,134 @@
+import threading
+from typing import Callable, List, Optional
+from face_detector import FaceDetector
+
+
+class DetectorPool:
+    """
+    Pool de detectores faciais pré-aquecidos.
+
+    Construir os grafos do MediaPipe leva alguns segundos; o pool mantém
+    instâncias prontas para que iniciar/parar a detecção não pague esse custo
+    a cada ciclo.
+    """
+
+    def __init__(self,
+                 size: int = 1,
+                 factory: Optional[Callable[[], FaceDetector]] = None):
+        """
+        Inicializa o pool.
+
+        Args:
+            size: Quantidade máxima de detectores ociosos mantidos no pool
+            factory: Função que cria um novo detector (padrão: FaceDetector())
+        """
+        self.size = max(0, size)
+        self.factory = factory or FaceDetector
+        self._idle: List[FaceDetector] = []
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.recycled = 0
+
+    def warm_up(self) -> int:
+        """
+        Preenche o pool até o tamanho configurado.
+
+        Returns:
+            Quantidade de detectores criados
+        """
+        created = 0
+        while True:
+            with self._lock:
+                if len(self._idle) >= self.size:
+                    break
+            detector = self._create()
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append(detector)
+                    created += 1
+                    continue
+            detector.release()
+            break
+        return created
+
+    def acquire(self) -> FaceDetector:
+        """
+        Retira um detector do pool, criando um novo se não houver ocioso.
+
+        Returns:
+            Detector pronto para uso
+        """
+        with self._lock:
+            if self._idle:
+                self.reused += 1
+                return self._idle.pop()
+        return self._create()
+
+    def release(self, detector: Optional[FaceDetector]):
+        """
+        Devolve um detector ao pool. Se o pool estiver cheio, o detector é
+        liberado definitivamente.
+
+        Args:
+            detector: Detector obtido por acquire()
+        """
+        if detector is None:
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(detector)
+                return
+        detector.release()
+
+    def idle_count(self) -> int:
+        """
+        Retorna a quantidade de detectores ociosos no pool.
+        """
+        with self._lock:
+            return len(self._idle)
+
+    def get_stats(self) -> dict:
+        """
+        Retorna estatísticas de uso do pool.
+        """
+        with self._lock:
+            return {
+                'size': self.size,
+                'idle': len(self._idle),
+                'created': self.created,
+                'reused': self.reused,
+                'recycled': self.recycled
+            }
+
+    def recycle(self) -> int:
+        """
+        Substitui os detectores ociosos por novos (grafos e memória nativa
+        alocados do zero). Detectores em uso não são afetados.
+
+        Returns:
+            Quantidade de detectores recriados
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for detector in idle:
+            detector.release()
+        with self._lock:
+            self.recycled += len(idle)
+        self.warm_up()
+        return len(idle)
+
+    def close(self):
+        """
+        Libera todos os detectores ociosos.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for detector in idle:
+            detector.release()
+
+    def _create(self) -> FaceDetector:
+        detector = self.factory()
+        with self._lock:
+            self.created += 1
+        return detector
@@ -0,0 +1,416 @@
+"""
+Cadastro de faces na galeria: codificação de fotos avulsas e importação em lote.
+
+Importação de um diretório com uma subpasta por pessoa:
+    python src/enrollment.py fotos/ --gallery gallery.npz --workers 8
+
+Fotos na raiz do diretório usam o nome do arquivo (sem extensão) como nome.
+Um manifesto (<galeria>.manifest.npz) guarda o hash do conteúdo e o resultado
+de cada foto, de modo que rodar de novo sobre o mesmo diretório só processa
+as fotos novas ou alteradas.
+"""
+
+import argparse
+import hashlib
+import multiprocessing
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from face_gallery import FaceGallery, normalize_encodings
+from face_quality import FaceQualityScorer
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+# Maior lado (px) das fotos antes da detecção
+MAX_IMAGE_SIDE = 1024
+
+STATUS_OK = 'ok'
+STATUS_INVALID_IMAGE = 'invalid_image'
+STATUS_NO_FACE = 'no_face'
+STATUS_LOW_QUALITY = 'low_quality'
+STATUS_NO_LANDMARKS = 'no_landmarks'
+STATUS_DUPLICATE = 'duplicate'
+
+
+def encode_enrollment_image(detector, scorer: FaceQualityScorer, image: Optional[np.ndarray],
+                            min_quality: float = 0.5) -> dict:
+    """
+    Detecta, avalia e codifica a maior face de uma foto de cadastro.
+
+    Args:
+        detector: FaceDetector (de preferência com static_image_mode=True)
+        scorer: Avaliador de qualidade
+        image: Foto (BGR) ou None se não pôde ser decodificada
+        min_quality: Nota mínima para aceitar a face
+
+    Returns:
+        Dicionário com 'status' (ok, invalid_image, no_face, low_quality ou
+        no_landmarks), 'quality' e, se aceita, 'encoding' e 'bbox'
+    """
+    if image is None or image.size == 0:
+        return {'status': STATUS_INVALID_IMAGE, 'quality': 0.0}
+
+    scale = MAX_IMAGE_SIDE / max(image.shape[:2])
+    if scale < 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    _, faces_info = detector.detect_faces(image)
+    if not faces_info:
+        return {'status': STATUS_NO_FACE, 'quality': 0.0}
+
+    face = max(faces_info, key=lambda f: f['bbox'][2] * f['bbox'][3])
+    quality = scorer.score(image, face)['quality']
+    if quality < min_quality:
+        return {'status': STATUS_LOW_QUALITY, 'quality': quality}
+
+    encoding = detector.encoder.encode_face(image, face)
+    if encoding is None:
+        return {'status': STATUS_NO_LANDMARKS, 'quality': quality}
+
+    return {'status': STATUS_OK, 'quality': quality, 'encoding': encoding,
+            'bbox': [int(v) for v in face['bbox']]}
+
+
+def deduplicate(encodings: np.ndarray, existing: Optional[np.ndarray] = None,
+                threshold: float = 0.99) -> List[int]:
+    """
+    Escolhe, de forma gulosa, as codificações que não são quase idênticas
+    a uma já mantida (nem às existentes).
+
+    Args:
+        encodings: Array (N, D) de uma mesma identidade
+        existing: Array (M, D) já presente na galeria (normalizado)
+        threshold: Correlação a partir da qual duas codificações são duplicadas
+
+    Returns:
+        Índices das codificações mantidas
+    """
+    vectors = normalize_encodings(encodings)
+    similarity = vectors @ vectors.T
+    if existing is not None and len(existing):
+        blocked = (vectors @ np.asarray(existing, dtype=np.float32).T >= threshold).any(axis=1)
+    else:
+        blocked = np.zeros(len(vectors), dtype=bool)
+
+    kept = []
+    for i in range(len(vectors)):
+        if blocked[i]:
+            continue
+        kept.append(i)
+        blocked |= similarity[i] >= threshold
+    return kept
+
+
+def new_encodings(gallery: FaceGallery, name: str, encodings: np.ndarray,
+                  threshold: float = 0.99, rows: Optional[List[int]] = None) -> List[int]:
+    """
+    Índices das codificações de uma pessoa que não duplicam as já cadastradas.
+
+    Args:
+        gallery: Galeria de destino
+        name: Nome da pessoa
+        encodings: Array (N, D) com as novas codificações
+        threshold: Correlação a partir da qual duas codificações são duplicadas
+        rows: Linhas da pessoa na galeria, se já conhecidas
+
+    Returns:
+        Índices das codificações a adicionar
+    """
+    if rows is None:
+        rows = [row for row, existing in enumerate(gallery.names) if existing == name]
+    existing = gallery.vectors(rows) if rows else None
+    return deduplicate(encodings, existing, threshold)
+
+
+def file_hash(path: str) -> str:
+    """
+    Hash (SHA-1) do conteúdo de um arquivo.
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Estado de cada processo do pool (criado uma vez por processo)
+_worker = {}
+
+
+def _init_worker(min_quality: float):
+    from face_detector import FaceDetector
+
+    cv2.setNumThreads(1)
+    detector = FaceDetector(track_faces=False, static_image_mode=True)
+    # Sem anotações: a imagem desenhada não é usada no cadastro
+    detector.update_parameters(show_landmarks=False, show_bounding_box=False, show_face_id=False)
+    _worker['detector'] = detector
+    _worker['scorer'] = FaceQualityScorer()
+    _worker['min_quality'] = min_quality
+
+
+def _process_file(path: str) -> Tuple[str, str, float, Optional[np.ndarray]]:
+    try:
+        data = np.fromfile(path, dtype=np.uint8)
+    except OSError:
+        return path, STATUS_INVALID_IMAGE, 0.0, None
+
+    image = cv2.imdecode(data, cv2.IMREAD_COLOR) if data.size else None
+    result = encode_enrollment_image(_worker['detector'], _worker['scorer'], image, _worker['min_quality'])
+    return path, result['status'], result['quality'], result.get('encoding')
+
+
+class GalleryImporter:
+    """
+    Importa fotos rotuladas para a galeria usando um pool de processos.
+
+    Cada foto é identificada pelo hash do conteúdo: fotos já processadas
+    (mesmo caminho, tamanho e data, ou mesmo conteúdo) reaproveitam o
+    resultado do manifesto sem nova detecção.
+    """
+
+    def __init__(self,
+                 gallery: FaceGallery,
+                 manifest_path: Optional[str] = None,
+                 gallery_path: Optional[str] = None,
+                 workers: Optional[int] = None,
+                 batch_size: int = 5000,
+                 chunk_size: int = 32,
+                 min_quality: float = 0.5,
+                 dedup_threshold: float = 0.99):
+        """
+        Inicializa o importador.
+
+        Args:
+            gallery: Galeria de destino
+            manifest_path: Arquivo .npz com os resultados já processados (opcional)
+            gallery_path: Arquivo da galeria, gravado a cada lote antes do manifesto
+                          (sem ele o chamador grava a galeria e o manifesto pode
+                          registrar fotos que não chegaram ao disco)
+            workers: Processos de codificação (padrão: número de CPUs)
+            batch_size: Codificações acumuladas antes de cada escrita na galeria
+            chunk_size: Fotos enviadas por vez a cada processo
+            min_quality: Nota mínima de qualidade para aceitar uma foto
+            dedup_threshold: Correlação a partir da qual fotos da mesma pessoa são duplicadas
+        """
+        self.gallery = gallery
+        self.manifest_path = manifest_path
+        self.gallery_path = gallery_path
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.min_quality = min_quality
+        self.dedup_threshold = dedup_threshold
+
+        # caminho -> (tamanho, data, hash) e hash -> (status, qualidade, codificação)
+        self._files: Dict[str, tuple] = {}
+        self._results: Dict[str, tuple] = {}
+        if manifest_path and os.path.exists(manifest_path):
+            self._load_manifest()
+
+    @staticmethod
+    def scan(root: str) -> List[Tuple[str, str]]:
+        """
+        Lista as fotos do diretório com o nome de cada uma.
+
+        Returns:
+            Lista de (caminho, nome) em ordem alfabética
+        """
+        photos = []
+        for directory, _, files in os.walk(root):
+            relative = os.path.relpath(directory, root)
+            for filename in sorted(files):
+                if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                label = os.path.splitext(filename)[0] if relative == '.' else relative.split(os.sep)[0]
+                photos.append((os.path.join(directory, filename), label))
+        photos.sort()
+        return photos
+
+    def run(self, root: str, rebuild: bool = False) -> dict:
+        """
+        Importa as fotos de um diretório.
+
+        Args:
+            root: Diretório com as fotos
+            rebuild: Se True, também adiciona à galeria as fotos já presentes
+                     no manifesto (para reconstruir uma galeria vazia)
+
+        Returns:
+            Estatísticas da importação
+        """
+        started = time.time()
+        stats = defaultdict(int)
+        photos = self.scan(root)
+        stats['files'] = len(photos)
+
+        # Fotos novas ou alteradas: o hash é calculado só se tamanho/data mudaram.
+        # Cópias do mesmo conteúdo são processadas uma única vez.
+        pending, accepted = {}, []
+        for path, label in photos:
+            stat = os.stat(path)
+            known = self._files.get(path)
+            if known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime:
+                digest = known[2]
+            else:
+                digest = file_hash(path)
+                self._files[path] = (stat.st_size, stat.st_mtime, digest)
+
+            result = self._results.get(digest)
+            if result is None:
+                pending.setdefault(digest, []).append((path, label))
+                continue
+
+            stats['cached'] += 1
+            if rebuild and result[0] == STATUS_OK:
+                accepted.append((label, result[2]))
+
+        # Esquece arquivos removidos do diretório
+        scanned = {path for path, _ in photos}
+        self._files = {path: info for path, info in self._files.items()
+                       if path in scanned or not path.startswith(root)}
+
+        if pending:
+            digests = {copies[0][0]: digest for digest, copies in pending.items()}
+            # spawn: um fork com grafos do MediaPipe já em execução pode travar o filho
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                     initargs=(self.min_quality,),
+                                     mp_context=multiprocessing.get_context("spawn")) as executor:
+                for path, status, quality, encoding in executor.map(
+                        _process_file, list(digests), chunksize=self.chunk_size):
+                    digest = digests[path]
+                    self._results[digest] = (status, quality, encoding)
+                    stats['processed'] += 1
+                    for _, label in pending[digest]:
+                        if status == STATUS_OK:
+                            accepted.append((label, encoding))
+                        else:
+                            stats[status] += 1
+
+                    if len(accepted) >= self.batch_size:
+                        self._write_batch(accepted, stats)
+                        accepted = []
+
+        self._write_batch(accepted, stats)
+        stats['elapsed'] = round(time.time() - started, 2)
+        return dict(stats)
+
+    def _write_batch(self, accepted: List[Tuple[str, np.ndarray]], stats: dict):
+        if accepted:
+            # Linhas já existentes de cada nome, para não duplicar fotos entre lotes
+            existing_rows = defaultdict(list)
+            for row, name in enumerate(self.gallery.names):
+                existing_rows[name].append(row)
+
+            by_label = defaultdict(list)
+            for label, encoding in accepted:
+                by_label[label].append(encoding)
+
+            names, encodings = [], []
+            for label, group in by_label.items():
+                group = np.stack(group)
+                kept = new_encodings(self.gallery, label, group, self.dedup_threshold,
+                                     existing_rows.get(label, []))
+                stats[STATUS_DUPLICATE] += len(group) - len(kept)
+                names.extend([label] * len(kept))
+                encodings.append(group[kept])
+
+            if names:
+                self.gallery.add_many(names, np.concatenate(encodings))
+                stats['added'] += len(names)
+                self._save_gallery()
+
+        # O manifesto só registra fotos cujas codificações já estão na galeria gravada
+        if self.gallery_path and not os.path.exists(self.gallery_path):
+            self._save_gallery()
+        self._save_manifest()
+
+    def _save_gallery(self):
+        if self.gallery_path:
+            self.gallery.save(self.gallery_path)
+
+    def _load_manifest(self):
+        with np.load(self.manifest_path) as data:
+            for path, size, mtime, digest in zip(data['paths'], data['sizes'], data['mtimes'], data['hashes']):
+                self._files[str(path)] = (int(size), float(mtime), str(digest))
+            for digest, status, quality, encoding in zip(data['result_hashes'], data['statuses'],
+                                                         data['qualities'], data['encodings']):
+                self._results[str(digest)] = (str(status), float(quality),
+                                              encoding if str(status) == STATUS_OK else None)
+
+    def _save_manifest(self):
+        if not self.manifest_path:
+            return
+
+        paths = list(self._files)
+        digests = list(self._results)
+        dimensions = next((r[2].shape[0] for r in self._results.values() if r[2] is not None), 0)
+        encodings = np.zeros((len(digests), dimensions), dtype=np.float16)
+        for i, digest in enumerate(digests):
+            encoding = self._results[digest][2]
+            if encoding is not None:
+                encodings[i] = encoding
+
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f,
+                     paths=np.array(paths, dtype=str),
+                     sizes=np.array([self._files[p][0] for p in paths], dtype=np.int64),
+                     mtimes=np.array([self._files[p][1] for p in paths], dtype=np.float64),
+                     hashes=np.array([self._files[p][2] for p in paths], dtype=str),
+                     result_hashes=np.array(digests, dtype=str),
+                     statuses=np.array([self._results[d][0] for d in digests], dtype=str),
+                     qualities=np.array([self._results[d][1] for d in digests], dtype=np.float32),
+                     encodings=encodings)
+        os.replace(tmp_path, self.manifest_path)
+
+
+def main():
+    """
+    Importa um diretório de fotos rotuladas pela linha de comando.
+    """
+    parser = argparse.ArgumentParser(description="Importa fotos rotuladas para a galeria de faces")
+    parser.add_argument("directory", help="Diretório com uma subpasta por pessoa")
+    parser.add_argument("--gallery", default="gallery.npz", help="Arquivo da galeria (.npz)")
+    parser.add_argument("--storage", default="int8", choices=sorted(FaceGallery.STORAGE_TYPES),
+                        help="Armazenamento de uma galeria nova")
+    parser.add_argument("--workers", type=int, default=None, help="Processos de codificação")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Codificações por escrita na galeria")
+    parser.add_argument("--min-quality", type=float, default=0.5, help="Nota mínima de qualidade")
+    parser.add_argument("--dedup-threshold", type=float, default=0.99, help="Correlação de duplicata")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Readiciona as fotos do manifesto (galeria apagada ou nova)")
+    args = parser.parse_args()
+
+    if os.path.exists(args.gallery):
+        gallery = FaceGallery.load(args.gallery)
+    else:
+        gallery = FaceGallery(storage=args.storage)
+
+    importer = GalleryImporter(gallery,
+                               manifest_path=os.path.splitext(args.gallery)[0] + ".manifest.npz",
+                               gallery_path=args.gallery,
+                               workers=args.workers,
+                               batch_size=args.batch_size,
+                               min_quality=args.min_quality,
+                               dedup_threshold=args.dedup_threshold)
+    stats = importer.run(args.directory, rebuild=args.rebuild)
+
+    print(f"Fotos: {stats.get('files', 0)} (em cache: {stats.get('cached', 0)}, "
+          f"processadas: {stats.get('processed', 0)})")
+    print(f"Adicionadas: {stats.get('added', 0)}, duplicadas: {stats.get(STATUS_DUPLICATE, 0)}, "
+          f"sem face: {stats.get(STATUS_NO_FACE, 0)}, baixa qualidade: {stats.get(STATUS_LOW_QUALITY, 0)}")
+    print(f"Galeria: {len(gallery)} codificações de {len(set(gallery.names))} pessoas "
+          f"em {args.gallery} ({stats['elapsed']} s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+import json
+import socket
+import threading
+import time
+from collections import deque
+from typing import List, Optional
+
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:  # Dependência opcional
+    mqtt = None
+
+
+# Qualidade de serviço usada em cada tipo de evento: mudanças de presença
+# precisam chegar (QoS 1); o estado das faces é substituído pelo próximo (QoS 0)
+QOS_PRESENCE = 1
+QOS_FACES = 0
+
+
+class EventPublisher:
+    """
+    Publica eventos de detecção (presença e faces) para controladores IoT.
+
+    Recebe resultados como ouvinte da thread de detecção, apenas guardando o
+    estado em memória; o envio é feito por uma thread própria, em lotes, para
+    nunca bloquear a inferência.
+    """
+
+    def __init__(self, transports: list, batch_interval: float = 0.5):
+        """
+        Inicializa o publicador.
+
+        Args:
+            transports: Lista de transportes (MqttTransport, UdpMulticastTransport)
+            batch_interval: Intervalo em segundos entre envios de lotes
+        """
+        self.transports = transports
+        self.batch_interval = batch_interval
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = deque(maxlen=256)
+        self._latest = None
+        self._last_sequence = None
+        self._present = None
+        self._thread = None
+        self._running = False
+
+        self.events_published = 0
+        self.batches_sent = 0
+        self.updates_coalesced = 0
+
+    def on_detection(self, payload: dict):
+        """
+        Ouvinte de detecção: registra o resultado sem fazer I/O.
+        """
+        present = bool(payload.get("faces_detected")) and bool(payload.get("camera_active"))
+
+        with self._lock:
+            if self._latest is not None:
+                self.updates_coalesced += 1
+            self._latest = payload
+
+            if present != self._present:
+                self._present = present
+                self._pending.append({
+                    "type": "presence",
+                    "present": present,
+                    "face_count": payload.get("face_count", 0),
+                    "timestamp": payload.get("timestamp") or time.time()
+                })
+                # Mudança de presença é enviada sem esperar o próximo lote
+                self._wake.set()
+
+    def on_event(self, event: dict):
+        """
+        Enfileira um evento já montado (ex.: contagem única da fusão entre câmeras).
+
+        Como as mudanças de presença, é enviado sem esperar o próximo lote.
+        """
+        with self._lock:
+            self._pending.append(event)
+        self._wake.set()
+
+    def start(self):
+        """
+        Inicia a thread de envio.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='event-publisher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Envia o que estiver pendente e encerra a thread e os transportes.
+        """
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        for transport in self.transports:
+            transport.close()
+
+    def flush(self) -> int:
+        """
+        Monta e envia um lote com os eventos pendentes.
+
+        Returns:
+            Quantidade de eventos no lote
+        """
+        with self._lock:
+            events = list(self._pending)
+            self._pending.clear()
+            latest, self._latest = self._latest, None
+
+        if latest is not None and latest.get("sequence") != self._last_sequence:
+            # Apenas o estado mais recente das faces entra no lote
+            self._last_sequence = latest.get("sequence")
+            events.append({
+                "type": "faces",
+                "face_count": latest.get("face_count", 0),
+                "faces": latest.get("faces", []),
+                "sequence": latest.get("sequence"),
+                "timestamp": latest.get("timestamp")
+            })
+
+        if not events:
+            return 0
+
+        for transport in self.transports:
+            try:
+                transport.send(events)
+            except Exception as e:
+                print(f"Erro ao publicar eventos ({type(transport).__name__}): {e}")
+
+        self.events_published += len(events)
+        self.batches_sent += 1
+        return len(events)
+
+    def get_stats(self) -> dict:
+        """
+        Retorna estatísticas do publicador e dos transportes.
+        """
+        return {
+            'events_published': self.events_published,
+            'batches_sent': self.batches_sent,
+            'updates_coalesced': self.updates_coalesced,
+            'transports': [transport.get_stats() for transport in self.transports]
+        }
+
+    def _run(self):
+        while self._running:
+            self._wake.wait(self.batch_interval)
+            self._wake.clear()
+            self.flush()
+        self.flush()
+
+
+class MqttTransport:
+    """
+    Transporte MQTT com buffer próprio para períodos sem conexão.
+    """
+
+    def __init__(self, client, topic_prefix: str = "facial_recognition", offline_buffer_size: int = 1000):
+        """
+        Inicializa o transporte.
+
+        Args:
+            client: Cliente MQTT já configurado (paho.mqtt.client.Client ou InProcessMqttClient)
+            topic_prefix: Prefixo dos tópicos (<prefixo>/presence e <prefixo>/faces)
+            offline_buffer_size: Máximo de eventos QoS 1 guardados enquanto desconectado
+        """
+        self.client = client
+        self.topic_prefix = topic_prefix
+        self._offline = deque(maxlen=offline_buffer_size)
+        self.messages_sent = 0
+        self.messages_dropped = 0
+
+    @classmethod
+    def connect(cls, host: str, port: int = 1883, topic_prefix: str = "facial_recognition",
+                client_id: str = "facial-recognition-publisher"):
+        """
+        Cria um cliente paho-mqtt conectado em segundo plano ao broker.
+
+        Returns:
+            MqttTransport pronto para uso
+        """
+        if mqtt is None:
+            raise RuntimeError("paho-mqtt não está instalado")
+
+        if hasattr(mqtt, "CallbackAPIVersion"):
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id)
+        else:
+            client = mqtt.Client(client_id=client_id)
+
+        client.reconnect_delay_set(min_delay=1, max_delay=30)
+        client.connect_async(host, port)
+        client.loop_start()
+        return cls(client, topic_prefix)
+
+    def send(self, events: List[dict]):
+        """
+        Publica os eventos, ou guarda os de presença se o broker estiver fora.
+        """
+        if not self.client.is_connected():
+            for event in events:
+                if event["type"] == "presence":
+                    if len(self._offline) == self._offline.maxlen:
+                        self.messages_dropped += 1
+                    self._offline.append(event)
+                else:
+                    # Estado das faces fica obsoleto; o próximo lote o substitui
+                    self.messages_dropped += 1
+            return
+
+        while self._offline:
+            self._publish(self._offline.popleft())
+
+        for event in events:
+            self._publish(event)
+
+    def get_stats(self) -> dict:
+        return {
+            'transport': 'mqtt',
+            'connected': bool(self.client.is_connected()),
+            'messages_sent': self.messages_sent,
+            'messages_dropped': self.messages_dropped,
+            'offline_buffered': len(self._offline)
+        }
+
+    def close(self):
+        try:
+            self.client.loop_stop()
+            self.client.disconnect()
+        except Exception as e:
+            print(f"Erro ao encerrar cliente MQTT: {e}")
+
+    def _publish(self, event: dict):
+        if event["type"] in ("presence", "unique_presence"):
+            # Retido: um controlador que conecta depois já recebe o estado atual
+            self.client.publish(f"{self.topic_prefix}/{event['type']}", json.dumps(event),
+                                qos=QOS_PRESENCE, retain=True)
+        else:
+            self.client.publish(f"{self.topic_prefix}/faces", json.dumps(event), qos=QOS_FACES)
+        self.messages_sent += 1
+
+
+class UdpMulticastTransport:
+    """
+    Transporte UDP multicast: um datagrama JSON por lote, sem confirmação.
+    """
+
+    def __init__(self, group: str = "239.0.0.1", port: int = 5007, ttl: int = 1,
+                 sock: Optional[socket.socket] = None):
+        """
+        Inicializa o transporte.
+
+        Args:
+            group: Endereço do grupo multicast
+            port: Porta de destino
+            ttl: TTL multicast (1 mantém os pacotes na rede local)
+            sock: Socket já criado (opcional, útil em testes)
+        """
+        self.address = (group, port)
+        self.sock = sock or socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        if sock is None:
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+            self.sock.setblocking(False)
+        self.datagrams_sent = 0
+        self.datagrams_dropped = 0
+
+    def send(self, events: List[dict]):
+        """
+        Envia o lote em um único datagrama; descarta se o envio falhar.
+        """
+        try:
+            self.sock.sendto(json.dumps(events).encode(), self.address)
+            self.datagrams_sent += 1
+        except OSError:
+            self.datagrams_dropped += 1
+
+    def get_stats(self) -> dict:
+        return {
+            'transport': 'udp',
+            'address': f"{self.address[0]}:{self.address[1]}",
+            'datagrams_sent': self.datagrams_sent,
+            'datagrams_dropped': self.datagrams_dropped
+        }
+
+    def close(self):
+        self.sock.close()
+
+
+class InProcessMqttClient:
+    """
+    Cliente MQTT falso que entrega as mensagens em memória.
+
+    Implementa a parte da interface do paho-mqtt usada por MqttTransport,
+    permitindo testar o publicador sem broker.
+    """
+
+    def __init__(self, connected: bool = True):
+        self.connected = connected
+        self.messages = []
+        self.retained = {}
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def publish(self, topic: str, payload: str, qos: int = 0, retain: bool = False):
+        message = {'topic': topic, 'payload': json.loads(payload), 'qos': qos, 'retain': retain}
+        self.messages.append(message)
+        if retain:
+            self.retained[topic] = message
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        self.connected = False
@@ -1,7 +1,30 @@
+import threading
 import cv2
 import mediapipe as mp
 import numpy as np
 from typing import List, Tuple, Optional
+from face_tracker import FaceTracker
+from face_encoder import FaceEncoder
+from face_redactor import FaceRedactor
+from multiscale_detection import MultiScaleDetector
+from detections import clip_boxes, empty_detections, to_faces_info
+
+
+# Landmarks do FaceMesh guardados em cada face (ordem das linhas de 'landmarks'):
+# canto externo do olho direito, canto externo do olho esquerdo, ponta do nariz,
+# canto direito da boca, canto esquerdo da boca, queixo e testa
+KEY_LANDMARK_INDICES = (33, 263, 1, 61, 291, 152, 10)
+
+# Pontos adicionais usados pelo descritor geométrico (FaceEncoder): cantos
+# internos e pálpebras, centro das íris, sobrancelhas, dorso e asas do nariz,
+# lábios, laterais, mandíbula e maçãs do rosto
+GEOMETRY_LANDMARK_INDICES = (133, 362, 159, 145, 386, 374, 468, 473,
+                             70, 105, 107, 300, 334, 336,
+                             168, 6, 98, 327, 2,
+                             0, 17, 13, 14,
+                             234, 454, 172, 397, 136, 365, 50, 280)
+
+LANDMARK_INDICES = KEY_LANDMARK_INDICES + GEOMETRY_LANDMARK_INDICES
 
 
 class FaceDetector:
@@ -11,28 +34,46 @@ class FaceDetector:
     
     def __init__(self, 
                  min_detection_confidence: float = 0.5,
-                 min_tracking_confidence: float = 0.5):
+                 min_tracking_confidence: float = 0.5,
+                 track_faces: bool = True,
+                 static_image_mode: bool = False,
+                 detection_mode: str = 'short',
+                 detection_options: Optional[dict] = None):
         """
         Inicializa o detector facial.
         
         Args:
             min_detection_confidence: Confiança mínima para detecção (0.0 - 1.0)
             min_tracking_confidence: Confiança mínima para rastreamento (0.0 - 1.0)
+            track_faces: Se True, mantém IDs estáveis entre frames (Face_<trilha>)
+            static_image_mode: Se True, trata cada imagem de forma independente
+                               (fotos avulsas, ex.: cadastro), sem rastrear a malha
+            detection_mode: Estratégia de detecção ('short', 'full', 'tiled' ou
+                            'scheduled'; ver multiscale_detection.DETECTION_MODES)
+            detection_options: Parâmetros adicionais do MultiScaleDetector
+                               (tile_size, workers, full_range_interval...)
         """
+        self.static_image_mode = static_image_mode
         self.mp_face_detection = mp.solutions.face_detection
         self.mp_face_mesh = mp.solutions.face_mesh
         self.mp_drawing = mp.solutions.drawing_utils
         self.mp_drawing_styles = mp.solutions.drawing_styles
         
-        # Configuração do detector de faces
-        self.face_detection = self.mp_face_detection.FaceDetection(
-            model_selection=0,  # 0 para faces próximas (< 2m), 1 para faces distantes
-            min_detection_confidence=min_detection_confidence
+        # Configuração do detector de faces: curto alcance (< 2 m), longo
+        # alcance, recortes ou ambos os modelos alternados
+        self.detection_mode = detection_mode
+        self.detection_options = dict(detection_options or {})
+        # analyze pode rodar em um estágio em thread própria enquanto a GUI altera os parâmetros
+        self._graph_lock = threading.RLock()
+        self.face_detection = MultiScaleDetector(
+            mode=detection_mode,
+            min_detection_confidence=min_detection_confidence,
+            **self.detection_options
         )
         
         # Configuração do detector de landmarks faciais
         self.face_mesh = self.mp_face_mesh.FaceMesh(
-            static_image_mode=False,
+            static_image_mode=self.static_image_mode,
             max_num_faces=5,
             refine_landmarks=True,
             min_detection_confidence=min_detection_confidence,
@@ -45,43 +86,62 @@ class FaceDetector:
         self.show_landmarks = True
         self.show_bounding_box = True
         self.show_face_id = True
+        # Modo de anonimização: as faces saem pixelizadas/desfocadas, sem anotações
+        self.redact_faces = False
+        self.redactor = FaceRedactor()
         
         # Contador de faces detectadas
         self.face_counter = 0
         
+        # Rastreador que mantém o ID de cada face entre frames
+        self.tracker = FaceTracker() if track_faces else None
+        
+        # Detecções do último frame (caixas, confianças e pontos-chave em arrays)
+        self.last_detections = empty_detections()
+        
+        # Codificador alinhado pelos landmarks (ver get_face_encodings)
+        self.encoder = FaceEncoder()
+        
     def update_parameters(self, 
                          min_detection_confidence: Optional[float] = None,
                          min_tracking_confidence: Optional[float] = None,
                          show_landmarks: Optional[bool] = None,
                          show_bounding_box: Optional[bool] = None,
-                         show_face_id: Optional[bool] = None):
+                         show_face_id: Optional[bool] = None,
+                         redact_faces: Optional[bool] = None,
+                         redaction_mode: Optional[str] = None,
+                         detection_mode: Optional[str] = None):
         """
         Atualiza os parâmetros do detector.
         """
-        if min_detection_confidence is not None:
-            self.min_detection_confidence = min_detection_confidence
-            # Recria o detector com novos parâmetros
-            self.face_detection = self.mp_face_detection.FaceDetection(
-                model_selection=0,
-                min_detection_confidence=min_detection_confidence
-            )
-            self.face_mesh = self.mp_face_mesh.FaceMesh(
-                static_image_mode=False,
-                max_num_faces=5,
-                refine_landmarks=True,
-                min_detection_confidence=min_detection_confidence,
-                min_tracking_confidence=self.min_tracking_confidence
-            )
-            
-        if min_tracking_confidence is not None:
-            self.min_tracking_confidence = min_tracking_confidence
-            self.face_mesh = self.mp_face_mesh.FaceMesh(
-                static_image_mode=False,
-                max_num_faces=5,
-                refine_landmarks=True,
-                min_detection_confidence=self.min_detection_confidence,
-                min_tracking_confidence=min_tracking_confidence
-            )
+        with self._graph_lock:
+            if min_detection_confidence is not None or detection_mode is not None:
+                # Recria o detector com novos parâmetros
+                detection = MultiScaleDetector(
+                    mode=detection_mode or self.detection_mode,
+                    min_detection_confidence=(min_detection_confidence if min_detection_confidence is not None
+                                              else self.min_detection_confidence),
+                    **self.detection_options
+                )
+                self.face_detection.close()
+                self.face_detection = detection
+                self.detection_mode = detection.mode
+
+            if min_detection_confidence is not None:
+                self.min_detection_confidence = min_detection_confidence
+            if min_tracking_confidence is not None:
+                self.min_tracking_confidence = min_tracking_confidence
+            if min_detection_confidence is not None or min_tracking_confidence is not None:
+                # Um único FaceMesh novo; o antigo é fechado (sem close() o grafo nativo vaza)
+                face_mesh = self.mp_face_mesh.FaceMesh(
+                    static_image_mode=self.static_image_mode,
+                    max_num_faces=5,
+                    refine_landmarks=True,
+                    min_detection_confidence=self.min_detection_confidence,
+                    min_tracking_confidence=self.min_tracking_confidence
+                )
+                self.face_mesh.close()
+                self.face_mesh = face_mesh
             
         if show_landmarks is not None:
             self.show_landmarks = show_landmarks
@@ -91,6 +151,13 @@ class FaceDetector:
             
         if show_face_id is not None:
             self.show_face_id = show_face_id
+            
+        if redaction_mode is not None:
+            self.redactor = FaceRedactor(mode=redaction_mode)
+            
+        if redact_faces is not None:
+            self.redact_faces = redact_faces
+            self.redactor.reset()
     
     def detect_faces(self, image: np.ndarray) -> Tuple[np.ndarray, List[dict]]:
         """
@@ -101,59 +168,91 @@ class FaceDetector:
             
         Returns:
             Tuple contendo:
-            - Imagem anotada com detecções
+            - Imagem anotada com detecções (ou com as faces anonimizadas,
+              se redact_faces estiver habilitado)
             - Lista de dicionários com informações das faces detectadas
         """
+        faces_info, mesh_landmarks = self.analyze(image)
+        
+        # Mantém IDs estáveis entre frames
+        if self.tracker is not None:
+            self.tracker.update(faces_info)
+        
+        return self.annotate(image, faces_info, mesh_landmarks), faces_info
+    
+    def analyze(self, image: np.ndarray, landmarks: bool = True) -> Tuple[List[dict], list]:
+        """
+        Detecta as faces e associa os landmarks, sem rastrear nem desenhar.
+        
+        Args:
+            image: Imagem de entrada (BGR)
+            landmarks: Se False, o FaceMesh não roda (faces sem landmarks)
+            
+        Returns:
+            Tuple contendo:
+            - Lista de faces (IDs Face_<n> na ordem das detecções)
+            - Malhas do FaceMesh do frame, usadas por annotate
+        """
         # Converte BGR para RGB
         rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         
-        # Processa a imagem
-        detection_results = self.face_detection.process(rgb_image)
-        mesh_results = self.face_mesh.process(rgb_image)
+        # Processa a imagem (os grafos podem ser recriados por update_parameters em outra thread)
+        with self._graph_lock:
+            detections = self.face_detection.detect(rgb_image)
+            mesh_landmarks = (self.face_mesh.process(rgb_image).multi_face_landmarks or []) if landmarks else []
+        h, w, _ = image.shape
+        
+        # Detecções já em pixels e unidas entre escalas (array estruturado)
+        self.last_detections = detections
+        faces_info = to_faces_info(detections)
+        
+        # Associa os landmarks principais do FaceMesh a cada face
+        if mesh_landmarks:
+            self._attach_landmarks(faces_info, mesh_landmarks, w, h)
+        
+        return faces_info, mesh_landmarks
+    
+    def annotate(self, image: np.ndarray, faces_info: List[dict], mesh_landmarks: Optional[list] = None) -> np.ndarray:
+        """
+        Desenha caixas, IDs e malhas em uma cópia do frame (ou anonimiza as faces,
+        se redact_faces estiver habilitado).
         
+        Args:
+            image: Imagem original (BGR)
+            faces_info: Faces retornadas por analyze (já rastreadas, se for o caso)
+            mesh_landmarks: Malhas retornadas por analyze
+            
+        Returns:
+            Imagem anotada
+        """
         # Copia a imagem para anotação
         annotated_image = image.copy()
-        faces_info = []
-        
-        # Processa detecções de faces
-        if detection_results.detections:
-            for idx, detection in enumerate(detection_results.detections):
-                # Extrai informações da detecção
-                bbox = detection.location_data.relative_bounding_box
-                h, w, _ = image.shape
-                
-                # Converte coordenadas relativas para absolutas
-                x = int(bbox.xmin * w)
-                y = int(bbox.ymin * h)
-                width = int(bbox.width * w)
-                height = int(bbox.height * h)
-                
-                # Informações da face
-                face_info = {
-                    'id': f'Face_{idx + 1}',
-                    'confidence': detection.score[0],
-                    'bbox': (x, y, width, height),
-                    'center': (x + width // 2, y + height // 2)
-                }
-                faces_info.append(face_info)
-                
-                # Desenha bounding box se habilitado
-                if self.show_bounding_box:
-                    cv2.rectangle(annotated_image, (x, y), (x + width, y + height), (0, 255, 0), 2)
-                    
-                    # Adiciona texto com confiança
-                    confidence_text = f'{face_info["confidence"]:.2f}'
-                    cv2.putText(annotated_image, confidence_text, (x, y - 10), 
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+        h, w, _ = image.shape
+        
+        if self.redact_faces:
+            # Nenhuma anotação: caixas, IDs e malha revelariam a posição/forma do rosto
+            return self.redactor.redact(annotated_image, faces_info)
+        
+        # Caixas recortadas ao frame de uma vez (rótulos de faces na borda continuam visíveis)
+        drawn_boxes = clip_boxes([face['bbox'] for face in faces_info], w, h).tolist()
+        for face_info, (x, y, width, height) in zip(faces_info, drawn_boxes):
+            # Desenha bounding box se habilitado
+            if self.show_bounding_box:
+                cv2.rectangle(annotated_image, (x, y), (x + width, y + height), (0, 255, 0), 2)
                 
-                # Adiciona ID da face se habilitado
-                if self.show_face_id:
-                    cv2.putText(annotated_image, face_info['id'], (x, y + height + 20), 
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
+                # Adiciona texto com confiança
+                confidence_text = f'{face_info["confidence"]:.2f}'
+                cv2.putText(annotated_image, confidence_text, (x, max(y - 10, 15)), 
+                          cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+            
+            # Adiciona ID da face se habilitado
+            if self.show_face_id:
+                cv2.putText(annotated_image, face_info['id'], (x, y + height + 20), 
+                          cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
         
         # Processa landmarks faciais
-        if mesh_results.multi_face_landmarks and self.show_landmarks:
-            for face_landmarks in mesh_results.multi_face_landmarks:
+        if mesh_landmarks and self.show_landmarks:
+            for face_landmarks in mesh_landmarks:
                 # Desenha landmarks faciais
                 self.mp_drawing.draw_landmarks(
                     annotated_image,
@@ -162,10 +261,33 @@ class FaceDetector:
                     None,
                     self.mp_drawing_styles.get_default_face_mesh_contours_style()
                 )
-                
-
         
-        return annotated_image, faces_info
+        return annotated_image
+    
+    def _attach_landmarks(self, faces_info: List[dict], multi_face_landmarks, w: int, h: int):
+        """
+        Guarda em face_info['landmarks'] os pontos LANDMARK_INDICES (em pixels)
+        da malha cuja ponta do nariz está dentro da caixa da face.
+        """
+        meshes = []
+        for face_landmarks in multi_face_landmarks:
+            landmark = face_landmarks.landmark
+            meshes.append(np.array([(landmark[i].x * w, landmark[i].y * h)
+                                    for i in LANDMARK_INDICES], dtype=np.float32))
+        
+        for face_info in faces_info:
+            x, y, width, height = face_info['bbox']
+            cx, cy = face_info['center']
+            best, best_dist = None, None
+            for idx, points in enumerate(meshes):
+                nose_x, nose_y = points[2]
+                if not (x <= nose_x <= x + width and y <= nose_y <= y + height):
+                    continue
+                dist = (nose_x - cx) ** 2 + (nose_y - cy) ** 2
+                if best_dist is None or dist < best_dist:
+                    best, best_dist = idx, dist
+            if best is not None:
+                face_info['landmarks'] = meshes.pop(best)
     
     def get_face_encoding(self, image: np.ndarray, face_bbox: Tuple[int, int, int, int]) -> Optional[np.ndarray]:
         """
@@ -203,6 +325,29 @@ class FaceDetector:
             print(f"Erro ao extrair características da face: {e}")
             return None
     
+    def get_face_encodings(self, image: np.ndarray, faces_info: List[dict]) -> List[Optional[np.ndarray]]:
+        """
+        Codifica as faces de um frame pelos landmarks (recortes alinhados e geometria).
+        
+        Todas as faces com landmarks são alinhadas e codificadas em lote. O
+        resultado é mais compacto (float16) e discrimina melhor que
+        get_face_encoding, mas não é comparável com ele.
+        
+        Args:
+            image: Imagem original
+            faces_info: Faces retornadas por detect_faces
+            
+        Returns:
+            Lista com a codificação de cada face, ou None para faces sem landmarks
+        """
+        indices = [i for i, face in enumerate(faces_info) if face.get('landmarks') is not None]
+        encodings = [None] * len(faces_info)
+        if indices:
+            batch = self.encoder.encode(image, [faces_info[i]['landmarks'] for i in indices])
+            for i, encoding in zip(indices, batch):
+                encodings[i] = encoding
+        return encodings
+    
     def compare_faces(self, encoding1: np.ndarray, encoding2: np.ndarray, threshold: float = 0.6) -> bool:
         """
         Compara duas codificações de face para verificar se são da mesma pessoa.
@@ -217,7 +362,9 @@ class FaceDetector:
         """
         try:
             # Calcula correlação entre histogramas
-            correlation = cv2.compareHist(encoding1, encoding2, cv2.HISTCMP_CORREL)
+            correlation = cv2.compareHist(np.asarray(encoding1, dtype=np.float32),
+                                          np.asarray(encoding2, dtype=np.float32),
+                                          cv2.HISTCMP_CORREL)
             return correlation > threshold
         except Exception as e:
             print(f"Erro ao comparar faces: {e}")
@@ -227,7 +374,9 @@ class FaceDetector:
         """
         Libera recursos do detector.
         """
-        if hasattr(self, 'face_detection'):
-            self.face_detection.close()
-        if hasattr(self, 'face_mesh'):
-            self.face_mesh.close()
\ No newline at end of file
+        with self._graph_lock:
+            if hasattr(self, 'face_detection'):
+                self.face_detection.close()
+            if getattr(self, 'face_mesh', None) is not None:
+                self.face_mesh.close()
+                self.face_mesh = None
\ No newline at end of file
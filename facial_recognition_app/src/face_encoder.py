@@ -0,0 +1,193 @@
+import cv2
+import numpy as np
+from typing import List, Optional, Tuple
+
+
+# Linhas de face_info['landmarks'] usadas no alinhamento (ver face_detector.LANDMARK_INDICES):
+# cantos externos dos olhos, ponta do nariz e cantos da boca
+ALIGNMENT_ROWS = (0, 1, 2, 3, 4)
+
+# Posição desses pontos no recorte alinhado (coordenadas relativas ao lado do recorte)
+ALIGNMENT_TEMPLATE = np.array([
+    [0.22, 0.38],
+    [0.78, 0.38],
+    [0.50, 0.60],
+    [0.33, 0.78],
+    [0.67, 0.78]
+], dtype=np.float32)
+
+# Formato médio de LANDMARK_INDICES já alinhado (média de 97 faces frontais do
+# subconjunto LFW); a geometria é descrita pelo desvio em relação a ele
+REFERENCE_SHAPE = np.array([
+    [0.233, 0.368], [0.772, 0.369], [0.487, 0.614], [0.358, 0.784], [0.650, 0.785],
+    [0.504, 1.049], [0.491, 0.054], [0.388, 0.376], [0.608, 0.378], [0.301, 0.347],
+    [0.312, 0.389], [0.699, 0.347], [0.686, 0.390], [0.307, 0.366], [0.696, 0.366],
+    [0.168, 0.281], [0.258, 0.235], [0.408, 0.250], [0.842, 0.280], [0.739, 0.234],
+    [0.577, 0.251], [0.491, 0.347], [0.490, 0.394], [0.392, 0.632], [0.600, 0.632],
+    [0.492, 0.648], [0.496, 0.732], [0.499, 0.859], [0.497, 0.767], [0.499, 0.809],
+    [0.110, 0.475], [0.940, 0.471], [0.187, 0.842], [0.858, 0.844], [0.226, 0.901],
+    [0.811, 0.903], [0.216, 0.564], [0.790, 0.562]
+], dtype=np.float32)
+
+
+def similarity_transforms(points: np.ndarray, template: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Estima, para várias faces de uma vez, a transformação de similaridade
+    (escala, rotação e translação) que leva os pontos de cada face ao modelo.
+
+    Usa a solução fechada de mínimos quadrados com números complexos:
+    w = a * z + b.
+
+    Args:
+        points: Array (N, K, 2) com os pontos de cada face
+        template: Array (K, 2) com os pontos de destino
+
+    Returns:
+        Tuple (a, b) de arrays complexos (N,)
+    """
+    z = points[..., 0] + 1j * points[..., 1]
+    w = template[:, 0] + 1j * template[:, 1]
+
+    z_mean = z.mean(axis=1, keepdims=True)
+    w_mean = w.mean()
+    zc = z - z_mean
+    a = (np.conj(zc) * (w - w_mean)).sum(axis=1) / np.maximum((np.abs(zc) ** 2).sum(axis=1), 1e-9)
+    b = w_mean - a * z_mean[:, 0]
+    return a, b
+
+
+class FaceEncoder:
+    """
+    Codificador de faces baseado nos landmarks do FaceMesh.
+
+    Cada face é alinhada em um recorte canônico (todas as faces de um frame
+    em uma única chamada de remap) e descrita por:
+      - aparência: histogramas de orientação do gradiente em uma grade 4x4
+        do recorte alinhado (128 valores);
+      - geometria: desvio dos landmarks alinhados em relação ao formato médio.
+    O vetor final é centrado e de norma 1 (correlação = cosseno) e guardado em float16.
+    """
+
+    def __init__(self,
+                 chip_size: int = 48,
+                 grid_size: int = 4,
+                 orientation_bins: int = 8,
+                 geometry_weight: float = 0.3):
+        """
+        Inicializa o codificador.
+
+        Args:
+            chip_size: Lado (px) do recorte alinhado
+            grid_size: Células por lado da grade de histogramas
+            orientation_bins: Faixas de orientação de cada histograma
+            geometry_weight: Fração da energia do vetor dada à geometria (0.0 - 1.0)
+        """
+        if chip_size % grid_size:
+            raise ValueError("chip_size deve ser múltiplo de grid_size")
+
+        self.chip_size = chip_size
+        self.grid_size = grid_size
+        self.orientation_bins = orientation_bins
+        self.geometry_weight = geometry_weight
+
+        # Coordenadas do recorte como números complexos e célula de cada pixel
+        coords = np.arange(chip_size, dtype=np.float32) + 0.5
+        self._grid = coords[None, :] + 1j * coords[:, None]
+        cell = chip_size // grid_size
+        cells = (np.arange(chip_size) // cell)
+        self._cell_index = (cells[:, None] * grid_size + cells[None, :]).ravel()
+
+    @property
+    def dimensions(self) -> int:
+        """
+        Tamanho do vetor de codificação.
+        """
+        return self.grid_size * self.grid_size * self.orientation_bins + REFERENCE_SHAPE.size
+
+    def align(self, image: np.ndarray, landmarks: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Gera os recortes alinhados das faces de uma imagem.
+
+        Args:
+            image: Imagem original (BGR ou cinza)
+            landmarks: Landmarks de cada face em pixels (face_info['landmarks'])
+
+        Returns:
+            Tuple (recortes (N, S, S) uint8 em cinza, a, b) onde a e b são as
+            transformações imagem -> recorte em coordenadas relativas
+        """
+        size = self.chip_size
+        if not landmarks:
+            return np.empty((0, size, size), dtype=np.uint8), np.empty(0, complex), np.empty(0, complex)
+
+        points = np.stack([np.asarray(p, dtype=np.float32) for p in landmarks])
+        a, b = similarity_transforms(points[:, ALIGNMENT_ROWS], ALIGNMENT_TEMPLATE)
+
+        # Mapa inverso recorte -> imagem de todas as faces, empilhado verticalmente
+        # para que um único remap gere todos os recortes
+        source = (self._grid[None] / size - b[:, None, None]) / a[:, None, None]
+        map_x = source.real.astype(np.float32).reshape(-1, size)
+        map_y = source.imag.astype(np.float32).reshape(-1, size)
+
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        chips = cv2.remap(gray, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        return chips.reshape(-1, size, size), a, b
+
+    def encode(self, image: np.ndarray, landmarks: List[np.ndarray]) -> np.ndarray:
+        """
+        Codifica as faces de uma imagem.
+
+        Args:
+            image: Imagem original (BGR ou cinza)
+            landmarks: Landmarks de cada face em pixels (face_info['landmarks'])
+
+        Returns:
+            Array (N, dimensions) em float16
+        """
+        chips, a, b = self.align(image, landmarks)
+        if len(chips) == 0:
+            return np.empty((0, self.dimensions), dtype=np.float16)
+
+        appearance = self._appearance(chips)
+
+        points = np.stack([np.asarray(p, dtype=np.float32) for p in landmarks])
+        aligned = a[:, None] * (points[..., 0] + 1j * points[..., 1]) + b[:, None]
+        deviation = np.stack([aligned.real, aligned.imag], axis=-1) - REFERENCE_SHAPE
+        geometry = _normalize(deviation.reshape(len(chips), -1).astype(np.float32))
+
+        encodings = np.hstack([appearance * np.sqrt(1.0 - self.geometry_weight),
+                               geometry * np.sqrt(self.geometry_weight)])
+        encodings -= encodings.mean(axis=1, keepdims=True)
+        return _normalize(encodings).astype(np.float16)
+
+    def encode_face(self, image: np.ndarray, face_info: dict) -> Optional[np.ndarray]:
+        """
+        Codifica uma única face; retorna None se ela não tiver landmarks.
+        """
+        landmarks = face_info.get('landmarks')
+        if landmarks is None or len(landmarks) != len(REFERENCE_SHAPE):
+            return None
+        return self.encode(image, [landmarks])[0]
+
+    def _appearance(self, chips: np.ndarray) -> np.ndarray:
+        count = len(chips)
+        bins = self.orientation_bins
+        cells = self.grid_size * self.grid_size
+
+        gy, gx = np.gradient(chips.astype(np.float32), axis=(1, 2))
+        magnitude = np.hypot(gx, gy).reshape(count, -1)
+        # Orientação sem sinal (0 a pi): robusta a inversões de contraste
+        orientation = np.arctan2(gy, gx).reshape(count, -1) % np.pi
+        orientation_bin = np.minimum((orientation * (bins / np.pi)).astype(np.int64), bins - 1)
+
+        index = (np.arange(count)[:, None] * cells + self._cell_index[None, :]) * bins + orientation_bin
+        histograms = np.bincount(index.ravel(), weights=magnitude.ravel(),
+                                 minlength=count * cells * bins).reshape(count, -1)
+
+        # Normalização estilo SIFT: limita picos de iluminação/sombra
+        histograms = np.minimum(_normalize(histograms.astype(np.float32)), 0.2)
+        return _normalize(histograms)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
@@ -0,0 +1,317 @@
+import os
+import threading
+import numpy as np
+from typing import List, Optional, Sequence, Tuple
+
+
+def correlation(encodings: np.ndarray, encoding: np.ndarray) -> np.ndarray:
+    """
+    Correlação de Pearson entre uma codificação e um conjunto de codificações.
+
+    Equivale a cv2.compareHist(..., cv2.HISTCMP_CORREL) aplicado a cada linha,
+    mas calculado de uma vez só.
+
+    Args:
+        encodings: Array (N, D) ou (D,) com as codificações de referência
+        encoding: Codificação (D,) a comparar
+
+    Returns:
+        Array (N,) com a correlação de cada linha (-1.0 a 1.0)
+    """
+    matrix = np.asarray(encodings, dtype=np.float32).reshape(-1, np.size(encoding))
+    query = np.asarray(encoding, dtype=np.float32).ravel()
+
+    centered = matrix - matrix.mean(axis=1, keepdims=True)
+    query = query - query.mean()
+    norms = np.linalg.norm(centered, axis=1) * np.linalg.norm(query)
+    return (centered @ query) / np.maximum(norms, 1e-12)
+
+
+def normalize_encodings(encodings: np.ndarray) -> np.ndarray:
+    """
+    Centra e normaliza codificações (N, D) para que o produto interno seja a correlação.
+    """
+    matrix = np.asarray(encodings, dtype=np.float32)
+    matrix = matrix - matrix.mean(axis=1, keepdims=True)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantiza vetores (N, D) para int8 com uma escala por vetor.
+
+    Returns:
+        Tuple (códigos int8 (N, D), escalas float32 (N,)) com vetor ≈ código * escala
+    """
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def blocked_dot(codes: np.ndarray, query: np.ndarray, block_rows: int = 512) -> np.ndarray:
+    """
+    Produto interno de uma matriz compacta (int8/float16) com uma ou mais consultas.
+
+    A matriz é percorrida em blocos que cabem no cache: cada bloco é ampliado
+    para float32 em um buffer reaproveitado e multiplicado via BLAS. Com
+    códigos e consulta inteiros (int8) o resultado é o produto inteiro exato,
+    pois as somas ficam abaixo de 2**24 para D < 1040.
+
+    Args:
+        codes: Array (N, D) int8, float16 ou float32
+        query: Array (D,) ou (D, Q) float32
+        block_rows: Linhas por bloco
+
+    Returns:
+        Array (N,) ou (N, Q) float32
+    """
+    rows = len(codes)
+    out = np.empty((rows,) + query.shape[1:], dtype=np.float32)
+    if codes.dtype == np.float32:
+        return np.matmul(codes, query, out=out)
+
+    buffer = np.empty((min(block_rows, rows), codes.shape[1]), dtype=np.float32)
+    for start in range(0, rows, block_rows):
+        block = codes[start:start + block_rows]
+        widened = buffer[:len(block)]
+        np.copyto(widened, block)
+        np.matmul(widened, query, out=out[start:start + len(block)])
+    return out
+
+
+class FaceGallery:
+    """
+    Galeria de identidades conhecidas (nome e codificação de face).
+
+    As codificações são guardadas centradas e normalizadas (produto interno =
+    correlação), em int8 com escala por vetor (padrão), float16 ou float32.
+    Em int8 a busca usa o produto inteiro por blocos e os melhores candidatos
+    são reordenados com a consulta em float32.
+    """
+
+    STORAGE_TYPES = {'int8': np.int8, 'float16': np.float16, 'float32': np.float32}
+
+    def __init__(self, threshold: float = 0.6, storage: str = 'int8',
+                 rerank_top: int = 8, block_rows: int = 512):
+        """
+        Inicializa a galeria vazia.
+
+        Args:
+            threshold: Correlação mínima para considerar uma identidade reconhecida
+            storage: Tipo de armazenamento das codificações (int8, float16 ou float32)
+            rerank_top: Candidatos reordenados com precisão total (apenas int8)
+            block_rows: Linhas por bloco na busca
+        """
+        if storage not in self.STORAGE_TYPES:
+            raise ValueError(f"Armazenamento inválido: {storage}")
+
+        self.threshold = threshold
+        self.storage = storage
+        self.rerank_top = rerank_top
+        self.block_rows = block_rows
+        self._lock = threading.Lock()
+        self._names: List[str] = []
+        self._codes = None
+        self._scales = None
+        self.identify_calls = 0
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._names)
+
+    @property
+    def dimensions(self) -> Optional[int]:
+        return None if self._codes is None else self._codes.shape[1]
+
+    def add(self, name: str, encoding: np.ndarray):
+        """
+        Adiciona uma codificação à galeria (um nome pode ter várias).
+        """
+        self.add_many([name], np.asarray(encoding).reshape(1, -1))
+
+    def add_many(self, names: Sequence[str], encodings: np.ndarray):
+        """
+        Adiciona várias codificações de uma vez (uma única cópia da matriz).
+
+        Args:
+            names: Nome de cada codificação
+            encodings: Array (N, D)
+        """
+        rows = normalize_encodings(np.asarray(encodings).reshape(len(names), -1))
+        if self.storage == 'int8':
+            codes, scales = quantize_int8(rows)
+        else:
+            codes, scales = rows.astype(self.STORAGE_TYPES[self.storage]), None
+
+        with self._lock:
+            if self._codes is not None and codes.shape[1] != self._codes.shape[1]:
+                raise ValueError(f"Codificação com {codes.shape[1]} valores; a galeria usa "
+                                 f"{self._codes.shape[1]}")
+            # Copia em vez de modificar: identify() pode estar lendo a matriz atual
+            if self._codes is None:
+                self._codes, self._scales = codes, scales
+            else:
+                self._codes = np.concatenate([self._codes, codes])
+                if scales is not None:
+                    self._scales = np.concatenate([self._scales, scales])
+            self._names = self._names + list(names)
+
+    def remove(self, name: str) -> int:
+        """
+        Remove todas as codificações de um nome.
+
+        Returns:
+            Quantidade de codificações removidas
+        """
+        with self._lock:
+            keep = [i for i, n in enumerate(self._names) if n != name]
+            removed = len(self._names) - len(keep)
+            if removed:
+                self._names = [self._names[i] for i in keep]
+                if keep:
+                    self._codes = self._codes[keep]
+                    self._scales = self._scales[keep] if self._scales is not None else None
+                else:
+                    self._codes = self._scales = None
+            return removed
+
+    def vectors(self, rows: Optional[Sequence[int]] = None) -> np.ndarray:
+        """
+        Retorna codificações da galeria (normalizadas, em float32).
+
+        Args:
+            rows: Índices das linhas (padrão: todas)
+
+        Returns:
+            Array (N, D); em int8 os valores são dequantizados
+        """
+        with self._lock:
+            codes, scales = self._codes, self._scales
+        if codes is None:
+            return np.empty((0, 0), dtype=np.float32)
+        if rows is None:
+            rows = slice(None)
+        vectors = codes[rows].astype(np.float32)
+        if scales is not None:
+            vectors *= scales[rows][:, None]
+        return vectors
+
+    def save(self, path: str):
+        """
+        Grava a galeria em um arquivo .npz (substituição atômica).
+        """
+        with self._lock:
+            names, codes, scales = self._names, self._codes, self._scales
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f,
+                     names=np.array(names, dtype=str),
+                     codes=codes if codes is not None else np.empty((0, 0), dtype=np.int8),
+                     scales=scales if scales is not None else np.empty(0, dtype=np.float32),
+                     storage=np.array(self.storage),
+                     threshold=np.array(self.threshold))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "FaceGallery":
+        """
+        Carrega uma galeria gravada por save().
+
+        Args:
+            path: Caminho do arquivo .npz
+            **kwargs: Parâmetros repassados ao construtor (rerank_top, block_rows)
+
+        Returns:
+            Galeria carregada
+        """
+        with np.load(path) as data:
+            gallery = cls(threshold=float(data["threshold"]), storage=str(data["storage"]), **kwargs)
+            names = [str(name) for name in data["names"]]
+            if names:
+                gallery._names = names
+                gallery._codes = data["codes"]
+                gallery._scales = data["scales"] if gallery.storage == 'int8' else None
+        return gallery
+
+    def search(self, encoding: np.ndarray, top_k: int = 1) -> List[Tuple[str, float]]:
+        """
+        Retorna as codificações mais parecidas com a consulta.
+
+        Args:
+            encoding: Codificação da face
+            top_k: Quantidade de resultados
+
+        Returns:
+            Lista de (nome, correlação) em ordem decrescente
+        """
+        # Cópia consistente das três referências: add_many e remove as substituem juntas
+        with self._lock:
+            names, codes, scales = self._names, self._codes, self._scales
+        if codes is None:
+            return []
+
+        query = normalize_encodings(np.asarray(encoding).reshape(1, -1))[0]
+        if codes.shape[1] != len(query):
+            raise ValueError(f"Codificação com {len(query)} valores; a galeria usa {codes.shape[1]}")
+
+        if scales is None:
+            scores = blocked_dot(codes, query, self.block_rows)
+            candidates = _top_indices(scores, top_k)
+            return [(names[i], float(scores[i])) for i in candidates]
+
+        # Primeira passada: produto inteiro entre consulta e códigos quantizados
+        query_codes, query_scale = quantize_int8(query[None, :])
+        approx = blocked_dot(codes, query_codes[0].astype(np.float32), self.block_rows)
+        approx *= scales * query_scale[0]
+
+        # Reordenação: consulta em float32 contra os candidatos dequantizados
+        candidates = _top_indices(approx, max(top_k, self.rerank_top))
+        exact = (codes[candidates].astype(np.float32) @ query) * scales[candidates]
+        order = np.argsort(-exact)[:top_k]
+        return [(names[candidates[i]], float(exact[i])) for i in order]
+
+    def identify(self, encoding: np.ndarray) -> Tuple[Optional[str], float]:
+        """
+        Procura a identidade mais parecida com a codificação.
+
+        Args:
+            encoding: Codificação da face (ver FaceDetector.get_face_encodings)
+
+        Returns:
+            Tuple (nome ou None se nada passar do limiar, similaridade do melhor candidato)
+        """
+        self.identify_calls += 1
+        results = self.search(encoding, 1)
+        if not results:
+            return None, 0.0
+
+        name, score = results[0]
+        return (name if score >= self.threshold else None), score
+
+    def get_stats(self) -> dict:
+        """
+        Retorna o tamanho e a memória ocupada pela galeria.
+        """
+        with self._lock:
+            names, codes, scales = self._names, self._codes, self._scales
+        nbytes = (codes.nbytes if codes is not None else 0) + (scales.nbytes if scales is not None else 0)
+        return {
+            'entries': len(names),
+            'identities': len(set(names)),
+            'dimensions': self.dimensions,
+            'storage': self.storage,
+            'bytes': nbytes,
+            'identify_calls': self.identify_calls
+        }
+
+
+def _top_indices(scores: np.ndarray, count: int) -> np.ndarray:
+    count = min(count, len(scores))
+    if count >= len(scores):
+        return np.argsort(-scores)
+    top = np.argpartition(-scores, count - 1)[:count]
+    return top[np.argsort(-scores[top])]
@@ -0,0 +1,264 @@
+import time
+import cv2
+import numpy as np
+from typing import Dict, List, Optional
+
+
+class FaceQualityScorer:
+    """
+    Calcula a qualidade de uma face para fins de codificação/identificação.
+
+    Combina nitidez (variância do Laplaciano), tamanho, pose estimada pelos
+    landmarks do FaceMesh, confiança da detecção e a fração da caixa dentro
+    do frame. Faces pequenas demais ou muito cortadas recebem nota zero.
+    """
+
+    def __init__(self,
+                 min_face_size: int = 40,
+                 good_face_size: int = 96,
+                 sharpness_reference: float = 100.0,
+                 max_yaw: float = 0.5,
+                 min_visible_fraction: float = 0.85):
+        """
+        Inicializa o avaliador.
+
+        Args:
+            min_face_size: Menor lado (px) abaixo do qual a face é descartada
+            good_face_size: Menor lado (px) a partir do qual o tamanho não penaliza
+            sharpness_reference: Variância do Laplaciano que corresponde a nitidez 0.5
+            max_yaw: Desvio lateral normalizado do nariz a partir do qual a pose vale 0
+            min_visible_fraction: Fração mínima da caixa dentro do frame
+        """
+        self.min_face_size = min_face_size
+        self.good_face_size = good_face_size
+        self.sharpness_reference = sharpness_reference
+        self.max_yaw = max_yaw
+        self.min_visible_fraction = min_visible_fraction
+
+        # Pesos de cada componente na nota final
+        self.weights = {'sharpness': 0.35, 'size': 0.2, 'pose': 0.25, 'confidence': 0.2}
+
+    def score(self, image: np.ndarray, face_info: dict) -> Dict[str, float]:
+        """
+        Avalia uma face.
+
+        Args:
+            image: Frame original (BGR)
+            face_info: Face retornada pelo detector (bbox, confidence e, se houver, landmarks)
+
+        Returns:
+            Dicionário com a nota de cada componente e a nota final em 'quality' (0.0 - 1.0)
+        """
+        x, y, w, h = face_info['bbox']
+        img_h, img_w = image.shape[:2]
+
+        # Fração da caixa dentro do frame
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, img_w), min(y + h, img_h)
+        visible_area = max(0, x1 - x0) * max(0, y1 - y0)
+        visible = visible_area / float(w * h) if w > 0 and h > 0 else 0.0
+
+        components = {
+            'visible': visible,
+            'size': 0.0,
+            'sharpness': 0.0,
+            'pose': 0.0,
+            'confidence': float(face_info.get('confidence', 0.0)),
+            'quality': 0.0
+        }
+
+        if visible < self.min_visible_fraction or min(w, h) < self.min_face_size:
+            return components
+
+        components['size'] = min(1.0, (min(w, h) - self.min_face_size) /
+                                 float(max(1, self.good_face_size - self.min_face_size)))
+        components['sharpness'] = self._sharpness(image[y0:y1, x0:x1])
+        components['pose'] = self._pose(face_info.get('landmarks'))
+
+        quality = sum(self.weights[name] * components[name] for name in self.weights)
+        components['quality'] = quality * visible
+        return components
+
+    def _sharpness(self, roi: np.ndarray) -> float:
+        if roi.size == 0:
+            return 0.0
+
+        # Normaliza o tamanho para que a medida não dependa da distância
+        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY) if roi.ndim == 3 else roi
+        gray = cv2.resize(gray, (96, 96), interpolation=cv2.INTER_AREA)
+        variance = cv2.Laplacian(gray, cv2.CV_64F).var()
+        return float(variance / (variance + self.sharpness_reference))
+
+    def _pose(self, landmarks: Optional[np.ndarray]) -> float:
+        if landmarks is None:
+            # Sem malha não é possível estimar a pose: nota neutra
+            return 0.5
+
+        right_eye, left_eye, nose = landmarks[0], landmarks[1], landmarks[2]
+        chin, forehead = landmarks[5], landmarks[6]
+
+        eye_distance = np.linalg.norm(left_eye - right_eye)
+        face_height = np.linalg.norm(chin - forehead)
+        if eye_distance < 1e-3 or face_height < 1e-3:
+            return 0.0
+
+        # Yaw: deslocamento do nariz em relação ao meio dos olhos
+        eyes_mid = (left_eye + right_eye) / 2
+        yaw = abs(nose[0] - eyes_mid[0]) / eye_distance
+
+        # Pitch: posição vertical do nariz entre testa e queixo (≈0.55 de frente)
+        pitch = abs((nose[1] - forehead[1]) / face_height - 0.55)
+
+        # Roll: inclinação da linha dos olhos
+        roll = abs(np.arctan2(left_eye[1] - right_eye[1], abs(left_eye[0] - right_eye[0])))
+
+        penalty = max(yaw / self.max_yaw, pitch / 0.25, roll / (np.pi / 4))
+        return float(max(0.0, 1.0 - penalty))
+
+
+class BestShot:
+    """
+    Melhor captura de uma trilha dentro de uma janela de tempo.
+    """
+
+    def __init__(self, track_id: int, face_info: dict, crop: np.ndarray, crop_bbox: tuple,
+                 quality: float, timestamp: float):
+        self.track_id = track_id
+        self.face_info = face_info
+        self.crop = crop
+        # Caixa da face em coordenadas do recorte (para get_face_encoding)
+        self.crop_bbox = crop_bbox
+        self.quality = quality
+        self.timestamp = timestamp
+
+
+class BestShotSelector:
+    """
+    Mantém apenas a melhor captura de cada trilha por janela de tempo.
+
+    Ao fim de cada janela (ou quando a trilha termina), a melhor captura com
+    qualidade suficiente é liberada para codificação; as demais são descartadas.
+    """
+
+    def __init__(self,
+                 scorer: Optional[FaceQualityScorer] = None,
+                 window: float = 1.5,
+                 min_quality: float = 0.45,
+                 crop_padding: float = 0.2):
+        """
+        Inicializa o seletor.
+
+        Args:
+            scorer: Avaliador de qualidade (padrão: FaceQualityScorer())
+            window: Duração da janela de seleção em segundos
+            min_quality: Nota mínima para uma captura ser liberada
+            crop_padding: Margem relativa ao redor da caixa guardada no recorte
+        """
+        self.scorer = scorer or FaceQualityScorer()
+        self.window = window
+        self.min_quality = min_quality
+        self.crop_padding = crop_padding
+        self._candidates: Dict[int, dict] = {}
+
+        self.faces_scored = 0
+        self.shots_emitted = 0
+        self.faces_rejected = 0
+
+    def update(self, image: np.ndarray, faces_info: List[dict],
+               ended_tracks: Optional[List[int]] = None,
+               now: Optional[float] = None) -> List[BestShot]:
+        """
+        Avalia as faces do frame e retorna as capturas liberadas.
+
+        Cada face recebe 'quality' com a nota calculada.
+
+        Args:
+            image: Frame original (BGR)
+            faces_info: Faces rastreadas (com 'track_id')
+            ended_tracks: Trilhas encerradas neste frame
+            now: Instante atual em segundos (padrão: time.time())
+
+        Returns:
+            Lista de BestShot prontas para codificação
+        """
+        if now is None:
+            now = time.time()
+
+        shots = []
+
+        for face in faces_info:
+            track_id = face.get('track_id')
+            if track_id is None:
+                continue
+
+            quality = self.scorer.score(image, face)['quality']
+            face['quality'] = round(quality, 3)
+            self.faces_scored += 1
+
+            candidate = self._candidates.get(track_id)
+            if candidate is None:
+                candidate = {'window_start': now, 'best': None}
+                self._candidates[track_id] = candidate
+
+            best = candidate['best']
+            if quality >= self.min_quality and (best is None or quality > best.quality):
+                # Guarda apenas o recorte, não o frame inteiro
+                face_copy = {k: v for k, v in face.items() if k != 'landmarks'}
+                crop, crop_bbox, origin = self._crop(image, face['bbox'])
+                if face.get('landmarks') is not None:
+                    # Landmarks em coordenadas do recorte (para o codificador alinhado)
+                    face_copy['landmarks'] = face['landmarks'] - np.array(origin, dtype=np.float32)
+                candidate['best'] = BestShot(track_id, face_copy, crop, crop_bbox, quality, now)
+            elif quality < self.min_quality:
+                self.faces_rejected += 1
+
+            if now - candidate['window_start'] >= self.window:
+                shots.extend(self._close_window(track_id, now))
+
+        for track_id in ended_tracks or []:
+            shots.extend(self._close_window(track_id, now, ended=True))
+
+        return shots
+
+    def discard(self, track_ids):
+        """
+        Descarta as janelas das trilhas informadas sem liberar capturas
+        (ex.: trilhas de um detector que saiu de uso).
+        """
+        for track_id in track_ids:
+            self._candidates.pop(track_id, None)
+
+    def get_stats(self) -> dict:
+        """
+        Retorna contadores do seletor.
+        """
+        return {
+            'faces_scored': self.faces_scored,
+            'faces_rejected': self.faces_rejected,
+            'shots_emitted': self.shots_emitted,
+            'open_tracks': len(self._candidates)
+        }
+
+    def _close_window(self, track_id: int, now: float, ended: bool = False) -> List[BestShot]:
+        candidate = self._candidates.pop(track_id, None) if ended else self._candidates.get(track_id)
+        if candidate is None:
+            return []
+
+        best = candidate['best']
+        if not ended:
+            candidate['window_start'] = now
+            candidate['best'] = None
+
+        if best is None:
+            return []
+        self.shots_emitted += 1
+        return [best]
+
+    def _crop(self, image: np.ndarray, bbox):
+        x, y, w, h = bbox
+        pad_x, pad_y = int(w * self.crop_padding), int(h * self.crop_padding)
+        img_h, img_w = image.shape[:2]
+        x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+        x1, y1 = min(img_w, x + w + pad_x), min(img_h, y + h + pad_y)
+        crop_bbox = (max(0, x - x0), max(0, y - y0), min(w, x1 - max(x, x0)), min(h, y1 - max(y, y0)))
+        return image[y0:y1, x0:x1].copy(), crop_bbox, (x0, y0)
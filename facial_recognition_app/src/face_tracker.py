@@ -0,0 +1,90 @@
+import itertools
+import time
+import numpy as np
+from typing import List, Optional
+
+from detections import iou_matrix, match_boxes
+
+
+# IDs de trilha únicos no processo: um detector novo (pool, reciclagem) nunca
+# repete o ID de uma trilha anterior ainda guardada em caches por trilha
+# (identidade, melhor captura, fusão entre câmeras)
+_track_ids = itertools.count(1)
+
+
+class FaceTracker:
+    """
+    Rastreador simples por sobreposição (IoU) que atribui IDs estáveis às faces.
+
+    Cada face detectada é associada à trilha anterior de maior IoU; faces sem
+    correspondência abrem novas trilhas e trilhas não vistas por `max_age`
+    segundos são encerradas.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_age: float = 1.0):
+        """
+        Inicializa o rastreador.
+
+        Args:
+            iou_threshold: IoU mínimo para associar uma face a uma trilha existente
+            max_age: Tempo em segundos sem detecção até a trilha ser encerrada
+        """
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.tracks = {}
+        self.ended_tracks: List[int] = []
+
+    def update(self, faces_info: List[dict], now: Optional[float] = None) -> List[dict]:
+        """
+        Associa as faces do frame às trilhas e atualiza os IDs.
+
+        Cada face recebe 'track_id' (int) e 'id' no formato 'Face_<track_id>'.
+        As trilhas encerradas nesta chamada ficam em `ended_tracks`.
+
+        Args:
+            faces_info: Lista de faces retornada pelo detector
+            now: Instante atual em segundos (padrão: time.time())
+
+        Returns:
+            A mesma lista, com os IDs atualizados
+        """
+        if now is None:
+            now = time.time()
+
+        track_ids = list(self.tracks)
+        assigned = {}
+
+        if faces_info and track_ids:
+            track_boxes = np.array([self.tracks[t]['bbox'] for t in track_ids], dtype=np.float32)
+            face_boxes = np.array([face['bbox'] for face in faces_info], dtype=np.float32)
+            # Associação gulosa pelos pares de maior IoU
+            faces, tracks = match_boxes(iou_matrix(face_boxes, track_boxes), self.iou_threshold)
+            assigned = {face_idx: track_ids[track_idx]
+                        for face_idx, track_idx in zip(faces.tolist(), tracks.tolist())}
+
+        for idx, face in enumerate(faces_info):
+            track_id = assigned.get(idx)
+            if track_id is None:
+                track_id = next(_track_ids)
+                self.tracks[track_id] = {'first_seen': now, 'hits': 0}
+
+            track = self.tracks[track_id]
+            track['bbox'] = face['bbox']
+            track['last_seen'] = now
+            track['hits'] += 1
+
+            face['track_id'] = track_id
+            face['id'] = f'Face_{track_id}'
+
+        self.ended_tracks = [t for t, track in self.tracks.items() if now - track['last_seen'] > self.max_age]
+        for track_id in self.ended_tracks:
+            del self.tracks[track_id]
+
+        return faces_info
+
+    def reset(self):
+        """
+        Encerra todas as trilhas.
+        """
+        self.ended_tracks = list(self.tracks)
+        self.tracks = {}
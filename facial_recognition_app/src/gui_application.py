@@ -5,48 +5,158 @@ import cv2
 import numpy as np
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QLabel, QSlider, QCheckBox, QPushButton,
-                             QGroupBox, QGridLayout, QTextEdit, QSplitter, QFrame)
-from PyQt5.QtCore import QTimer, Qt, pyqtSignal
-from PyQt5.QtGui import QImage, QPixmap, QFont
+                             QGroupBox, QGridLayout, QTableView, QSplitter, QFrame,
+                             QOpenGLWidget, QComboBox)
+from PyQt5.QtCore import QTimer, Qt, pyqtSignal, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QImage, QFont, QPainter
 from face_detector import FaceDetector
-from camera_manager import CameraManagergit 
+from camera_manager import CameraManager
+from multiscale_detection import DETECTION_MODES
+from pipeline import DEFAULT_PIPELINES, build_pipeline, load_pipeline_config
 
+# Formato que permite exibir frames BGR sem conversão (Qt >= 5.14)
+QIMAGE_BGR888 = getattr(QImage, "Format_BGR888", None)
 
-class VideoWidget(QLabel):
+
+class FrameDisplayMixin:
     """
-    Widget personalizado para exibir o vídeo da câmera.
+    Lógica comum de exibição de frames.
+    
+    update_frame apenas guarda uma referência ao frame BGR; a conversão e a
+    escala acontecem no paint, uma vez por repintura e direto no tamanho do
+    widget, reaproveitando os mesmos buffers entre frames.
     """
     
-    def __init__(self):
-        super().__init__()
+    def init_display(self):
         self.setMinimumSize(640, 480)
         self.setStyleSheet("border: 2px solid gray; background-color: black;")
-        self.setAlignment(Qt.AlignCenter)
-        self.setText("Câmera não iniciada")
-        self.setScaledContents(True)
+        self._frame = None
+        self._text = "Câmera não iniciada"
+        
+        # Buffers reaproveitados enquanto o tamanho do widget não muda
+        self._scaled = None
+        self._display = None
+        self._display_image = None
+    
+    def setText(self, text):
+        """
+        Exibe uma mensagem no lugar do vídeo.
+        
+        Args:
+            text: Mensagem (string vazia apenas remove a mensagem atual)
+        """
+        self._text = text
+        if text:
+            self._frame = None
+        self.update()
+    
+    def text(self):
+        return self._text
     
     def update_frame(self, cv_img):
         """
         Atualiza o frame exibido no widget.
         
         Args:
-            cv_img: Imagem OpenCV (BGR)
+            cv_img: Imagem OpenCV (BGR), exibida sem cópia prévia
         """
+        self._frame = cv_img
+        self._text = ""
+        self.update()
+    
+    def paint_frame(self, painter, prescale=True):
+        """
+        Desenha o frame atual (ou a mensagem) ocupando todo o widget.
+        
+        Args:
+            painter: QPainter ativo sobre o widget
+            prescale: Se True, escala com OpenCV para um buffer do tamanho do
+                      widget; se False, deixa a escala para o QPainter (OpenGL)
+        """
+        rect = self.rect()
+        frame = self._frame
+        
+        if frame is None or rect.width() <= 0 or rect.height() <= 0:
+            painter.fillRect(rect, Qt.black)
+            if self._text:
+                painter.setPen(Qt.white)
+                painter.drawText(rect, Qt.AlignCenter, self._text)
+            return
+        
         try:
-            # Converte BGR para RGB
-            rgb_image = cv2.cvtColor(cv_img, cv2.COLOR_BGR2RGB)
-            h, w, ch = rgb_image.shape
-            bytes_per_line = ch * w
-            
-            # Cria QImage
-            qt_image = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format_RGB888)
-            
-            # Converte para QPixmap e exibe
-            pixmap = QPixmap.fromImage(qt_image)
-            self.setPixmap(pixmap)
-            
+            if prescale:
+                painter.drawImage(0, 0, self._scale_to_display(frame, rect.width(), rect.height()))
+            else:
+                painter.drawImage(rect, self._wrap_frame(frame))
         except Exception as e:
             print(f"Erro ao atualizar frame: {e}")
+    
+    def _scale_to_display(self, frame, width, height):
+        if self._display is None or self._display.shape[:2] != (height, width):
+            self._scaled = np.empty((height, width, 3), dtype=np.uint8)
+            self._display = np.empty((height, width, 4), dtype=np.uint8)
+            # Format_RGB32 em little-endian tem os bytes na ordem B, G, R, X
+            self._display_image = QImage(self._display.data, width, height,
+                                         self._display.strides[0], QImage.Format_RGB32)
+        
+        # Vizinho mais próximo: mesma qualidade da escala rápida do QLabel anterior
+        cv2.resize(frame, (width, height), dst=self._scaled, interpolation=cv2.INTER_NEAREST)
+        cv2.cvtColor(self._scaled, cv2.COLOR_BGR2BGRA, dst=self._display)
+        return self._display_image
+    
+    def _wrap_frame(self, frame):
+        if not frame.flags['C_CONTIGUOUS']:
+            frame = np.ascontiguousarray(frame)
+        if QIMAGE_BGR888 is None:
+            # Qt < 5.14 não tem formato BGR
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        self._frame = frame
+        
+        h, w = frame.shape[:2]
+        return QImage(frame.data, w, h, frame.strides[0],
+                      QIMAGE_BGR888 if QIMAGE_BGR888 is not None else QImage.Format_RGB888)
+
+
+class VideoWidget(FrameDisplayMixin, QWidget):
+    """
+    Widget personalizado para exibir o vídeo da câmera.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.init_display()
+        # O widget pinta todos os pixels: evita limpar o fundo a cada frame
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+    
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        self.paint_frame(painter)
+        painter.end()
+
+
+class OpenGLVideoWidget(FrameDisplayMixin, QOpenGLWidget):
+    """
+    Variante de VideoWidget que desenha via OpenGL: o frame é enviado como
+    textura e escalado pela GPU (ou pelo Mesa em software).
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.init_display()
+    
+    def paintGL(self):
+        painter = QPainter(self)
+        self.paint_frame(painter, prescale=False)
+        painter.end()
+
+
+def create_video_widget():
+    """
+    Cria o widget de vídeo; VIDEO_OPENGL=1 seleciona a versão OpenGL.
+    """
+    if os.environ.get("VIDEO_OPENGL", "0") == "1":
+        return OpenGLVideoWidget()
+    return VideoWidget()
 
 
 class ParameterPanel(QWidget):
@@ -60,6 +170,8 @@ class ParameterPanel(QWidget):
     show_landmarks_changed = pyqtSignal(bool)
     show_bounding_box_changed = pyqtSignal(bool)
     show_face_id_changed = pyqtSignal(bool)
+    redact_faces_changed = pyqtSignal(bool)
+    detection_mode_changed = pyqtSignal(str)
     
     def __init__(self):
         super().__init__()
@@ -103,6 +215,13 @@ class ParameterPanel(QWidget):
         self.tracking_label = QLabel("0.50")
         confidence_layout.addWidget(self.tracking_label, 1, 2)
         
+        # Estratégia de detecção (alcance)
+        confidence_layout.addWidget(QLabel("Modo:"), 2, 0)
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItems(DETECTION_MODES)
+        self.mode_combo.currentTextChanged.connect(self.on_detection_mode_changed)
+        confidence_layout.addWidget(self.mode_combo, 2, 1, 1, 2)
+        
         confidence_group.setLayout(confidence_layout)
         layout.addWidget(confidence_group)
         
@@ -126,6 +245,11 @@ class ParameterPanel(QWidget):
         self.face_id_checkbox.stateChanged.connect(self.on_show_face_id_changed)
         display_layout.addWidget(self.face_id_checkbox)
         
+        self.redact_checkbox = QCheckBox("Anonimizar Faces")
+        self.redact_checkbox.setChecked(False)
+        self.redact_checkbox.stateChanged.connect(self.on_redact_faces_changed)
+        display_layout.addWidget(self.redact_checkbox)
+        
         display_group.setLayout(display_layout)
         layout.addWidget(display_group)
         
@@ -167,16 +291,122 @@ class ParameterPanel(QWidget):
         Callback para mudança na exibição de IDs das faces.
         """
         self.show_face_id_changed.emit(state == Qt.Checked)
+    
+    def on_redact_faces_changed(self, state):
+        """
+        Callback para mudança no modo de anonimização.
+        """
+        self.redact_faces_changed.emit(state == Qt.Checked)
+    
+    def on_detection_mode_changed(self, mode):
+        """
+        Callback para mudança na estratégia de detecção.
+        """
+        self.detection_mode_changed.emit(mode)
+
+
+class FaceTableModel(QAbstractTableModel):
+    """
+    Modelo de tabela das faces detectadas, com uma linha por ID de face.
+    
+    A cada atualização apenas as linhas cujo texto mudou são sinalizadas à
+    view; linhas de faces que sumiram são removidas e novas faces entram no
+    final, sem reconstruir a tabela inteira.
+    """
+    
+    HEADERS = ("ID", "Confiança", "Posição", "Tamanho")
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._ids = []
+        self._rows = {}
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._ids)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        return self._rows[self._ids[index.row()]][index.column()]
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+    
+    def update_faces(self, faces_info):
+        """
+        Aplica a lista atual de faces ao modelo.
+        
+        Args:
+            faces_info: Lista de informações das faces
+            
+        Returns:
+            Quantidade de linhas alteradas, inseridas ou removidas
+        """
+        new_rows = {}
+        for face in faces_info:
+            new_rows[face['id']] = (
+                str(face['id']),
+                f"{face['confidence']:.3f}",
+                f"{face['center']}",
+                f"{face['bbox'][2]}x{face['bbox'][3]}"
+            )
+        
+        changes = 0
+        
+        # Remove faces que saíram, de baixo para cima para manter os índices
+        for row in range(len(self._ids) - 1, -1, -1):
+            face_id = self._ids[row]
+            if face_id not in new_rows:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self._ids[row]
+                del self._rows[face_id]
+                self.endRemoveRows()
+                changes += 1
+        
+        # Atualiza apenas as linhas cujo texto mudou
+        for row, face_id in enumerate(self._ids):
+            values = new_rows[face_id]
+            if values != self._rows[face_id]:
+                self._rows[face_id] = values
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+                changes += 1
+        
+        # Insere faces novas no final
+        added = [face_id for face_id in new_rows if face_id not in self._rows]
+        if added:
+            first = len(self._ids)
+            self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+            for face_id in added:
+                self._ids.append(face_id)
+                self._rows[face_id] = new_rows[face_id]
+            self.endInsertRows()
+            changes += len(added)
+        
+        return changes
 
 
 class InfoPanel(QWidget):
     """
     Painel de informações sobre as faces detectadas.
+    
+    update_info apenas guarda os dados mais recentes; a interface é
+    atualizada por um timer próprio, em taxa menor que a de inferência.
     """
     
-    def __init__(self):
+    def __init__(self, refresh_interval_ms=200):
         super().__init__()
+        self._pending = None
         self.init_ui()
+        
+        # Timer de atualização, independente da taxa de frames
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start(refresh_interval_ms)
     
     def init_ui(self):
         """
@@ -190,11 +420,19 @@ class InfoPanel(QWidget):
         title.setAlignment(Qt.AlignCenter)
         layout.addWidget(title)
         
-        # Área de texto para informações
-        self.info_text = QTextEdit()
-        self.info_text.setReadOnly(True)
-        self.info_text.setMaximumHeight(200)
-        layout.addWidget(self.info_text)
+        # Tabela de faces
+        self.face_model = FaceTableModel(self)
+        self.face_table = QTableView()
+        self.face_table.setModel(self.face_model)
+        self.face_table.setMaximumHeight(200)
+        self.face_table.setEditTriggers(QTableView.NoEditTriggers)
+        self.face_table.verticalHeader().setVisible(False)
+        self.face_table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.face_table)
+        
+        self.empty_label = QLabel("Nenhuma face detectada")
+        self.empty_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.empty_label)
         
         # Estatísticas
         stats_group = QGroupBox("Estatísticas")
@@ -215,29 +453,34 @@ class InfoPanel(QWidget):
     
     def update_info(self, faces_info, fps):
         """
-        Atualiza as informações das faces detectadas.
+        Registra as informações das faces detectadas para a próxima atualização.
         
         Args:
             faces_info: Lista de informações das faces
             fps: Taxa de quadros por segundo
         """
-        # Atualiza contadores
-        self.faces_count_label.setText(str(len(faces_info)))
-        self.fps_label.setText(f"{fps:.1f}")
-        
-        # Atualiza texto de informações
-        info_text = ""
-        for i, face in enumerate(faces_info):
-            info_text += f"Face {i+1}:\n"
-            info_text += f"  ID: {face['id']}\n"
-            info_text += f"  Confiança: {face['confidence']:.3f}\n"
-            info_text += f"  Posição: {face['center']}\n"
-            info_text += f"  Tamanho: {face['bbox'][2]}x{face['bbox'][3]}\n\n"
+        self._pending = (faces_info, fps)
+    
+    def refresh(self):
+        """
+        Aplica os dados pendentes à interface, se houver.
+        """
+        if self._pending is None:
+            return
+        faces_info, fps = self._pending
+        self._pending = None
         
-        if not faces_info:
-            info_text = "Nenhuma face detectada"
+        # Atualiza contadores somente se o texto mudou
+        self._set_label(self.faces_count_label, str(len(faces_info)))
+        self._set_label(self.fps_label, f"{fps:.1f}")
         
-        self.info_text.setText(info_text)
+        self.face_model.update_faces(faces_info)
+        self.empty_label.setVisible(not faces_info)
+    
+    @staticmethod
+    def _set_label(label, text):
+        if label.text() != text:
+            label.setText(text)
 
 
 class FacialRecognitionApp(QMainWindow):
@@ -249,6 +492,10 @@ class FacialRecognitionApp(QMainWindow):
         super().__init__()
         self.camera_manager = None
         self.face_detector = None
+        self.pipeline = None
+        # Último resultado publicado pelo pipeline e o último exibido
+        self.latest_result = None
+        self.shown_result = None
         self.timer = None
         self.fps_counter = 0
         self.fps_timer = 0
@@ -279,7 +526,7 @@ class FacialRecognitionApp(QMainWindow):
         left_layout = QVBoxLayout()
         
         # Widget de vídeo
-        self.video_widget = VideoWidget()
+        self.video_widget = create_video_widget()
         left_layout.addWidget(self.video_widget)
         
         # Botões de controle
@@ -348,6 +595,12 @@ class FacialRecognitionApp(QMainWindow):
         self.parameter_panel.show_face_id_changed.connect(
             lambda x: self.face_detector.update_parameters(show_face_id=x)
         )
+        self.parameter_panel.redact_faces_changed.connect(
+            lambda x: self.face_detector.update_parameters(redact_faces=x)
+        )
+        self.parameter_panel.detection_mode_changed.connect(
+            lambda x: self.face_detector.update_parameters(detection_mode=x)
+        )
         
         # Timer para captura de vídeo
         self.timer = QTimer()
@@ -366,6 +619,8 @@ class FacialRecognitionApp(QMainWindow):
             self.camera_manager = CameraManager()
             
             if self.camera_manager.start_camera():
+                self.pipeline = self.create_pipeline()
+                self.pipeline.start()
                 self.timer.start(30)  # ~33 FPS
                 self.start_button.setEnabled(False)
                 self.stop_button.setEnabled(True)
@@ -386,6 +641,11 @@ class FacialRecognitionApp(QMainWindow):
         if self.timer:
             self.timer.stop()
         
+        if self.pipeline:
+            self.pipeline.stop()
+            self.pipeline = None
+        self.latest_result = self.shown_result = None
+        
         if self.camera_manager:
             self.camera_manager.stop_camera()
             self.camera_manager = None
@@ -396,23 +656,45 @@ class FacialRecognitionApp(QMainWindow):
         self.info_panel.update_info([], 0)
         print("Câmera parada")
 
+    def create_pipeline(self):
+        """
+        Monta o pipeline de processamento (seção 'gui' de PIPELINE_CONFIG, se definido).
+        """
+        config_path = os.environ.get("PIPELINE_CONFIG")
+        stages = load_pipeline_config(config_path, "gui") if config_path else DEFAULT_PIPELINES["gui"]
+        return build_pipeline(stages, {
+            "camera": self.camera_manager,
+            "detector": self.face_detector,
+            "publish": self.on_pipeline_result
+        })
+    
+    def on_pipeline_result(self, item):
+        """
+        Recebe o resultado de um frame do pipeline.
+        
+        Pode ser chamado fora da thread da interface (estágios em thread
+        própria): apenas guarda o resultado, exibido pelo timer.
+        """
+        self.latest_result = item
+    
     def update_frame(self):
         """
         Atualiza o frame do vídeo.
         """
-        if not self.camera_manager:
+        if not self.camera_manager or not self.pipeline:
             return
         
         try:
-            ret, frame = self.camera_manager.read_frame()
+            # Lê e processa um frame (estágios inline rodam nesta thread)
+            self.pipeline.step()
             
-            if ret and frame is not None:
-
-                # Processa detecção facial
-                annotated_frame, faces_info = self.face_detector.detect_faces(frame)
+            item = self.latest_result
+            if item is not None and item is not self.shown_result:
+                self.shown_result = item
+                faces_info = item.faces_info or []
                 
                 # Atualiza widget de vídeo
-                self.video_widget.update_frame(annotated_frame)
+                self.video_widget.update_frame(item.annotated if item.annotated is not None else item.frame)
                 
                 # Atualiza informações
                 self.info_panel.update_info(faces_info, self.current_fps)
@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+
+from face_gallery import correlation
+
+
+class IdentityEntry:
+    """
+    Identidade associada a uma trilha.
+    """
+
+    def __init__(self, identity: Optional[str], confidence: float, encoding: np.ndarray, now: float):
+        self.identity = identity
+        self.confidence = confidence
+        # Codificação usada na última verificação (referência para medir a deriva)
+        self.encoding = encoding
+        self.verified_at = now
+        self.last_seen = now
+
+
+class IdentityCache:
+    """
+    Cache de identidades por trilha (LRU com TTL).
+
+    A identificação na galeria só é refeita quando a trilha é nova, quando
+    passou `reverify_interval` desde a última verificação ou quando a aparência
+    derivou (similaridade com a codificação verificada abaixo de
+    `drift_threshold`). Entradas de trilhas encerradas são removidas.
+    """
+
+    def __init__(self,
+                 identify: Callable[[np.ndarray], tuple],
+                 max_entries: int = 256,
+                 ttl: float = 30.0,
+                 reverify_interval: float = 10.0,
+                 drift_threshold: float = 0.8,
+                 similarity: Callable[[np.ndarray, np.ndarray], float] = None):
+        """
+        Inicializa o cache.
+
+        Args:
+            identify: Função que recebe uma codificação e retorna (identidade, confiança)
+            max_entries: Máximo de trilhas guardadas (as menos usadas saem primeiro)
+            ttl: Segundos sem acesso até a entrada expirar
+            reverify_interval: Segundos até uma identidade ser verificada novamente
+            drift_threshold: Similaridade mínima com a codificação verificada
+            similarity: Função de similaridade entre codificações (padrão: correlação)
+        """
+        self.identify = identify
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.reverify_interval = reverify_interval
+        self.drift_threshold = drift_threshold
+        self.similarity = similarity or (lambda a, b: float(correlation(a, b)[0]))
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.identifications = 0
+        self.verifications_skipped = 0
+        self.reverifications = 0
+        self.drift_reverifications = 0
+        self.evictions = 0
+
+    def get(self, track_id: int, now: Optional[float] = None) -> Optional[IdentityEntry]:
+        """
+        Retorna a identidade em cache da trilha, contando acerto ou falha.
+
+        Consulta barata, feita a cada frame; não chama a galeria.
+        """
+        if now is None:
+            now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(track_id)
+            if entry is not None and now - entry.last_seen > self.ttl:
+                del self._entries[track_id]
+                self.evictions += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            entry.last_seen = now
+            self._entries.move_to_end(track_id)
+            self.hits += 1
+            return entry
+
+    def resolve(self, track_id: int, encoding: np.ndarray, now: Optional[float] = None) -> IdentityEntry:
+        """
+        Retorna a identidade da trilha, identificando na galeria apenas se necessário.
+
+        Args:
+            track_id: ID da trilha (FaceTracker)
+            encoding: Codificação atual da face
+            now: Instante atual em segundos (padrão: time.time())
+
+        Returns:
+            Entrada com identidade e confiança
+        """
+        if now is None:
+            now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(track_id)
+            if entry is not None and now - entry.last_seen > self.ttl:
+                entry = None
+
+        if entry is not None:
+            if now - entry.verified_at < self.reverify_interval:
+                if self.similarity(entry.encoding, encoding) >= self.drift_threshold:
+                    with self._lock:
+                        entry.last_seen = now
+                        self._entries.move_to_end(track_id)
+                        self.verifications_skipped += 1
+                    return entry
+                self.drift_reverifications += 1
+            self.reverifications += 1
+
+        # Identificação fora do lock: pode ser lenta com galerias grandes
+        identity, confidence = self.identify(encoding)
+        entry = IdentityEntry(identity, float(confidence), encoding, now)
+
+        with self._lock:
+            self.identifications += 1
+            self._entries[track_id] = entry
+            self._entries.move_to_end(track_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return entry
+
+    def evict(self, track_ids: Iterable[int]):
+        """
+        Remove as entradas das trilhas informadas (trilhas encerradas).
+        """
+        with self._lock:
+            for track_id in track_ids:
+                if self._entries.pop(track_id, None) is not None:
+                    self.evictions += 1
+
+    def clear(self):
+        """
+        Remove todas as entradas (ex.: após mudanças na galeria).
+        """
+        with self._lock:
+            self.evictions += len(self._entries)
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        """
+        Retorna contadores e taxa de acerto do cache.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'miss_rate': round(self.misses / lookups, 3) if lookups else 0.0,
+            'identifications': self.identifications,
+            'verifications_skipped': self.verifications_skipped,
+            'reverifications': self.reverifications,
+            'drift_reverifications': self.drift_reverifications,
+            'evictions': self.evictions
+        }
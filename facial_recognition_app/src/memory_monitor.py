@@ -0,0 +1,397 @@
+import argparse
+import ctypes
+import ctypes.util
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable, List, Optional
+
+try:
+    import psutil
+except ImportError:  # Dependência opcional (fora do Linux, sem ela o RSS não é medido)
+    psutil = None
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6')
+    _malloc_trim = _libc.malloc_trim
+except (OSError, AttributeError):  # Sem glibc (Windows, macOS, musl)
+    _malloc_trim = None
+
+
+# Ações do controle de orçamento, na ordem de escalonamento:
+#   recycle - coleta de lixo, devolução de memória livre ao sistema e
+#             detectores ociosos do pool recriados
+#   restart - reinício controlado da detecção (câmera e detector novos)
+BUDGET_ACTIONS = ('recycle', 'restart')
+
+
+def rss_bytes() -> Optional[int]:
+    """
+    Memória residente (RSS) do processo, ou None se não puder ser medida.
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def release_free_memory() -> bool:
+    """
+    Coleta o lixo e devolve ao sistema a memória livre do alocador (glibc).
+
+    Os grafos do MediaPipe deixam o heap fragmentado; sem malloc_trim o RSS
+    não diminui mesmo depois de liberados.
+
+    Returns:
+        True se o alocador devolveu memória
+    """
+    gc.collect()
+    return bool(_malloc_trim(0)) if _malloc_trim is not None else False
+
+
+def native_graph_counts() -> dict:
+    """
+    Conta os grafos do MediaPipe vivos no processo, abertos e já fechados.
+
+    Percorre os objetos do coletor de lixo (dezenas de ms): use sob demanda.
+    Grafos abertos que só crescem indicam detectores não liberados; grafos
+    fechados que só crescem, referências esquecidas.
+
+    Returns:
+        Dicionário {'open': n, 'closed': n, 'by_type': {classe: abertos}}
+    """
+    try:
+        from mediapipe.python.solution_base import SolutionBase
+    except ImportError:
+        return {'open': 0, 'closed': 0, 'by_type': {}}
+
+    opened, closed = Counter(), 0
+    for obj in gc.get_objects():
+        if isinstance(obj, SolutionBase):
+            if getattr(obj, '_graph', None) is not None:
+                opened[type(obj).__name__] += 1
+            else:
+                closed += 1
+    return {'open': sum(opened.values()), 'closed': closed, 'by_type': dict(opened)}
+
+
+class MemoryMonitor:
+    """
+    Contabilidade de memória e controle de orçamento do processo.
+
+    Uma thread própria mede o RSS a cada `check_interval` segundos (leitura
+    de /proc, sem custo relevante). Acima do orçamento, as ações de
+    BUDGET_ACTIONS são aplicadas em ordem, uma por vez e com `cooldown`
+    segundos para surtirem efeito antes da próxima; ao voltar abaixo de
+    `recover_ratio` do orçamento o escalonamento recomeça do início. O
+    tracemalloc (caro) só roda entre start_tracing() e stop_tracing(); top
+    allocations compara com o instante em que o rastreamento começou, de
+    modo que os maiores crescimentos aparecem primeiro.
+    """
+
+    def __init__(self,
+                 budget_bytes: int = 0,
+                 check_interval: float = 30.0,
+                 recycle: Optional[Callable[[], None]] = None,
+                 restart: Optional[Callable[[], None]] = None,
+                 cooldown: Optional[float] = None,
+                 recover_ratio: float = 0.9):
+        """
+        Inicializa o monitor (parado).
+
+        Args:
+            budget_bytes: Orçamento de RSS (0 apenas mede)
+            check_interval: Segundos entre medições
+            recycle: Função que recria os recursos ociosos (ação 'recycle')
+            restart: Função que reinicia a detecção (ação 'restart')
+            cooldown: Segundos entre ações (padrão: 2 x check_interval)
+            recover_ratio: Fração do orçamento abaixo da qual o escalonamento é zerado
+        """
+        self.budget_bytes = budget_bytes
+        self.check_interval = check_interval
+        self.cooldown = 2 * check_interval if cooldown is None else cooldown
+        self.recover_ratio = recover_ratio
+        self._actions = {'recycle': recycle, 'restart': restart}
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._trace_baseline = None
+        self._level = 0
+        self._last_action = None
+
+        self.rss = rss_bytes()
+        self.peak_rss = self.rss
+        self.checks = 0
+        self.over_budget = 0
+        self.actions: Counter = Counter()
+        self.last_action = None
+
+    def start(self):
+        """
+        Inicia as medições periódicas.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='memory-monitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Encerra as medições (e o tracemalloc, se ativo).
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        self.stop_tracing()
+
+    def check(self, now: Optional[float] = None) -> Optional[str]:
+        """
+        Mede o RSS e aplica a próxima ação se o orçamento foi excedido.
+
+        Returns:
+            Ação aplicada ou None
+        """
+        if now is None:
+            now = time.monotonic()
+        self.rss = rss_bytes()
+        self.checks += 1
+        if self.rss is None:
+            return None
+        self.peak_rss = max(self.peak_rss or 0, self.rss)
+        if not self.budget_bytes:
+            return None
+
+        if self.rss <= self.budget_bytes * self.recover_ratio:
+            self._level = 0
+            return None
+        if self.rss <= self.budget_bytes:
+            return None
+
+        self.over_budget += 1
+        if self._last_action is not None and now - self._last_action < self.cooldown:
+            return None
+
+        # A última ação se repete enquanto o orçamento continuar excedido
+        action = BUDGET_ACTIONS[min(self._level, len(BUDGET_ACTIONS) - 1)]
+        self._level += 1
+        self._last_action = now
+        print(f"Memória acima do orçamento ({self.rss / 2 ** 20:.0f} MB de "
+              f"{self.budget_bytes / 2 ** 20:.0f} MB): {action}")
+        release_free_memory()
+        callback = self._actions.get(action)
+        if callback is not None:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Erro na ação de memória '{action}': {e}")
+        if action == 'recycle':
+            release_free_memory()
+        self.actions[action] += 1
+        self.last_action = action
+        return action
+
+    def start_tracing(self, frames: int = 10) -> bool:
+        """
+        Inicia o tracemalloc (deixa as alocações Python várias vezes mais lentas).
+
+        Returns:
+            False se já estiver rastreando
+        """
+        if tracemalloc.is_tracing():
+            return False
+        tracemalloc.start(frames)
+        self._trace_baseline = tracemalloc.take_snapshot()
+        return True
+
+    def stop_tracing(self):
+        """
+        Encerra o tracemalloc e descarta os snapshots.
+        """
+        self._trace_baseline = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def top_allocations(self, limit: int = 10) -> List[dict]:
+        """
+        Maiores crescimentos de memória Python desde start_tracing(), por linha.
+
+        Returns:
+            Lista de {'location', 'size_kb', 'size_diff_kb', 'count', 'count_diff'};
+            vazia se o tracemalloc não estiver ativo
+        """
+        if not tracemalloc.is_tracing() or self._trace_baseline is None:
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>')
+        ])
+        stats = snapshot.compare_to(self._trace_baseline, 'lineno')
+        return [{
+            'location': f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+            'size_kb': round(stat.size / 1024.0, 1),
+            'size_diff_kb': round(stat.size_diff / 1024.0, 1),
+            'count': stat.count,
+            'count_diff': stat.count_diff
+        } for stat in stats[:limit]]
+
+    def get_stats(self, graphs: bool = False, top: int = 0) -> dict:
+        """
+        Retorna as medições e as ações aplicadas.
+
+        Args:
+            graphs: Se True, conta os grafos nativos vivos (native_graph_counts)
+            top: Quantidade de linhas de top_allocations (0 não inclui)
+        """
+        # Leitura de /proc: barata o bastante para cada consulta de status
+        self.rss = rss_bytes()
+        if self.rss is not None:
+            self.peak_rss = max(self.peak_rss or 0, self.rss)
+        mb = 1.0 / 2 ** 20
+        stats = {
+            'rss_mb': round(self.rss * mb, 1) if self.rss is not None else None,
+            'peak_rss_mb': round(self.peak_rss * mb, 1) if self.peak_rss is not None else None,
+            'budget_mb': round(self.budget_bytes * mb, 1) if self.budget_bytes else None,
+            'checks': self.checks,
+            'over_budget': self.over_budget,
+            'actions': dict(self.actions),
+            'last_action': self.last_action,
+            'gc_objects': len(gc.get_objects()) if graphs else None,
+            'tracing': tracemalloc.is_tracing()
+        }
+        if graphs:
+            stats['native_graphs'] = native_graph_counts()
+        if top:
+            stats['top_allocations'] = self.top_allocations(top)
+        return stats
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Erro no monitor de memória: {e}")
+
+
+def soak(cycles: int = 1000, sample_every: int = 50, update_parameters: bool = True,
+         width: int = 320, height: int = 240, frames_per_cycle: int = 3,
+         detection_mode: str = 'short') -> dict:
+    """
+    Teste de resistência: repete o ciclo iniciar/parar da API e mede o RSS.
+
+    Cada ciclo abre a câmera (um vídeo sintético), retira um detector do
+    pool, processa alguns frames por um pipeline com um estágio em thread
+    própria, para tudo, altera os parâmetros do detector (recriando os
+    grafos) e o devolve ao pool.
+
+    Args:
+        detection_mode: Modo de detecção dos detectores do pool ('tiled'
+                        exercita os grafos dos recortes a cada nova thread)
+
+    Returns:
+        Dicionário com o RSS (MB) após o aquecimento e no fim, o crescimento
+        por 1000 ciclos (regressão sobre a segunda metade) e os grafos vivos
+    """
+    import tempfile
+
+    import cv2
+    import numpy as np
+
+    from camera_manager import CameraManager
+    from detector_pool import DetectorPool
+    from face_detector import FaceDetector
+    from pipeline import build_pipeline
+
+    stages = [{'type': 'source'},
+              {'type': 'detect', 'placement': 'thread', 'queue_size': 1, 'drop': 'block'},
+              {'type': 'track'},
+              {'type': 'publish'}]
+    samples = []
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'soak.avi')
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30, (width, height))
+        for i in range(frames_per_cycle + 2):
+            frame = np.full((height, width, 3), 80, dtype=np.uint8)
+            cv2.circle(frame, (40 + i * 10, height // 2), 20, (255, 255, 255), -1)
+            writer.write(frame)
+        writer.release()
+
+        # Recortes menores que o frame sintético, para que o modo 'tiled' os use
+        options = {'tile_size': height // 2, 'motion_tiles': False} if detection_mode == 'tiled' else None
+        pool = DetectorPool(size=1, factory=lambda: FaceDetector(detection_mode=detection_mode,
+                                                                 detection_options=options))
+        pool.warm_up()
+        started = time.perf_counter()
+        for cycle in range(1, cycles + 1):
+            camera = CameraManager(path, width, height)
+            detector = pool.acquire()
+            if camera.start_camera():
+                pipeline = build_pipeline(stages, {'camera': camera, 'detector': detector,
+                                                   'publish': lambda item: None})
+                pipeline.start()
+                for _ in range(frames_per_cycle):
+                    pipeline.step()
+                pipeline.stop()
+            camera.stop_camera()
+            if update_parameters:
+                detector.update_parameters(min_detection_confidence=0.5 + 0.1 * (cycle % 2),
+                                           min_tracking_confidence=0.5 + 0.1 * (cycle % 2))
+            pool.release(detector)
+
+            if cycle % sample_every == 0 or cycle == cycles:
+                gc.collect()
+                samples.append((cycle, rss_bytes() or 0))
+        elapsed = time.perf_counter() - started
+        graphs = native_graph_counts()
+        pool.close()
+
+    mb = 1.0 / 2 ** 20
+    tail = samples[len(samples) // 2:]
+    slope = 0.0
+    if len(tail) > 1:
+        x = np.array([c for c, _ in tail], dtype=np.float64)
+        y = np.array([r for _, r in tail], dtype=np.float64) * mb
+        slope = float(np.polyfit(x, y, 1)[0]) * 1000.0
+    return {
+        'cycles': cycles,
+        'seconds': round(elapsed, 1),
+        'rss_warm_mb': round(samples[0][1] * mb, 1),
+        'rss_end_mb': round(samples[-1][1] * mb, 1),
+        'rss_peak_mb': round(max(r for _, r in samples) * mb, 1),
+        'growth_mb_per_1000': round(slope, 2),
+        'open_graphs': graphs['open'],
+        'closed_graphs': graphs['closed']
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Teste de resistência de linha de comando: python src/memory_monitor.py --cycles 2000
+    """
+    parser = argparse.ArgumentParser(description="Teste de resistência de memória (iniciar/parar)")
+    parser.add_argument("--cycles", type=int, default=1000)
+    parser.add_argument("--sample-every", type=int, default=50)
+    parser.add_argument("--no-update-parameters", action="store_true")
+    parser.add_argument("--detection-mode", default="short")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    result = soak(args.cycles, args.sample_every, update_parameters=not args.no_update_parameters,
+                  detection_mode=args.detection_mode)
+    print(f"{result['cycles']} ciclos em {result['seconds']:.0f} s: RSS {result['rss_warm_mb']:.0f} MB "
+          f"-> {result['rss_end_mb']:.0f} MB (pico {result['rss_peak_mb']:.0f} MB), "
+          f"{result['growth_mb_per_1000']:+.2f} MB por 1000 ciclos; "
+          f"grafos abertos {result['open_graphs']}, fechados {result['closed_graphs']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,134 @@
+import time
+import cv2
+import numpy as np
+from typing import Optional
+
+
+class MotionGate:
+    """
+    Pré-filtro de movimento executado antes do detector facial.
+
+    Compara uma versão reduzida e em escala de cinza de cada frame com o frame
+    usado na última inferência. Se a cena não mudou, o detector não é executado
+    e o resultado anterior pode ser reaproveitado.
+    """
+
+    def __init__(self,
+                 pixel_threshold: int = 25,
+                 min_changed_ratio: float = 0.01,
+                 recheck_interval: float = 2.0,
+                 downscale_width: int = 160):
+        """
+        Inicializa o filtro de movimento.
+
+        Args:
+            pixel_threshold: Diferença mínima de intensidade (0-255) para um pixel ser considerado alterado
+            min_changed_ratio: Fração mínima de pixels alterados para considerar que houve movimento (0.0 - 1.0)
+            recheck_interval: Intervalo máximo em segundos sem inferência, mesmo sem movimento
+            downscale_width: Largura da imagem reduzida usada na comparação
+        """
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_ratio = min_changed_ratio
+        self.recheck_interval = recheck_interval
+        self.downscale_width = downscale_width
+
+        self.reference = None
+        self.last_process_time = None
+        self.last_changed_ratio = 0.0
+
+        # Contadores
+        self.frames_total = 0
+        self.frames_processed = 0
+        self.frames_skipped = 0
+        self.forced_rechecks = 0
+
+    def update_parameters(self,
+                          pixel_threshold: Optional[int] = None,
+                          min_changed_ratio: Optional[float] = None,
+                          recheck_interval: Optional[float] = None):
+        """
+        Atualiza a sensibilidade do filtro.
+        """
+        if pixel_threshold is not None:
+            self.pixel_threshold = pixel_threshold
+
+        if min_changed_ratio is not None:
+            self.min_changed_ratio = min_changed_ratio
+
+        if recheck_interval is not None:
+            self.recheck_interval = recheck_interval
+
+    def should_process(self, frame: np.ndarray, now: Optional[float] = None) -> bool:
+        """
+        Decide se o frame precisa passar pelo detector.
+
+        Args:
+            frame: Frame de entrada (BGR)
+            now: Instante atual em segundos (padrão: time.time())
+
+        Returns:
+            True se o detector deve ser executado, False se o último resultado pode ser reaproveitado
+        """
+        if now is None:
+            now = time.time()
+
+        self.frames_total += 1
+        small = self._prepare(frame)
+
+        if self.reference is None or self.reference.shape != small.shape:
+            return self._accept(small, now)
+
+        diff = cv2.absdiff(small, self.reference)
+        changed = int(np.count_nonzero(diff > self.pixel_threshold))
+        self.last_changed_ratio = changed / diff.size
+
+        if self.last_changed_ratio >= self.min_changed_ratio:
+            return self._accept(small, now)
+
+        if now - self.last_process_time >= self.recheck_interval:
+            self.forced_rechecks += 1
+            return self._accept(small, now)
+
+        self.frames_skipped += 1
+        return False
+
+    def reset(self):
+        """
+        Descarta o frame de referência, forçando inferência no próximo frame.
+        """
+        self.reference = None
+        self.last_process_time = None
+        self.last_changed_ratio = 0.0
+
+    def get_stats(self) -> dict:
+        """
+        Retorna os contadores do filtro.
+        """
+        skip_ratio = self.frames_skipped / self.frames_total if self.frames_total else 0.0
+        return {
+            'frames_total': self.frames_total,
+            'frames_processed': self.frames_processed,
+            'frames_skipped': self.frames_skipped,
+            'forced_rechecks': self.forced_rechecks,
+            'skip_ratio': round(skip_ratio, 3),
+            'last_changed_ratio': round(self.last_changed_ratio, 4)
+        }
+
+    def _prepare(self, frame: np.ndarray) -> np.ndarray:
+        # Reduz antes de converter para cinza: a conversão roda sobre poucos pixels
+        h, w = frame.shape[:2]
+        if w > self.downscale_width:
+            new_h = max(1, int(h * self.downscale_width / w))
+            frame = cv2.resize(frame, (self.downscale_width, new_h), interpolation=cv2.INTER_AREA)
+
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        # Suaviza para não reagir a ruído do sensor
+        return cv2.GaussianBlur(frame, (5, 5), 0)
+
+    def _accept(self, small: np.ndarray, now: float) -> bool:
+        self.reference = small
+        self.last_process_time = now
+        self.frames_processed += 1
+        return True
@@ -0,0 +1,263 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+from detections import empty_detections, from_mediapipe, nms
+
+
+# Estratégias aceitas por MultiScaleDetector:
+#   short     - modelo de curto alcance (< 2 m) no frame inteiro
+#   full      - modelo de longo alcance (até ~5 m) no frame inteiro
+#   tiled     - curto alcance no frame inteiro e em recortes sobrepostos
+#   scheduled - curto alcance em todo frame e longo alcance a cada N frames
+DETECTION_MODES = ('short', 'full', 'tiled', 'scheduled')
+
+SHORT_RANGE = 0
+FULL_RANGE = 1
+
+# Largura aproximada do frame reduzido usado para detectar movimento nos recortes
+MOTION_WIDTH = 240
+
+
+class MultiScaleDetector:
+    """
+    Detecção de faces em várias escalas com os modelos do MediaPipe.
+
+    O modelo de curto alcance reduz o frame para 128x128: faces pequenas
+    (distantes) somem. No modo 'tiled' ele também roda em recortes quadrados
+    sobrepostos, nos quais essas faces ocupam uma fração maior da entrada;
+    os recortes são processados em um pool de threads (um grafo por thread)
+    e apenas onde houve movimento — recortes parados reaproveitam as
+    detecções anteriores. No modo 'scheduled' o modelo de longo alcance
+    roda a cada `full_range_interval` frames e seu resultado é mantido nos
+    intermediários. As detecções das várias passadas são unidas por NMS.
+    """
+
+    def __init__(self,
+                 mode: str = 'short',
+                 min_detection_confidence: float = 0.5,
+                 tile_size: int = 480,
+                 tile_overlap: float = 0.25,
+                 full_range_interval: int = 5,
+                 workers: int = 1,
+                 motion_tiles: bool = True,
+                 tile_recheck_interval: float = 1.0,
+                 motion_threshold: int = 25,
+                 motion_min_ratio: float = 0.01,
+                 nms_threshold: float = 0.5):
+        """
+        Inicializa o detector.
+
+        Args:
+            mode: Estratégia (ver DETECTION_MODES)
+            min_detection_confidence: Confiança mínima de cada detecção
+            tile_size: Lado (px) dos recortes no modo 'tiled'
+            tile_overlap: Sobreposição relativa entre recortes vizinhos
+            full_range_interval: Frames entre execuções do longo alcance ('scheduled')
+            workers: Threads processando recortes (1 processa na thread chamadora)
+            motion_tiles: Se True, só processa recortes com movimento
+            tile_recheck_interval: Segundos máximos sem processar um recorte parado
+            motion_threshold: Diferença de intensidade (0-255) de um pixel alterado
+            motion_min_ratio: Fração de pixels alterados para haver movimento no recorte
+            nms_threshold: Interseção sobre a menor área acima da qual detecções se fundem
+        """
+        if mode not in DETECTION_MODES:
+            raise ValueError(f"Modo de detecção inválido: {mode}")
+
+        self.mode = mode
+        self.min_detection_confidence = min_detection_confidence
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.full_range_interval = max(1, full_range_interval)
+        self.workers = max(1, workers)
+        self.motion_tiles = motion_tiles
+        self.tile_recheck_interval = tile_recheck_interval
+        self.motion_threshold = motion_threshold
+        self.motion_min_ratio = motion_min_ratio
+        self.nms_threshold = nms_threshold
+
+        self._graphs = []
+        self._graphs_lock = threading.Lock()
+        self._local = threading.local()
+        self._short = self._create_graph(SHORT_RANGE) if mode != 'full' else None
+        self._full = self._create_graph(FULL_RANGE) if mode in ('full', 'scheduled') else None
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='detection-tile') \
+            if mode == 'tiled' and self.workers > 1 else None
+
+        self._layout_size = None
+        self._tiles: List[Tuple[int, int, int, int]] = []
+        # Por recorte: versão reduzida no último processamento e quando ocorreu
+        self._tile_references: List[Optional[np.ndarray]] = []
+        self._tile_times: List[float] = []
+        self._motion_factor = 1
+        self._tile_cache: List[np.ndarray] = []
+        self._held_full = None
+
+        self.frames = 0
+        self.tiles_processed = 0
+        self.tiles_skipped = 0
+        self.full_range_runs = 0
+        self.detections_merged = 0
+
+    def detect(self, rgb_image: np.ndarray, now: Optional[float] = None) -> np.ndarray:
+        """
+        Detecta faces em um frame RGB.
+
+        Returns:
+            Array detections.DETECTION_DTYPE (caixas e pontos em pixels do
+            frame), em ordem decrescente de confiança
+        """
+        if now is None:
+            now = time.time()
+        self.frames += 1
+        parts = []
+
+        if self._short is not None:
+            parts.append(self._run(self._short, rgb_image))
+
+        if self.mode == 'full':
+            parts.append(self._run(self._full, rgb_image))
+            self.full_range_runs += 1
+        elif self.mode == 'scheduled':
+            if self._held_full is None or self.frames % self.full_range_interval == 0:
+                self._held_full = self._run(self._full, rgb_image)
+                self.full_range_runs += 1
+            parts.append(self._held_full)
+        elif self.mode == 'tiled':
+            parts.extend(self._detect_tiles(rgb_image, now))
+
+        detections = np.concatenate(parts) if parts else empty_detections()
+        if len(parts) > 1:
+            keep = nms(detections['box'], detections['score'], self.nms_threshold, metric='iom')
+            self.detections_merged += len(detections) - len(keep)
+        else:
+            keep = np.argsort(-detections['score'], kind='stable')
+        return detections[keep]
+
+    def tile_layout(self, width: int, height: int) -> List[Tuple[int, int, int, int]]:
+        """
+        Recortes (x0, y0, x1, y1) que cobrem um frame com a sobreposição configurada.
+
+        Frames menores que um recorte não são divididos.
+        """
+        size = self.tile_size
+        if width <= size and height <= size:
+            return []
+
+        step = size * (1.0 - self.tile_overlap)
+
+        def starts(length):
+            if length <= size:
+                return [0]
+            count = int(np.ceil((length - size) / step)) + 1
+            return [int(round(v)) for v in np.linspace(0, length - size, count)]
+
+        return [(x0, y0, min(x0 + size, width), min(y0 + size, height))
+                for y0 in starts(height) for x0 in starts(width)]
+
+    def get_stats(self) -> dict:
+        """
+        Retorna contadores da detecção.
+        """
+        return {
+            'mode': self.mode,
+            'frames': self.frames,
+            'tiles': len(self._tiles),
+            'tiles_processed': self.tiles_processed,
+            'tiles_skipped': self.tiles_skipped,
+            'full_range_runs': self.full_range_runs,
+            'detections_merged': self.detections_merged,
+            'graphs': len(self._graphs)
+        }
+
+    def close(self):
+        """
+        Encerra o pool e libera todos os grafos do MediaPipe.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._graphs_lock:
+            graphs, self._graphs = self._graphs, []
+        for graph in graphs:
+            graph.close()
+
+    def _detect_tiles(self, rgb_image: np.ndarray, now: float) -> List[np.ndarray]:
+        height, width = rgb_image.shape[:2]
+        if self._layout_size != (width, height):
+            self._layout_size = (width, height)
+            self._tiles = self.tile_layout(width, height)
+            self._motion_factor = max(1, width // MOTION_WIDTH)
+            self._tile_references = [None] * len(self._tiles)
+            self._tile_times = [0.0] * len(self._tiles)
+            self._tile_cache = [empty_detections() for _ in self._tiles]
+
+        pending = []
+        small = self._motion_frame(rgb_image) if self.motion_tiles else None
+        factor = self._motion_factor
+        for index, (x0, y0, x1, y1) in enumerate(self._tiles):
+            if small is not None:
+                # Um único frame reduzido para todos os recortes (fator inteiro: redução rápida)
+                patch = small[y0 // factor:y1 // factor, x0 // factor:x1 // factor]
+                reference = self._tile_references[index]
+                if (reference is not None and now - self._tile_times[index] < self.tile_recheck_interval
+                        and np.count_nonzero(cv2.absdiff(patch, reference) > self.motion_threshold)
+                        < self.motion_min_ratio * patch.size):
+                    self.tiles_skipped += 1
+                    continue
+                self._tile_references[index] = patch.copy()
+                self._tile_times[index] = now
+            pending.append(index)
+
+        def detect_tile(index):
+            x0, y0, x1, y1 = self._tiles[index]
+            return self._run(self._thread_graph(), rgb_image[y0:y1, x0:x1], x0, y0)
+
+        if self._executor is not None and len(pending) > 1:
+            results = list(self._executor.map(detect_tile, pending))
+        else:
+            results = [detect_tile(index) for index in pending]
+
+        for index, result in zip(pending, results):
+            self._tile_cache[index] = result
+        self.tiles_processed += len(pending)
+        return list(self._tile_cache)
+
+    def _motion_frame(self, rgb_image: np.ndarray) -> np.ndarray:
+        height, width = rgb_image.shape[:2]
+        factor = self._motion_factor
+        small = cv2.resize(rgb_image, (width // factor, height // factor), interpolation=cv2.INTER_AREA)
+        # Suaviza para não reagir a ruído do sensor
+        return cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_RGB2GRAY), (5, 5), 0)
+
+    def _run(self, graph, rgb_region: np.ndarray, offset_x: int = 0, offset_y: int = 0):
+        height, width = rgb_region.shape[:2]
+        results = graph.process(np.ascontiguousarray(rgb_region))
+        return from_mediapipe(results.detections, width, height, offset_x, offset_y)
+
+    def _thread_graph(self):
+        # Sem pool os recortes rodam na thread chamadora, que muda a cada
+        # início de um estágio em thread própria: reutiliza o grafo do frame
+        # inteiro em vez de abrir um novo a cada thread
+        if self._executor is None:
+            return self._short
+        # Cada thread do pool usa o seu grafo (os grafos não são thread-safe)
+        graph = getattr(self._local, 'graph', None)
+        if graph is None:
+            graph = self._create_graph(SHORT_RANGE)
+            self._local.graph = graph
+        return graph
+
+    def _create_graph(self, model_selection: int):
+        graph = mp.solutions.face_detection.FaceDetection(
+            model_selection=model_selection,
+            min_detection_confidence=self.min_detection_confidence
+        )
+        with self._graphs_lock:
+            self._graphs.append(graph)
+        return graph
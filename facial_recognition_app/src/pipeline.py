@@ -0,0 +1,889 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+try:
+    import yaml
+except ImportError:  # Dependência opcional
+    yaml = None
+
+
+# Posicionamento de cada estágio:
+#   inline - na thread do estágio anterior
+#   thread - em uma thread própria, alimentada por uma fila
+PLACEMENTS = ('inline', 'thread')
+
+# O que fazer quando a fila de um estágio em thread própria está cheia:
+#   block       - o estágio anterior espera (nenhum frame é perdido)
+#   drop_oldest - descarta o frame mais antigo da fila
+#   drop_newest - descarta o frame que está chegando
+#   keep_new_tracks - descarta primeiro os frames que só continuam trilhas
+#                     existentes, preservando os que trazem trilhas novas
+#                     (só depois de um estágio 'track')
+DROP_POLICIES = ('block', 'drop_oldest', 'drop_newest', 'keep_new_tracks')
+
+# Estados reportados por OverloadController:
+#   normal     - o pipeline acompanha a fonte com todos os estágios
+#   shedding   - acompanha, com estágios opcionais degradados
+#   overloaded - não acompanha (latência, descartes ou frames perdidos na câmera)
+OVERLOAD_STATES = ('normal', 'shedding', 'overloaded')
+
+# Pipelines padrão de cada ponto de entrada (mesmo fluxo dos laços originais;
+# a API não desenha o frame, pois só publica as faces). Na GUI a inferência
+# roda fora da thread da interface, que nunca espera por ela: se a detecção
+# atrasar, o frame mais antigo aguardando é descartado
+DEFAULT_PIPELINES = {
+    'api': [
+        {'type': 'source'},
+        {'type': 'motion_gate'},
+        {'type': 'detect'},
+        {'type': 'track'},
+        {'type': 'record'},
+        {'type': 'encode'},
+        {'type': 'identify'},
+        {'type': 'fuse'},
+        {'type': 'publish'}
+    ],
+    'gui': [
+        {'type': 'source'},
+        {'type': 'detect', 'placement': 'thread', 'queue_size': 1, 'drop': 'drop_oldest'},
+        {'type': 'track'},
+        {'type': 'render'},
+        {'type': 'publish'}
+    ]
+}
+
+
+class PipelineFrame:
+    """
+    Frame capturado e os resultados acumulados pelos estágios.
+    """
+
+    def __init__(self, frame, timestamp: float, sequence: int):
+        self.frame = frame
+        self.timestamp = timestamp
+        self.sequence = sequence
+        # Frame descartado pelo filtro de movimento: não é analisado
+        self.gated = False
+        # None enquanto o frame não for analisado (o resultado anterior continua valendo)
+        self.faces_info: Optional[List[dict]] = None
+        self.mesh_landmarks = None
+        self.ended_tracks: List[int] = []
+        # Trilhas iniciadas neste frame (política keep_new_tracks)
+        self.new_tracks: List[int] = []
+        # Pares (BestShot, codificação) prontos para identificação
+        self.shots = []
+        self.annotated = None
+        # False quando o resultado não deve ir aos ouvintes (streaming degradado)
+        self.stream = True
+
+
+class Stage:
+    """
+    Estágio do pipeline.
+
+    Os objetos usados pelos estágios (câmera, detector, gravador...) vêm do
+    dicionário de serviços montado pelo ponto de entrada; `requires` lista
+    os obrigatórios, os demais são opcionais e o estágio apenas repassa o
+    frame se não existirem.
+
+    Estágios com `shed_feature` podem operar degradados sob sobrecarga
+    (`shedding`, controlado por OverloadController): a funcionalidade
+    indicada deixa de rodar e o restante do frame segue normalmente.
+    `shed_priority` define a ordem (menor primeiro; 0 nunca degrada).
+    `consumes` lista as funcionalidades de estágios anteriores das quais o
+    estágio depende: elas só são degradadas depois dele (e nunca, se ele
+    não puder ser degradado).
+    """
+
+    type_name = ''
+    requires = ()
+    shed_feature = None
+    default_shed_priority = 0
+    consumes = ()
+
+    def __init__(self, services: dict, name: Optional[str] = None,
+                 shed_priority: Optional[int] = None, **options):
+        if options:
+            raise ValueError(f"Opções desconhecidas no estágio '{self.type_name}': {', '.join(options)}")
+        for service in self.requires:
+            if services.get(service) is None:
+                raise ValueError(f"O estágio '{self.type_name}' requer o serviço '{service}'")
+        if shed_priority and self.shed_feature is None:
+            raise ValueError(f"O estágio '{self.type_name}' não pode ser degradado (shed_priority)")
+        self.services = services
+        self.name = name or self.type_name
+        self.shed_priority = self.default_shed_priority if shed_priority is None else int(shed_priority)
+        self.shedding = False
+        self.processed = 0
+        self.stopped = 0
+        self.shed_frames = 0
+        self.avg_ms = 0.0
+
+    def process(self, item: PipelineFrame) -> bool:
+        """
+        Processa o frame.
+
+        Returns:
+            False para interromper o frame neste estágio
+        """
+        return True
+
+    def close(self):
+        """
+        Libera recursos do estágio.
+        """
+
+    def _record(self, elapsed_ms: float):
+        # Média móvel exponencial (a primeira amostra inicializa a média)
+        self.avg_ms = elapsed_ms if self.processed == 0 else 0.9 * self.avg_ms + 0.1 * elapsed_ms
+        self.processed += 1
+        if self.shedding:
+            self.shed_frames += 1
+
+
+class SourceStage(Stage):
+    """
+    Lê o frame mais recente da câmera.
+    """
+
+    type_name = 'source'
+    requires = ('camera',)
+
+    def __init__(self, services: dict, **options):
+        super().__init__(services, **options)
+        self._sequence = 0
+
+    def read(self) -> Optional[PipelineFrame]:
+        camera = self.services['camera']
+        started = time.perf_counter()
+        ret, frame = camera.read_frame()
+        if not ret or frame is None:
+            return None
+        self._record((time.perf_counter() - started) * 1000.0)
+        self._sequence += 1
+        # Instante da captura do frame, não o do fim do processamento
+        return PipelineFrame(frame, camera.last_frame_time or time.time(), self._sequence)
+
+    def skipped(self) -> int:
+        """
+        Frames capturados pela câmera que nunca chegaram ao pipeline.
+        """
+        return getattr(self.services['camera'], 'frames_skipped', 0)
+
+
+class MotionGateStage(Stage):
+    """
+    Marca frames de cena estática para não serem analisados.
+    """
+
+    type_name = 'motion_gate'
+
+    def process(self, item: PipelineFrame) -> bool:
+        gate = self.services.get('motion_gate')
+        item.gated = gate is not None and not gate.should_process(item.frame)
+        return True
+
+
+class DetectStage(Stage):
+    """
+    Detecta as faces e associa os landmarks (FaceDetector.analyze).
+
+    Degradado, não roda o FaceMesh: as faces ficam sem landmarks.
+    """
+
+    type_name = 'detect'
+    requires = ('detector',)
+    shed_feature = 'mesh'
+    default_shed_priority = 1
+
+    def process(self, item: PipelineFrame) -> bool:
+        if not item.gated:
+            item.faces_info, item.mesh_landmarks = self.services['detector'].analyze(
+                item.frame, landmarks=not self.shedding)
+        return True
+
+
+class TrackStage(Stage):
+    """
+    Mantém IDs estáveis entre frames com o rastreador do detector.
+    """
+
+    type_name = 'track'
+    requires = ('detector',)
+
+    def process(self, item: PipelineFrame) -> bool:
+        tracker = self.services['detector'].tracker
+        if item.faces_info is not None and tracker is not None:
+            known = set(tracker.tracks)
+            tracker.update(item.faces_info)
+            item.ended_tracks = tracker.ended_tracks
+            item.new_tracks = [track_id for track_id in tracker.tracks if track_id not in known]
+        return True
+
+
+class EncodeStage(Stage):
+    """
+    Codifica apenas a melhor captura de cada trilha.
+
+    Degradado, não avalia nem codifica capturas; apenas fecha as janelas
+    das trilhas encerradas, para o seletor não acumular candidatos.
+    """
+
+    type_name = 'encode'
+    requires = ('detector', 'best_shot')
+    shed_feature = 'encoding'
+    default_shed_priority = 2
+    # Sem os landmarks da malha, encode_face não codifica nada
+    consumes = ('mesh',)
+
+    def process(self, item: PipelineFrame) -> bool:
+        if self.shedding:
+            if item.ended_tracks:
+                self.services['best_shot'].update(item.frame, [], item.ended_tracks)
+            return True
+        if item.faces_info is None:
+            return True
+        encoder = self.services['detector'].encoder
+        for shot in self.services['best_shot'].update(item.frame, item.faces_info, item.ended_tracks):
+            # Capturas sem landmarks não são codificadas
+            encoding = encoder.encode_face(shot.crop, shot.face_info)
+            if encoding is not None:
+                item.shots.append((shot, encoding))
+        return True
+
+
+class IdentifyStage(Stage):
+    """
+    Resolve a identidade das trilhas pelo cache e a anexa às faces.
+    """
+
+    type_name = 'identify'
+    requires = ('identity_cache',)
+
+    def process(self, item: PipelineFrame) -> bool:
+        if item.faces_info is None:
+            return True
+        cache = self.services['identity_cache']
+        # A galeria só é consultada se a trilha for nova, vencida ou mudou de aparência
+        for shot, encoding in item.shots:
+            cache.resolve(shot.track_id, encoding)
+        cache.evict(item.ended_tracks)
+
+        # Identidade das trilhas já identificadas, sem consultar a galeria
+        for face in item.faces_info:
+            entry = cache.get(face['track_id']) if 'track_id' in face else None
+            if entry is not None and entry.identity is not None:
+                face['identity'] = entry.identity
+        return True
+
+
+class RenderStage(Stage):
+    """
+    Desenha as detecções (ou anonimiza as faces) em uma cópia do frame.
+
+    Degradado, desenha apenas caixas e IDs (a malha é a parte cara).
+    A anonimização nunca é degradada.
+    """
+
+    type_name = 'render'
+    requires = ('detector',)
+    shed_feature = 'rendering'
+    default_shed_priority = 3
+
+    def process(self, item: PipelineFrame) -> bool:
+        if item.faces_info is not None:
+            mesh_landmarks = None if self.shedding else item.mesh_landmarks
+            item.annotated = self.services['detector'].annotate(item.frame, item.faces_info, mesh_landmarks)
+        return True
+
+
+class FuseStage(Stage):
+    """
+    Entrega as trilhas desta câmera à fusão entre câmeras (serviço 'fusion').
+
+    Trilhas com captura codificada no frame seguem com a codificação; as
+    demais apenas continuam presentes. A câmera é a opção `camera_id` ou o
+    serviço 'camera_id'. Sem o serviço 'fusion', não faz nada.
+    """
+
+    type_name = 'fuse'
+
+    def __init__(self, services: dict, camera_id: Optional[str] = None, **options):
+        super().__init__(services, **options)
+        self.camera_id = str(camera_id or services.get('camera_id') or 'local')
+        self.errors = 0
+
+    def process(self, item: PipelineFrame) -> bool:
+        fusion = self.services.get('fusion')
+        if fusion is None or item.faces_info is None:
+            return True
+        encodings = {shot.track_id: encoding for shot, encoding in item.shots}
+        tracks = [(face['track_id'], encodings.get(face['track_id']))
+                  for face in item.faces_info if 'track_id' in face]
+        try:
+            global_ids = fusion.update(self.camera_id, tracks, item.ended_tracks, item.timestamp)
+        except ValueError as e:
+            # A fusão é opcional: uma codificação recusada não interrompe a detecção
+            self.errors += 1
+            if self.errors == 1:
+                print(f"Erro na fusão entre câmeras: {e}")
+            return True
+        for face in item.faces_info:
+            if face.get('track_id') in global_ids:
+                face['global_id'] = global_ids[face['track_id']]
+        return True
+
+
+class RecordStage(Stage):
+    """
+    Entrega o frame ao gravador de clipes (apenas a referência).
+    """
+
+    type_name = 'record'
+
+    def process(self, item: PipelineFrame) -> bool:
+        recorder = self.services.get('clip_recorder')
+        if recorder is not None:
+            recorder.submit(item.frame, item.timestamp, item.faces_info)
+        return True
+
+
+class PublishStage(Stage):
+    """
+    Entrega o resultado ao ponto de entrada (função 'publish' dos serviços).
+
+    Degradado, marca para os consumidores de streaming (SSE, eventos) no
+    máximo um frame a cada `stream_interval` segundos (item.stream); o
+    resultado consultado pela API e a análise de presença continuam sendo
+    atualizados a cada frame.
+    """
+
+    type_name = 'publish'
+    requires = ('publish',)
+    shed_feature = 'streaming'
+    default_shed_priority = 4
+
+    def __init__(self, services: dict, stream_interval: float = 0.5, **options):
+        super().__init__(services, **options)
+        self.stream_interval = float(stream_interval)
+        self._last_stream = None
+
+    def process(self, item: PipelineFrame) -> bool:
+        if self.shedding and item.faces_info is not None:
+            now = time.monotonic()
+            item.stream = self._last_stream is None or now - self._last_stream >= self.stream_interval
+            if item.stream:
+                self._last_stream = now
+        self.services['publish'](item)
+        return True
+
+
+STAGE_TYPES = {
+    stage.type_name: stage
+    for stage in (SourceStage, MotionGateStage, DetectStage, TrackStage, EncodeStage,
+                  IdentifyStage, FuseStage, RenderStage, RecordStage, PublishStage)
+}
+
+
+class OverloadController:
+    """
+    Detecta sobrecarga do pipeline e degrada os estágios opcionais por prioridade.
+
+    A cada `evaluate_interval` segundos são avaliados os sinais: latência
+    (da captura ao fim do último estágio, em média móvel) acima de
+    `max_latency`, frames descartados pelas filas e, apenas se
+    `max_skip_ratio` for informado, frames da câmera que nunca chegaram ao
+    pipeline (a captura do frame mais recente os pula por projeto sempre
+    que a inferência é mais lenta que a câmera, então isso não é, por si
+    só, sobrecarga). Sob pressão, o próximo estágio opcional (menor
+    shed_priority) passa a operar degradado; uma funcionalidade consumida
+    por outro estágio (Stage.consumes, ex.: a malha usada pela codificação)
+    só é degradada depois dele; após cada mudança, uma avaliação é pulada para que a
+    seguinte só meça frames já processados no novo nível. Depois de `recovery_time` segundos
+    com folga (latência abaixo da metade do limite, sem descartes), o
+    último estágio degradado é restaurado; uma recaída logo após a
+    restauração dobra essa espera (até `max_recovery_time`), o que evita
+    oscilar entre os dois estados.
+    """
+
+    def __init__(self,
+                 stages: List[Stage],
+                 max_latency: float = 0.5,
+                 evaluate_interval: float = 0.5,
+                 recovery_time: float = 5.0,
+                 max_recovery_time: float = 60.0,
+                 max_skip_ratio: Optional[float] = None,
+                 shedding: bool = True):
+        """
+        Inicializa o controlador.
+
+        Args:
+            stages: Estágios do pipeline (apenas os com shed_priority > 0 são degradados)
+            max_latency: Latência máxima (s) entre a captura e o fim do processamento
+            evaluate_interval: Segundos entre avaliações
+            recovery_time: Segundos com folga antes de restaurar um estágio
+            max_recovery_time: Limite da espera após recaídas sucessivas
+            max_skip_ratio: Fração tolerada de frames da câmera não processados
+                            (None: frames pulados não indicam sobrecarga)
+            shedding: Se False, apenas reporta o estado (nenhum estágio é degradado)
+        """
+        self.max_latency = max_latency
+        self.evaluate_interval = evaluate_interval
+        self.recovery_time = recovery_time
+        self.max_recovery_time = max_recovery_time
+        self.max_skip_ratio = max_skip_ratio
+        self.shedding = shedding
+        self._sheddable, self.protected = _shed_order(stages)
+
+        self.level = 0
+        self.overloaded = False
+        self.latency = None
+        self.skip_ratio = 0.0
+        self._counters = None
+        self._last_evaluation = None
+        self._calm_since = None
+        self._restored_at = None
+        self._recovery_wait = recovery_time
+        self._settling = False
+
+        self.shed_events = 0
+        self.restore_events = 0
+        self.overloaded_evaluations = 0
+
+    @property
+    def state(self) -> str:
+        if self.overloaded:
+            return 'overloaded'
+        return 'shedding' if self.level > 0 else 'normal'
+
+    def observe_latency(self, latency: float):
+        """
+        Registra a latência de um frame que completou o pipeline.
+        """
+        self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+
+    def evaluate(self, now: float, frames: int, dropped: int, skipped: int):
+        """
+        Avalia os sinais desde a última avaliação e degrada ou restaura um estágio.
+
+        Args:
+            now: Instante atual (time.monotonic)
+            frames: Frames lidos da fonte (total)
+            dropped: Frames descartados pelas filas (total)
+            skipped: Frames da câmera que não chegaram ao pipeline (total)
+        """
+        if self._last_evaluation is None:
+            self._last_evaluation, self._counters = now, (frames, dropped, skipped)
+            return
+        if now - self._last_evaluation < self.evaluate_interval:
+            return
+
+        new_frames, new_dropped, new_skipped = (current - previous for current, previous
+                                                in zip((frames, dropped, skipped), self._counters))
+        self._last_evaluation, self._counters = now, (frames, dropped, skipped)
+        if self._settling:
+            self._settling = False
+            return
+        self.skip_ratio = new_skipped / float(new_skipped + new_frames) if new_skipped + new_frames else 0.0
+        latency = self.latency or 0.0
+
+        skip_limit = self.max_skip_ratio
+        self.overloaded = (latency > self.max_latency or new_dropped > 0
+                           or (skip_limit is not None and self.skip_ratio > skip_limit))
+        if self.overloaded:
+            self.overloaded_evaluations += 1
+            self._calm_since = None
+            if self._restored_at is not None and now - self._restored_at < self._recovery_wait:
+                # Recaída logo após restaurar: espera mais antes da próxima tentativa
+                self._recovery_wait = min(self._recovery_wait * 2, self.max_recovery_time)
+            self._restored_at = None
+            if self.shedding and self.level < len(self._sheddable):
+                stage = self._sheddable[self.level]
+                stage.shedding = True
+                self.level += 1
+                self.shed_events += 1
+                self._settling = True
+                print(f"Pipeline sobrecarregado: degradando '{stage.shed_feature}' "
+                      f"(latência {latency * 1000.0:.0f} ms)")
+            return
+
+        calm = latency < self.max_latency / 2 and (skip_limit is None or self.skip_ratio <= skip_limit / 2)
+        if not calm:
+            self._calm_since = None
+            return
+        if self.level == 0:
+            self._recovery_wait = self.recovery_time
+            return
+        if self._calm_since is None:
+            self._calm_since = now
+        elif now - self._calm_since >= self._recovery_wait:
+            self.level -= 1
+            stage = self._sheddable[self.level]
+            stage.shedding = False
+            self.restore_events += 1
+            self._settling = True
+            print(f"Pipeline com folga: restaurando '{stage.shed_feature}'")
+            self._calm_since = now
+            self._restored_at = now
+
+    def get_stats(self) -> dict:
+        """
+        Retorna o estado de sobrecarga e os estágios degradados.
+        """
+        return {
+            'state': self.state,
+            'shedding_enabled': self.shedding,
+            'level': self.level,
+            'shed': [stage.shed_feature for stage in self._sheddable[:self.level]],
+            'sheddable': [stage.shed_feature for stage in self._sheddable],
+            'protected': self.protected,
+            'latency_ms': round(self.latency * 1000.0, 1) if self.latency is not None else None,
+            'max_latency_ms': round(self.max_latency * 1000.0, 1),
+            'skip_ratio': round(self.skip_ratio, 3),
+            'recovery_time': self._recovery_wait,
+            'shed_events': self.shed_events,
+            'restore_events': self.restore_events,
+            'overloaded_evaluations': self.overloaded_evaluations
+        }
+
+
+def _shed_order(stages: List[Stage]):
+    """
+    Ordem de degradação: prioridade, com cada funcionalidade depois dos
+    estágios que a consomem.
+
+    Returns:
+        Tuple (estágios degradáveis em ordem, funcionalidades protegidas por
+        um consumidor que não pode ser degradado)
+    """
+    consumers = {}
+    for stage in stages:
+        for feature in stage.consumes:
+            consumers.setdefault(feature, []).append(stage)
+
+    def rank(stage, visiting=()):
+        # (prioridade efetiva, profundidade); None se nunca puder ser degradado
+        if not (stage.shed_feature and stage.shed_priority > 0) or stage in visiting:
+            return None
+        priority, depth = stage.shed_priority, 0
+        for consumer in consumers.get(stage.shed_feature, []):
+            if consumer is stage:
+                continue
+            consumer_rank = rank(consumer, visiting + (stage,))
+            if consumer_rank is None:
+                return None
+            priority, depth = max(priority, consumer_rank[0]), max(depth, consumer_rank[1] + 1)
+        return priority, depth
+
+    ranked, protected = [], []
+    for stage in stages:
+        if stage.shed_feature and stage.shed_priority > 0:
+            key = rank(stage)
+            if key is None:
+                protected.append(stage.shed_feature)
+            else:
+                ranked.append((key, stage))
+    ranked.sort(key=lambda pair: pair[0])
+    return [stage for _, stage in ranked], protected
+
+
+class _Segment:
+    """
+    Estágios executados em sequência na mesma thread, com a fila de entrada.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 0, drop: str = 'block'):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.drop = drop
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.dropped = 0
+
+
+class Pipeline:
+    """
+    Executa os estágios configurados sobre os frames da fonte.
+
+    Estágios 'inline' rodam na thread do estágio anterior; cada estágio
+    'thread' inicia um segmento com fila e thread próprias. step() lê um
+    frame e executa o primeiro segmento na thread chamadora, de modo que o
+    ponto de entrada (laço da API, timer da GUI) continua controlando o
+    ritmo da captura.
+
+    As filas aplicam a política de descarte de cada estágio; um frame
+    descartado entrega as suas trilhas encerradas ao frame vizinho, para
+    que seletor de capturas e cache de identidade não percam o encerramento.
+    O OverloadController degrada os estágios opcionais quando o pipeline
+    não acompanha a fonte.
+    """
+
+    def __init__(self, source: SourceStage, segments: List[_Segment],
+                 overload: Optional[OverloadController] = None):
+        self.source = source
+        self._segments = segments
+        self._running = False
+        self.frames = 0
+        self.overload = overload or OverloadController(self.stages)
+
+    @property
+    def stages(self) -> List[Stage]:
+        return [stage for segment in self._segments for stage in segment.stages]
+
+    def start(self):
+        """
+        Inicia as threads dos segmentos.
+        """
+        if self._running:
+            return
+        self._running = True
+        for index, segment in enumerate(self._segments[1:], start=1):
+            segment.thread = threading.Thread(target=self._worker, args=(index,), daemon=True,
+                                              name=f'pipeline-{segment.stages[0].name}')
+            segment.thread.start()
+
+    def stop(self):
+        """
+        Encerra as threads (frames ainda nas filas são descartados) e fecha os estágios.
+        """
+        self._running = False
+        for segment in self._segments[1:]:
+            with segment.condition:
+                segment.queue.clear()
+                segment.condition.notify_all()
+            if segment.thread is not None:
+                segment.thread.join(timeout=2.0)
+                segment.thread = None
+        for stage in [self.source] + self.stages:
+            stage.close()
+
+    def step(self) -> bool:
+        """
+        Lê um frame e o processa no primeiro segmento (na thread chamadora).
+
+        Returns:
+            True se um frame foi lido
+        """
+        item = self.source.read()
+        if item is None:
+            return False
+        self.frames += 1
+        self._run_segment(0, item)
+        self.overload.evaluate(time.monotonic(), self.frames,
+                               sum(segment.dropped for segment in self._segments), self.source.skipped())
+        return True
+
+    def get_stats(self) -> dict:
+        """
+        Retorna o tempo médio e as contagens de cada estágio.
+        """
+        stages = [self._stage_stats(self.source, 'inline', None)]
+        for index, segment in enumerate(self._segments):
+            for position, stage in enumerate(segment.stages):
+                queue = segment if index > 0 and position == 0 else None
+                stages.append(self._stage_stats(stage, 'thread' if queue else 'inline', queue))
+        return {'frames': self.frames, 'stages': stages, 'overload': self.overload.get_stats()}
+
+    def _run_segment(self, index: int, item: PipelineFrame):
+        segment = self._segments[index]
+        for stage in segment.stages:
+            started = time.perf_counter()
+            keep = stage.process(item)
+            stage._record((time.perf_counter() - started) * 1000.0)
+            if not keep:
+                stage.stopped += 1
+                return
+        if index + 1 < len(self._segments):
+            self._put(self._segments[index + 1], item)
+        else:
+            self.overload.observe_latency(time.time() - item.timestamp)
+
+    def _put(self, segment: _Segment, item: PipelineFrame):
+        with segment.condition:
+            queue = segment.queue
+            if len(queue) >= segment.queue_size:
+                if segment.drop == 'keep_new_tracks':
+                    # O frame mais antigo que só continua trilhas; o que chega, se só ele continua
+                    victim = next((i for i, queued in enumerate(queue) if not queued.new_tracks), None)
+                    if victim is None and not item.new_tracks:
+                        victim = len(queue)
+                    elif victim is None:
+                        victim = 0
+                else:
+                    victim = {'drop_oldest': 0, 'drop_newest': len(queue)}.get(segment.drop)
+
+                if victim is not None:
+                    segment.dropped += 1
+                    if victim == len(queue):
+                        self._carry_over(item, queue[-1])
+                        return
+                    dropped = queue[victim]
+                    del queue[victim]
+                    self._carry_over(dropped, queue[victim] if victim < len(queue) else item)
+                else:
+                    while len(segment.queue) >= segment.queue_size and self._running:
+                        segment.condition.wait(0.1)
+                    if not self._running:
+                        return
+            queue.append(item)
+            segment.condition.notify_all()
+
+    @staticmethod
+    def _carry_over(dropped: PipelineFrame, target: PipelineFrame):
+        # Sem isso o seletor de capturas e o cache manteriam trilhas já encerradas
+        if dropped.ended_tracks:
+            target.ended_tracks = list(dropped.ended_tracks) + [
+                track_id for track_id in target.ended_tracks if track_id not in dropped.ended_tracks]
+
+    def _worker(self, index: int):
+        segment = self._segments[index]
+        while True:
+            with segment.condition:
+                while not segment.queue and self._running:
+                    segment.condition.wait(0.5)
+                if not self._running:
+                    return
+                item = segment.queue.popleft()
+                segment.condition.notify_all()
+            try:
+                self._run_segment(index, item)
+            except Exception as e:
+                print(f"Erro no estágio '{segment.stages[0].name}' do pipeline: {e}")
+
+    @staticmethod
+    def _stage_stats(stage: Stage, placement: str, segment: Optional[_Segment]) -> dict:
+        stats = {
+            'name': stage.name,
+            'type': stage.type_name,
+            'placement': placement,
+            'processed': stage.processed,
+            'stopped': stage.stopped,
+            'avg_ms': round(stage.avg_ms, 3)
+        }
+        if stage.shed_feature and stage.shed_priority > 0:
+            stats['shed_feature'] = stage.shed_feature
+            stats['shed_priority'] = stage.shed_priority
+            stats['shedding'] = stage.shedding
+            stats['shed_frames'] = stage.shed_frames
+        if isinstance(stage, FuseStage):
+            stats['errors'] = stage.errors
+        if segment is not None:
+            stats['queue'] = len(segment.queue)
+            stats['queue_size'] = segment.queue_size
+            stats['drop'] = segment.drop
+            stats['dropped'] = segment.dropped
+        return stats
+
+
+def build_pipeline(stages_config: List[dict], services: Dict[str, object],
+                   overload: Optional[dict] = None) -> Pipeline:
+    """
+    Monta o pipeline a partir da lista de estágios.
+
+    Cada estágio é um dicionário com 'type' (ver STAGE_TYPES) e,
+    opcionalmente, 'name', 'placement' (ver PLACEMENTS), 'shed_priority'
+    (ordem de degradação sob sobrecarga; 0 nunca degrada) e, para estágios
+    em thread própria, 'queue_size' e 'drop' (ver DROP_POLICIES). O
+    primeiro estágio deve ser 'source'.
+
+    Args:
+        stages_config: Estágios na ordem de execução
+        services: Objetos usados pelos estágios ('camera', 'detector',
+                  'motion_gate', 'best_shot', 'identity_cache',
+                  'clip_recorder', 'fusion', 'camera_id', 'publish')
+        overload: Opções do OverloadController (ex.: max_latency, shedding)
+
+    Returns:
+        Pipeline ainda não iniciado
+    """
+    if not stages_config or stages_config[0].get('type') != 'source':
+        raise ValueError("O primeiro estágio do pipeline deve ser 'source'")
+
+    source_options = {k: v for k, v in stages_config[0].items() if k != 'type'}
+    source = SourceStage(services, **source_options)
+
+    segments = [_Segment([])]
+    for spec in stages_config[1:]:
+        options = dict(spec)
+        kind = options.pop('type', None)
+        stage_class = STAGE_TYPES.get(kind)
+        if stage_class is None or stage_class is SourceStage:
+            raise ValueError(f"Estágio de pipeline inválido: {kind}")
+
+        placement = options.pop('placement', 'inline')
+        queue_size = int(options.pop('queue_size', 2))
+        drop = options.pop('drop', 'drop_oldest')
+        if placement not in PLACEMENTS:
+            raise ValueError(f"Posicionamento inválido no estágio '{kind}': {placement}")
+        if drop not in DROP_POLICIES:
+            raise ValueError(f"Política de descarte inválida no estágio '{kind}': {drop}")
+        # A fila fica antes do estágio: só conhece as trilhas novas se 'track' já rodou
+        if placement == 'thread' and drop == 'keep_new_tracks' and not any(
+                isinstance(previous, TrackStage) for segment in segments for previous in segment.stages):
+            raise ValueError(f"A política 'keep_new_tracks' no estágio '{kind}' requer um estágio "
+                             f"'track' antes dele")
+
+        stage = stage_class(services, **options)
+        if placement == 'thread':
+            segments.append(_Segment([stage], max(1, queue_size), drop))
+        else:
+            segments[-1].stages.append(stage)
+
+    stages = [stage for segment in segments for stage in segment.stages]
+    return Pipeline(source, segments, OverloadController(stages, **(overload or {})))
+
+
+def load_pipeline_config(path: str, entry_point: Optional[str] = None) -> List[dict]:
+    """
+    Lê os estágios de um arquivo TOML, YAML ou JSON.
+
+    O arquivo define a lista 'stages' ou uma seção por ponto de entrada
+    ('api', 'gui'), cada uma com a sua lista 'stages'. Exemplo (TOML):
+
+        [[api.stages]]
+        type = "source"
+
+        [[api.stages]]
+        type = "detect"
+        placement = "thread"
+        queue_size = 1
+        drop = "drop_oldest"
+
+    Args:
+        path: Caminho do arquivo (.toml, .yaml/.yml ou .json)
+        entry_point: Seção usada, se existir no arquivo
+
+    Returns:
+        Lista de estágios para build_pipeline
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, 'rb') as f:
+        content = f.read()
+
+    if extension == '.toml':
+        if tomllib is None:
+            raise RuntimeError("Leitura de TOML requer Python 3.11 ou superior")
+        data = tomllib.loads(content.decode('utf-8'))
+    elif extension in ('.yaml', '.yml'):
+        if yaml is None:
+            raise RuntimeError("PyYAML não está instalado")
+        data = yaml.safe_load(content)
+    else:
+        data = json.loads(content)
+
+    if isinstance(data, dict) and entry_point is not None and isinstance(data.get(entry_point), dict):
+        data = data[entry_point]
+    stages = data.get('stages') if isinstance(data, dict) else None
+    if not isinstance(stages, list):
+        raise ValueError(f"Configuração de pipeline sem lista 'stages': {path}")
+    return stages
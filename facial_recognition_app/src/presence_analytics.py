@@ -0,0 +1,505 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import List, Optional
+
+import numpy as np
+
+
+# Métricas somáveis de cada intervalo (janelas respondidas por diferença de somas acumuladas)
+SUM_FIELDS = ('frames', 'face_sum', 'person_seconds', 'occupied_seconds',
+              'observed_seconds', 'entries', 'exits', 'dwell_sum')
+# Métricas de máximo de cada intervalo (janelas respondidas pela árvore de máximos)
+MAX_FIELDS = ('peak_faces', 'max_dwell')
+
+_SUM = {name: i for i, name in enumerate(SUM_FIELDS)}
+_MAX = {name: i for i, name in enumerate(MAX_FIELDS)}
+
+
+class MaxTree:
+    """
+    Árvore de segmentos de máximos sobre as posições de um buffer circular.
+
+    Atualização pontual e consulta de intervalo em O(log n).
+    """
+
+    def __init__(self, capacity: int, columns: int):
+        self.size = 1 << max(0, capacity - 1).bit_length()
+        self.tree = np.zeros((2 * self.size, columns), dtype=np.float32)
+
+    def update(self, position: int, values: np.ndarray):
+        i = position + self.size
+        self.tree[i] = values
+        i >>= 1
+        while i:
+            np.maximum(self.tree[2 * i], self.tree[2 * i + 1], out=self.tree[i])
+            i >>= 1
+
+    def rebuild(self, leaves: np.ndarray):
+        """
+        Reconstrói a árvore inteira a partir das folhas (um nível por vez).
+        """
+        self.tree[self.size:self.size + len(leaves)] = leaves
+        self.tree[self.size + len(leaves):] = 0
+        start = self.size
+        while start > 1:
+            half = start // 2
+            np.maximum(self.tree[start:2 * start:2], self.tree[start + 1:2 * start:2],
+                       out=self.tree[half:start])
+            start = half
+
+    def query(self, start: int, end: int) -> np.ndarray:
+        """
+        Máximo de cada coluna nas posições [start, end).
+        """
+        result = np.zeros(self.tree.shape[1], dtype=np.float32)
+        lo, hi = start + self.size, end + self.size
+        while lo < hi:
+            if lo & 1:
+                np.maximum(result, self.tree[lo], out=result)
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                np.maximum(result, self.tree[hi], out=result)
+            lo >>= 1
+            hi >>= 1
+        return result
+
+
+class PresenceAnalytics:
+    """
+    Série temporal de presença calculada a partir dos resultados de detecção.
+
+    Cada resultado atualiza, de forma incremental, o intervalo atual de um
+    buffer circular (por padrão 1 s por intervalo, 24 h no total):
+    quantidade de frames, ocupação ponderada pelo tempo, pico de faces,
+    entradas/saídas de trilhas e permanência das trilhas encerradas.
+
+    Os intervalos guardam também as somas acumuladas até eles, de modo que
+    uma janela qualquer é respondida em O(1) pela diferença entre duas somas;
+    os picos vêm de uma árvore de máximos em O(log n). O histórico é gravado
+    periodicamente em .npz compactado e recarregado na inicialização.
+    """
+
+    def __init__(self,
+                 retention: float = 86400.0,
+                 resolution: float = 1.0,
+                 max_gap: float = 3.0,
+                 exit_grace: float = 1.0,
+                 path: Optional[str] = None,
+                 persist_interval: float = 60.0,
+                 event_history: int = 1000):
+        """
+        Inicializa a série.
+
+        Args:
+            retention: Segundos de histórico mantidos em memória
+            resolution: Duração de cada intervalo em segundos
+            max_gap: Maior intervalo (s) entre resultados considerado contínuo;
+                     acima disso o tempo não é contado como observado
+            exit_grace: Segundos sem ver uma trilha até registrar sua saída
+            path: Arquivo .npz para persistência (None desativa)
+            persist_interval: Segundos entre gravações
+            event_history: Quantidade de eventos de entrada/saída guardados
+        """
+        self.resolution = resolution
+        self.capacity = max(1, int(np.ceil(retention / resolution)))
+        self.max_gap = max_gap
+        self.exit_grace = exit_grace
+        self.path = path
+        self.persist_interval = persist_interval
+
+        self._lock = threading.Lock()
+        self._keys = np.full(self.capacity, -1, dtype=np.int64)
+        self._sums = np.zeros((self.capacity, len(SUM_FIELDS)), dtype=np.float64)
+        self._cumulative = np.zeros((self.capacity, len(SUM_FIELDS)), dtype=np.float64)
+        self._maxima = np.zeros((self.capacity, len(MAX_FIELDS)), dtype=np.float32)
+        self._tree = MaxTree(self.capacity, len(MAX_FIELDS))
+        # Somas de tudo o que já entrou e do que já saiu do buffer
+        self._totals = np.zeros(len(SUM_FIELDS), dtype=np.float64)
+        self._base = np.zeros(len(SUM_FIELDS), dtype=np.float64)
+        self._latest_key = None
+        self._filled = 0
+
+        self._last_time = None
+        self._last_sequence = None
+        self._last_count = 0
+        self._tracks = {}
+        self.events = deque(maxlen=event_history)
+
+        self._thread = None
+        self._stop = threading.Event()
+        self.samples = 0
+        self.saves = 0
+
+        if path and os.path.exists(path):
+            try:
+                self.load(path)
+            except Exception as e:
+                print(f"Erro ao carregar histórico de presença: {e}")
+
+    # ---------------------------------------------------------------- entrada
+
+    def on_detection(self, payload: dict):
+        """
+        Ouvinte de detecção: acumula o resultado no intervalo atual.
+        """
+        now = payload.get("timestamp") or time.time()
+
+        with self._lock:
+            if not payload.get("camera_active"):
+                # Câmera parada: o tempo até o próximo resultado não é observado
+                self._close_tracks(now, force=True)
+                self._last_time = None
+                self._last_count = 0
+                return
+
+            sequence = payload.get("sequence")
+            if sequence is not None and sequence == self._last_sequence:
+                return
+            self._last_sequence = sequence
+            self.add_sample(now, payload.get("faces") or [])
+
+    def add_sample(self, now: float, faces: List[dict]):
+        """
+        Acumula um resultado (faces publicadas pela API) no instante informado.
+
+        Deve ser chamada com o lock adquirido (ver on_detection) ou por uma
+        única thread.
+        """
+        row = self._advance(now)
+        sums = np.zeros(len(SUM_FIELDS), dtype=np.float64)
+        count = len(faces)
+
+        # Ocupação ponderada pelo tempo: o intervalo desde o resultado anterior
+        # mantém a contagem anterior
+        if self._last_time is not None:
+            dt = now - self._last_time
+            if 0 < dt <= self.max_gap:
+                sums[_SUM['observed_seconds']] = dt
+                sums[_SUM['person_seconds']] = dt * self._last_count
+                if self._last_count:
+                    sums[_SUM['occupied_seconds']] = dt
+        self._last_time = now
+        self._last_count = count
+
+        sums[_SUM['frames']] = 1
+        sums[_SUM['face_sum']] = count
+
+        for face in faces:
+            face_id = face.get("id")
+            track = self._tracks.get(face_id)
+            if track is None:
+                track = {"first_seen": now, "identity": None}
+                self._tracks[face_id] = track
+                sums[_SUM['entries']] += 1
+                self.events.append({"type": "entry", "id": face_id, "timestamp": now})
+            track["last_seen"] = now
+            if face.get("identity") is not None:
+                track["identity"] = face["identity"]
+
+        exits = self._close_tracks(now)
+        sums[_SUM['exits']] += len(exits)
+        sums[_SUM['dwell_sum']] += sum(exits)
+
+        self._sums[row] += sums
+        self._totals += sums
+        self._cumulative[row] = self._totals
+
+        maxima = np.maximum(self._maxima[row], [count, max(exits, default=0.0)])
+        if np.any(maxima > self._maxima[row]):
+            self._maxima[row] = maxima
+            self._tree.update(row, maxima)
+        self.samples += 1
+
+    def _close_tracks(self, now: float, force: bool = False) -> List[float]:
+        dwells = []
+        for face_id, track in list(self._tracks.items()):
+            if force or now - track["last_seen"] > self.exit_grace:
+                del self._tracks[face_id]
+                dwell = track["last_seen"] - track["first_seen"]
+                dwells.append(dwell)
+                self.events.append({"type": "exit", "id": face_id, "identity": track["identity"],
+                                    "dwell": round(dwell, 3), "timestamp": now})
+
+        if force and dwells and self._latest_key is not None:
+            # Saídas forçadas entram no último intervalo
+            row = self._latest_key % self.capacity
+            sums = np.zeros(len(SUM_FIELDS), dtype=np.float64)
+            sums[_SUM['exits']] = len(dwells)
+            sums[_SUM['dwell_sum']] = sum(dwells)
+            self._sums[row] += sums
+            self._totals += sums
+            self._cumulative[row] = self._totals
+            if max(dwells) > self._maxima[row, _MAX['max_dwell']]:
+                self._maxima[row, _MAX['max_dwell']] = max(dwells)
+                self._tree.update(row, self._maxima[row])
+        return dwells
+
+    def _advance(self, now: float) -> int:
+        """
+        Avança o buffer até o intervalo de `now`, zerando os intervalos sem
+        resultados, e retorna a posição do intervalo.
+        """
+        key = int(now // self.resolution)
+        if self._latest_key is None:
+            self._start_at(key)
+        elif key > self._latest_key:
+            gap = key - self._latest_key
+            if gap >= self.capacity:
+                # Tudo no buffer expirou
+                self._base = self._totals.copy()
+                self._start_at(key)
+            else:
+                for k in range(self._latest_key + 1, key + 1):
+                    self._reset_row(k, update_tree=gap <= 64)
+                if gap > 64:
+                    self._tree.rebuild(self._maxima)
+                self._latest_key = key
+                self._filled = min(self.capacity, self._filled + gap)
+        # Resultados atrasados (relógio voltou) entram no intervalo mais recente
+        return self._latest_key % self.capacity
+
+    def _start_at(self, key: int):
+        self._keys[:] = -1
+        self._sums[:] = 0
+        self._maxima[:] = 0
+        self._tree.rebuild(self._maxima)
+        self._latest_key = key
+        self._filled = 1
+        row = key % self.capacity
+        self._keys[row] = key
+        self._cumulative[row] = self._totals
+
+    def _reset_row(self, key: int, update_tree: bool):
+        row = key % self.capacity
+        if self._keys[row] >= 0:
+            # O intervalo mais antigo sai do buffer: suas somas passam para a base
+            self._base = self._cumulative[row].copy()
+        self._keys[row] = key
+        self._sums[row] = 0
+        self._cumulative[row] = self._totals
+        if self._maxima[row].any():
+            self._maxima[row] = 0
+            if update_tree:
+                self._tree.update(row, self._maxima[row])
+
+    # ---------------------------------------------------------------- consulta
+
+    def _total_through(self, key: int) -> np.ndarray:
+        """
+        Somas acumuladas até o fim do intervalo `key` (inclusive).
+        """
+        if self._latest_key is None or key >= self._latest_key:
+            return self._totals
+        oldest = self._latest_key - self._filled + 1
+        if key < oldest:
+            return self._base
+        return self._cumulative[key % self.capacity]
+
+    def _window_maxima(self, first: int, last: int) -> np.ndarray:
+        if self._latest_key is None:
+            return np.zeros(len(MAX_FIELDS), dtype=np.float32)
+        first = max(first, self._latest_key - self._filled + 1)
+        last = min(last, self._latest_key)
+        if first > last:
+            return np.zeros(len(MAX_FIELDS), dtype=np.float32)
+
+        start, end = first % self.capacity, last % self.capacity
+        if start <= end:
+            return self._tree.query(start, end + 1)
+        return np.maximum(self._tree.query(start, self.capacity), self._tree.query(0, end + 1))
+
+    def window_sums(self, window: float, now: Optional[float] = None) -> dict:
+        """
+        Somas das métricas nos últimos `window` segundos (O(1)).
+        """
+        if now is None:
+            now = time.time()
+        last = int(now // self.resolution)
+        count = max(1, int(np.ceil(window / self.resolution)))
+        values = self._total_through(last) - self._total_through(last - count)
+        return dict(zip(SUM_FIELDS, values.tolist()))
+
+    def stats(self, window: float = 300.0, now: Optional[float] = None, step: Optional[float] = None) -> dict:
+        """
+        Agregados de presença de uma janela de tempo.
+
+        Args:
+            window: Duração da janela em segundos (limitada à retenção)
+            now: Fim da janela (padrão: time.time())
+            step: Se informado, inclui a série de ocupação média em passos de
+                  `step` segundos (ex.: 60 para ocupação por minuto)
+
+        Returns:
+            Dicionário com ocupação, pico, entradas/saídas, permanência e as trilhas atuais
+        """
+        if now is None:
+            now = time.time()
+        window = float(min(max(window, self.resolution), self.capacity * self.resolution))
+        last = int(now // self.resolution)
+        count = max(1, int(np.ceil(window / self.resolution)))
+
+        with self._lock:
+            sums = self._total_through(last) - self._total_through(last - count)
+            maxima = self._window_maxima(last - count + 1, last)
+            series = self._series(last, count, step) if step else None
+            tracks = [{
+                "id": face_id,
+                "identity": track["identity"],
+                "dwell": round(track["last_seen"] - track["first_seen"], 3)
+            } for face_id, track in self._tracks.items()]
+            current_count = self._last_count if self._last_time is not None else 0
+            events = []
+            for event in reversed(self.events):
+                if event["timestamp"] < now - window or len(events) >= 20:
+                    break
+                events.append(event)
+
+        values = dict(zip(SUM_FIELDS, sums.tolist()))
+        observed = values['observed_seconds']
+        result = {
+            "window": window,
+            "start": (last - count + 1) * self.resolution,
+            "end": now,
+            "frames": int(values['frames']),
+            "observed_seconds": round(observed, 3),
+            "mean_occupancy": round(values['person_seconds'] / observed, 3) if observed else 0.0,
+            "occupancy_ratio": round(values['occupied_seconds'] / observed, 3) if observed else 0.0,
+            "person_seconds": round(values['person_seconds'], 3),
+            "peak_faces": int(maxima[_MAX['peak_faces']]),
+            "entries": int(values['entries']),
+            "exits": int(values['exits']),
+            "mean_dwell": round(values['dwell_sum'] / values['exits'], 3) if values['exits'] else 0.0,
+            "max_dwell": round(float(maxima[_MAX['max_dwell']]), 3),
+            "current": {"face_count": current_count, "tracks": tracks},
+            "recent_events": events[::-1]
+        }
+        if series is not None:
+            result["occupancy_series"] = series
+        return result
+
+    def _series(self, last: int, count: int, step: float) -> List[dict]:
+        # Limita a resposta a 1440 pontos (um por minuto em 24 h)
+        per_step = max(1, int(round(step / self.resolution)), -(-count // 1440))
+        points = []
+        for i in reversed(range(-(-count // per_step))):
+            end = last - i * per_step
+            values = self._total_through(end) - self._total_through(end - per_step)
+            observed = values[_SUM['observed_seconds']]
+            points.append({
+                "start": (end - per_step + 1) * self.resolution,
+                "mean_occupancy": round(values[_SUM['person_seconds']] / observed, 3) if observed else 0.0,
+                "entries": int(values[_SUM['entries']])
+            })
+        return points
+
+    def get_stats(self) -> dict:
+        """
+        Retorna o estado do buffer (para /api/status).
+        """
+        return {
+            'samples': self.samples,
+            'buckets': self._filled,
+            'capacity': self.capacity,
+            'resolution': self.resolution,
+            'active_tracks': len(self._tracks),
+            'saves': self.saves
+        }
+
+    # ------------------------------------------------------------ persistência
+
+    def save(self, path: Optional[str] = None):
+        """
+        Grava o histórico em .npz compactado (substituição atômica).
+
+        Apenas os intervalos preenchidos são gravados, do mais antigo ao mais
+        recente, com as somas de cada intervalo em float32; as somas
+        acumuladas são recalculadas ao carregar.
+        """
+        path = path or self.path
+        if not path:
+            return
+
+        with self._lock:
+            if self._latest_key is None:
+                return
+            keys = np.arange(self._latest_key - self._filled + 1, self._latest_key + 1)
+            rows = keys % self.capacity
+            sums = self._sums[rows].astype(np.float32)
+            maxima = self._maxima[rows]
+            base = self._base.copy()
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, first_key=np.int64(keys[0]), resolution=np.float64(self.resolution),
+                                sums=sums, maxima=maxima, base=base)
+        os.replace(tmp_path, path)
+        self.saves += 1
+
+    def load(self, path: str):
+        """
+        Carrega um histórico gravado por save(); intervalos além da retenção
+        atual são descartados.
+        """
+        with np.load(path) as data:
+            if float(data["resolution"]) != self.resolution:
+                raise ValueError("Histórico gravado com outra resolução")
+            first_key = int(data["first_key"])
+            sums = data["sums"].astype(np.float64)
+            maxima = data["maxima"]
+            base = data["base"]
+
+        with self._lock:
+            if len(sums) > self.capacity:
+                base = base + sums[:-self.capacity].sum(axis=0)
+                first_key += len(sums) - self.capacity
+                sums, maxima = sums[-self.capacity:], maxima[-self.capacity:]
+
+            keys = np.arange(first_key, first_key + len(sums))
+            rows = keys % self.capacity
+            cumulative = base + np.cumsum(sums, axis=0)
+
+            self._keys[:] = -1
+            self._sums[:] = 0
+            self._maxima[:] = 0
+            self._keys[rows] = keys
+            self._sums[rows] = sums
+            self._cumulative[rows] = cumulative
+            self._maxima[rows] = maxima
+            self._tree.rebuild(self._maxima)
+            self._base = base.copy()
+            self._totals = cumulative[-1].copy() if len(sums) else base.copy()
+            self._latest_key = int(keys[-1]) if len(keys) else None
+            self._filled = len(keys)
+
+    def start(self):
+        """
+        Inicia a gravação periódica (se houver arquivo configurado).
+        """
+        if not self.path or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='presence-analytics', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Encerra a gravação periódica, gravando o histórico uma última vez.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        self._save_safely()
+
+    def _run(self):
+        while not self._stop.wait(self.persist_interval):
+            self._save_safely()
+
+    def _save_safely(self):
+        try:
+            self.save()
+        except Exception as e:
+            print(f"Erro ao gravar histórico de presença: {e}")
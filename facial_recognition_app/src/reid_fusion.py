@@ -0,0 +1,598 @@
+import argparse
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from face_gallery import normalize_encodings
+
+
+class FusedTrack:
+    """
+    Trilha de uma câmera associada a uma identidade global.
+    """
+
+    __slots__ = ('camera_id', 'track_id', 'slot', 'last_seen', 'live')
+
+    def __init__(self, camera_id: str, track_id, slot: int, now: float):
+        self.camera_id = camera_id
+        self.track_id = track_id
+        self.slot = slot
+        self.last_seen = now
+        self.live = True
+
+
+class CrossCameraFusion:
+    """
+    Reidentificação entre câmeras e contagem de pessoas sem duplicatas.
+
+    Cada câmera informa suas trilhas (com a codificação da melhor captura,
+    ver EncodeStage) e as trilhas encerradas. Uma trilha nova é comparada,
+    em um único produto de matrizes por lote, com os centróides das
+    identidades vistas dentro de `window` segundos e entra na mais parecida
+    acima de `threshold`; sem candidato, funda uma identidade nova. Trilhas
+    novas do mesmo lote se comparam entre si pela mesma matriz. Uma
+    identidade nunca recebe duas trilhas vivas da mesma câmera (são pessoas
+    diferentes), e identidades cujos centróides convergem são unidas.
+
+    A memória é limitada: centróides ficam em uma matriz pré-alocada de
+    `max_identities` linhas e as trilhas em um LRU de `max_tracks`;
+    trilhas sem atualização por `presence_timeout` deixam de estar presentes
+    e trilhas e identidades sem atualização por `window` são descartadas.
+    """
+
+    def __init__(self,
+                 threshold: float = 0.6,
+                 window: float = 60.0,
+                 presence_timeout: float = 5.0,
+                 max_identities: int = 1024,
+                 max_tracks: int = 4096,
+                 centroid_memory: int = 20,
+                 sweep_interval: float = 1.0,
+                 dimensions: Optional[int] = None):
+        """
+        Inicializa a fusão vazia.
+
+        Args:
+            threshold: Correlação mínima entre trilha e identidade (ver FaceGallery)
+            window: Segundos em que uma identidade sem atualização ainda recebe trilhas
+            presence_timeout: Segundos sem atualização até uma trilha deixar de estar presente
+            max_identities: Identidades guardadas (linhas da matriz de centróides)
+            max_tracks: Trilhas guardadas (as menos atualizadas saem primeiro)
+            centroid_memory: Peso máximo do histórico no centróide (média móvel)
+            sweep_interval: Segundos mínimos entre varreduras de expiração
+            dimensions: Tamanho das codificações (None: o da primeira recebida,
+                        até clear())
+        """
+        self.threshold = threshold
+        self.window = window
+        self.presence_timeout = presence_timeout
+        self.max_identities = max(1, max_identities)
+        self.max_tracks = max(1, max_tracks)
+        self.centroid_memory = max(1, centroid_memory)
+        self.sweep_interval = sweep_interval
+
+        self._lock = threading.Lock()
+        self._tracks: 'OrderedDict[Tuple[str, object], FusedTrack]' = OrderedDict()
+        # Trilhas vivas de cada câmera por identidade: {câmera: {slot: quantidade}}
+        self._camera_slots: Dict[str, Dict[int, int]] = {}
+        self._fixed_dimensions = dimensions
+        self._centroids = None if dimensions is None else \
+            np.zeros((self.max_identities, int(dimensions)), dtype=np.float32)
+        size = self.max_identities
+        self._ids = np.zeros(size, dtype=np.int64)
+        self._used = np.zeros(size, dtype=bool)
+        self._first_seen = np.zeros(size, dtype=np.float64)
+        self._last_seen = np.zeros(size, dtype=np.float64)
+        self._weights = np.zeros(size, dtype=np.int32)
+        self._live = np.zeros(size, dtype=np.int32)
+        self._next_id = 1
+        self._last_sweep = None
+        self._present = 0
+        self.listeners: List[Callable[[dict], None]] = []
+
+        self.observations = 0
+        self.batches = 0
+        self.matches = 0
+        self.identities_created = 0
+        self.merges = 0
+        self.tracks_evicted = 0
+        self.identities_evicted = 0
+        self.identities_forced_out = 0
+
+    @property
+    def dimensions(self) -> Optional[int]:
+        return None if self._centroids is None else self._centroids.shape[1]
+
+    # ---------------------------------------------------------------- entrada
+
+    def update(self, camera_id: str, tracks: Sequence[Tuple[object, Optional[np.ndarray]]],
+               ended_tracks: Iterable = (), now: Optional[float] = None) -> Dict[object, int]:
+        """
+        Registra as trilhas de uma câmera.
+
+        Args:
+            camera_id: Identificador da câmera
+            tracks: (track_id, codificação) das trilhas vistas; sem codificação
+                    (None), a trilha apenas continua presente
+            ended_tracks: IDs das trilhas encerradas pela câmera
+            now: Instante da observação (padrão: agora)
+
+        Returns:
+            Dicionário {track_id: ID global} das trilhas já associadas
+
+        Raises:
+            ValueError: Codificação de tamanho diferente ou com valores não finitos
+                        (nada é registrado)
+        """
+        now = time.time() if now is None else now
+        observations = [(camera_id, track_id, encoding) for track_id, encoding in tracks
+                        if encoding is not None]
+        with self._lock:
+            vectors = self._vectors(observations)
+            for track_id, encoding in tracks:
+                if encoding is None:
+                    self._touch((camera_id, track_id), now)
+            self._observe(observations, vectors, now)
+            for track_id in ended_tracks:
+                entry = self._tracks.get((camera_id, track_id))
+                if entry is not None and entry.live:
+                    self._detach(entry)
+            self._sweep(now)
+            assigned = {}
+            for track_id, _ in tracks:
+                entry = self._tracks.get((camera_id, track_id))
+                if entry is not None:
+                    assigned[track_id] = int(self._ids[entry.slot])
+            event = self._presence_event(now)
+        self._notify(event)
+        return assigned
+
+    def observe(self, observations: Sequence[Tuple[str, object, np.ndarray]],
+                now: Optional[float] = None):
+        """
+        Registra codificações de várias câmeras em um único lote.
+
+        Args:
+            observations: Lista de (camera_id, track_id, codificação)
+            now: Instante das observações (padrão: agora)
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._observe(observations, self._vectors(observations), now)
+            self._sweep(now)
+            event = self._presence_event(now)
+        self._notify(event)
+
+    def sweep(self, now: Optional[float] = None):
+        """
+        Expira trilhas e identidades antigas sem novas observações.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._sweep(now, force=True)
+            event = self._presence_event(now)
+        self._notify(event)
+
+    def global_id(self, camera_id: str, track_id) -> Optional[int]:
+        """
+        ID global da identidade associada a uma trilha (None se desconhecida).
+        """
+        with self._lock:
+            entry = self._tracks.get((camera_id, track_id))
+            return int(self._ids[entry.slot]) if entry is not None else None
+
+    # ---------------------------------------------------------------- saída
+
+    def counts(self) -> dict:
+        """
+        Contagens atuais: pessoas únicas presentes e trilhas vivas por câmera.
+
+        'tracks' é a soma das câmeras (o que somar face_count de cada uma daria).
+        """
+        with self._lock:
+            cameras = {camera: sum(slots.values()) for camera, slots in self._camera_slots.items()}
+            return {
+                'present': int(np.count_nonzero(self._used & (self._live > 0))),
+                'seen': int(np.count_nonzero(self._used)),
+                'tracks': sum(cameras.values()),
+                'cameras': cameras
+            }
+
+    def get_stats(self) -> dict:
+        """
+        Retorna contagens, contadores e memória ocupada.
+        """
+        stats = self.counts()
+        centroid_bytes = self._centroids.nbytes if self._centroids is not None else 0
+        state_bytes = sum(array.nbytes for array in (self._ids, self._used, self._first_seen,
+                                                    self._last_seen, self._weights, self._live))
+        stats.update({
+            'tracked': len(self._tracks),
+            'max_tracks': self.max_tracks,
+            'max_identities': self.max_identities,
+            'dimensions': self.dimensions,
+            'bytes': centroid_bytes + state_bytes,
+            'observations': self.observations,
+            'batches': self.batches,
+            'matches': self.matches,
+            'identities_created': self.identities_created,
+            'merges': self.merges,
+            'tracks_evicted': self.tracks_evicted,
+            'identities_evicted': self.identities_evicted,
+            'identities_forced_out': self.identities_forced_out
+        })
+        return stats
+
+    def clear(self):
+        """
+        Descarta todas as trilhas e identidades.
+        """
+        with self._lock:
+            self._tracks.clear()
+            self._camera_slots.clear()
+            self._used[:] = False
+            self._live[:] = 0
+            self._present = 0
+            if self._fixed_dimensions is None:
+                self._centroids = None
+
+    # ---------------------------------------------------------------- agrupamento
+
+    def _vectors(self, observations) -> Optional[np.ndarray]:
+        # Validação antes de qualquer mudança de estado
+        if not observations:
+            return None
+        encodings = [np.asarray(obs[2], dtype=np.float32).ravel() for obs in observations]
+        sizes = sorted({len(encoding) for encoding in encodings})
+        expected = self.dimensions
+        if len(sizes) > 1:
+            raise ValueError(f"Codificações de tamanhos diferentes no mesmo lote: {sizes}")
+        if expected is not None and sizes[0] != expected:
+            raise ValueError(f"Codificação com {sizes[0]} valores; a fusão usa {expected}")
+        matrix = np.stack(encodings)
+        if not np.isfinite(matrix).all():
+            raise ValueError("Codificação com valores não finitos")
+        return normalize_encodings(matrix)
+
+    def _observe(self, observations, vectors: Optional[np.ndarray], now: float):
+        if not observations:
+            return
+        if self._centroids is None:
+            self._centroids = np.zeros((self.max_identities, vectors.shape[1]), dtype=np.float32)
+
+        self.batches += 1
+        self.observations += len(observations)
+        slots = np.empty(len(observations), dtype=np.int64)
+        new = []
+        for i, (camera_id, track_id, _) in enumerate(observations):
+            entry = self._touch((camera_id, track_id), now)
+            if entry is None:
+                new.append(i)
+            else:
+                # Trilha conhecida: o rastreador da câmera já garante a continuidade
+                slots[i] = entry.slot
+        if new:
+            self._assign(observations, vectors, new, slots, now)
+
+        touched = np.unique(slots)
+        for i, slot in enumerate(slots.tolist()):
+            self._accumulate(slot, vectors[i])
+        self._merge(touched, now)
+
+    def _assign(self, observations, vectors: np.ndarray, new: List[int], slots: np.ndarray, now: float):
+        # Candidatas: identidades vistas na janela; uma única matriz (novas x candidatas)
+        candidates = np.flatnonzero(self._used & (self._last_seen >= now - self.window))
+        column = np.full(self.max_identities, -1, dtype=np.int64)
+        column[candidates] = np.arange(len(candidates))
+        queries = vectors[new]
+        scores = queries @ self._centroids[candidates].T
+        # Novas do mesmo lote entre si (a identidade fundada por uma trilha
+        # nova é, neste lote, a própria codificação dela)
+        batch_scores = queries @ queries.T
+        founded = []
+
+        for k, i in enumerate(new):
+            camera_id, track_id, _ = observations[i]
+            excluded = self._camera_slots.get(camera_id, {})
+            row = scores[k].copy()
+            for slot in excluded:
+                if column[slot] >= 0:
+                    row[column[slot]] = -np.inf
+            best_slot, best_score = -1, -np.inf
+            if len(row):
+                j = int(np.argmax(row))
+                best_slot, best_score = int(candidates[j]), float(row[j])
+            for f, slot in founded:
+                score = float(batch_scores[k, f])
+                if score > best_score and slot not in excluded:
+                    best_slot, best_score = slot, score
+
+            if best_score >= self.threshold:
+                self.matches += 1
+            else:
+                best_slot = self._allocate(vectors[i], now)
+                founded.append((k, best_slot))
+                if column[best_slot] >= 0:
+                    # Linha reaproveitada de uma candidata expulsa (matriz cheia)
+                    scores[:, column[best_slot]] = -np.inf
+            slots[i] = best_slot
+            self._attach(FusedTrack(camera_id, track_id, best_slot, now))
+
+    def _accumulate(self, slot: int, vector: np.ndarray):
+        # Média móvel: o peso do histórico cresce até centroid_memory observações
+        weight = min(int(self._weights[slot]), self.centroid_memory - 1)
+        centroid = self._centroids[slot]
+        centroid *= weight
+        centroid += vector
+        centroid /= max(float(np.linalg.norm(centroid)), 1e-12)
+        self._weights[slot] += 1
+
+    def _merge(self, slots: np.ndarray, now: float):
+        # Identidades atualizadas contra as demais da janela (uma matriz);
+        # a mais antiga absorve a outra se não houver conflito de câmera
+        candidates = np.flatnonzero(self._used & (self._last_seen >= now - self.window))
+        slots = slots[self._used[slots]]
+        if len(candidates) < 2 or not len(slots):
+            return
+        scores = self._centroids[slots] @ self._centroids[candidates].T
+        rows, cols = np.nonzero(scores >= self.threshold)
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            a, b = int(slots[row]), int(candidates[col])
+            if a == b or not (self._used[a] and self._used[b]):
+                continue
+            keep, drop = (a, b) if self._ids[a] < self._ids[b] else (b, a)
+            if self._shares_camera(keep, drop):
+                continue
+            self._absorb(keep, drop)
+
+    def _shares_camera(self, a: int, b: int) -> bool:
+        return any(a in slots and b in slots for slots in self._camera_slots.values())
+
+    def _absorb(self, keep: int, drop: int):
+        # Raro: percorre as trilhas para apontá-las à identidade mantida
+        for entry in self._tracks.values():
+            if entry.slot == drop:
+                live = entry.live
+                if live:
+                    self._detach(entry)
+                entry.slot = keep
+                if live:
+                    self._attach(entry, store=False)
+        total = max(int(self._weights[keep]) + int(self._weights[drop]), 1)
+        centroid = self._centroids[keep] * self._weights[keep] + self._centroids[drop] * self._weights[drop]
+        self._centroids[keep] = centroid / max(float(np.linalg.norm(centroid)), 1e-12)
+        self._weights[keep] = min(total, self.centroid_memory)
+        self._first_seen[keep] = min(self._first_seen[keep], self._first_seen[drop])
+        self._last_seen[keep] = max(self._last_seen[keep], self._last_seen[drop])
+        self._used[drop] = False
+        self.merges += 1
+
+    def _allocate(self, vector: np.ndarray, now: float) -> int:
+        free = np.flatnonzero(~self._used)
+        if len(free):
+            slot = int(free[0])
+        else:
+            # Matriz cheia: sai a identidade atualizada há mais tempo
+            slot = int(np.argmin(self._last_seen))
+            self._release(slot)
+            self.identities_forced_out += 1
+        self._centroids[slot] = vector
+        self._ids[slot] = self._next_id
+        self._next_id += 1
+        self._used[slot] = True
+        self._first_seen[slot] = self._last_seen[slot] = now
+        self._weights[slot] = 0
+        self._live[slot] = 0
+        self.identities_created += 1
+        return slot
+
+    def _release(self, slot: int):
+        for key in [key for key, entry in self._tracks.items() if entry.slot == slot]:
+            self._remove(key)
+        self._used[slot] = False
+
+    # ---------------------------------------------------------------- trilhas
+
+    def _touch(self, key, now: float) -> Optional[FusedTrack]:
+        entry = self._tracks.get(key)
+        if entry is None:
+            return None
+        entry.last_seen = now
+        self._tracks.move_to_end(key)
+        if not entry.live:
+            self._attach(entry, store=False)
+        self._last_seen[entry.slot] = max(self._last_seen[entry.slot], now)
+        return entry
+
+    def _attach(self, entry: FusedTrack, store: bool = True):
+        if store:
+            self._tracks[(entry.camera_id, entry.track_id)] = entry
+            while len(self._tracks) > self.max_tracks:
+                self._remove(next(iter(self._tracks)))
+        entry.live = True
+        slots = self._camera_slots.setdefault(entry.camera_id, {})
+        slots[entry.slot] = slots.get(entry.slot, 0) + 1
+        self._live[entry.slot] += 1
+        self._last_seen[entry.slot] = max(self._last_seen[entry.slot], entry.last_seen)
+
+    def _detach(self, entry: FusedTrack):
+        entry.live = False
+        slots = self._camera_slots[entry.camera_id]
+        slots[entry.slot] -= 1
+        if not slots[entry.slot]:
+            del slots[entry.slot]
+            if not slots:
+                del self._camera_slots[entry.camera_id]
+        self._live[entry.slot] -= 1
+
+    def _remove(self, key):
+        entry = self._tracks.pop(key)
+        if entry.live:
+            self._detach(entry)
+        self.tracks_evicted += 1
+
+    def _sweep(self, now: float, force: bool = False):
+        if not force and self._last_sweep is not None and now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+
+        # Trilhas em ordem de atualização: para na primeira ainda recente
+        stale = now - self.presence_timeout
+        expired = now - self.window
+        for key, entry in list(self._tracks.items()):
+            if entry.last_seen >= stale:
+                break
+            if entry.last_seen < expired:
+                self._remove(key)
+            elif entry.live:
+                self._detach(entry)
+
+        old = self._used & (self._live == 0) & (self._last_seen < expired)
+        if old.any():
+            self._used[old] = False
+            self.identities_evicted += int(np.count_nonzero(old))
+
+    def _presence_event(self, now: float) -> Optional[dict]:
+        present = int(np.count_nonzero(self._used & (self._live > 0)))
+        if present == self._present:
+            return None
+        self._present = present
+        return {
+            'type': 'unique_presence',
+            'present': present,
+            'tracks': int(self._live[self._used].sum()),
+            'timestamp': now
+        }
+
+    def _notify(self, event: Optional[dict]):
+        if event is None:
+            return
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Erro em ouvinte da fusão de câmeras: {e}")
+
+
+def simulate(cameras: int = 48, cameras_per_area: int = 3, people: int = 300, seconds: float = 3600.0,
+             step: float = 0.5, shot_interval: float = 1.5, dimensions: int = 204, noise: float = 0.7,
+             visibility: float = 0.8, seed: int = 0, **options) -> dict:
+    """
+    Simulação de várias câmeras com áreas sobrepostas.
+
+    As câmeras são agrupadas em áreas de `cameras_per_area` (todas veem a
+    mesma cena). Cada pessoa entra em uma área, fica de 20 a 120 s e sai;
+    cada câmera da área a vê com probabilidade `visibility`, com uma trilha
+    própria que envia uma codificação ruidosa a cada `shot_interval` s e é
+    encerrada na saída.
+
+    Returns:
+        Dicionário com o erro médio da contagem única e da soma das câmeras
+        em relação ao número real de pessoas, o tempo por atualização e o
+        máximo de trilhas e identidades guardadas
+    """
+    rng = np.random.default_rng(seed)
+    fusion = CrossCameraFusion(**options)
+    base = rng.normal(size=(people, dimensions)).astype(np.float32)
+    areas = max(1, cameras // cameras_per_area)
+    # Pessoa -> (área, instante de saída, {câmera: trilha}) enquanto visível
+    visits = {}
+    next_track = [0] * cameras
+    last_shot = {}
+    fused_error = summed_error = samples = 0.0
+    update_seconds = []
+    max_tracked = max_identities = 0
+
+    now = 0.0
+    while now < seconds:
+        now += step
+        reports = {camera: ([], []) for camera in range(cameras)}
+        for person, (area, leave, tracks) in list(visits.items()):
+            if now >= leave:
+                for camera, track in tracks.items():
+                    reports[camera][1].append(track)
+                del visits[person]
+        for person in rng.permutation(people)[:max(1, people // 200)]:
+            person = int(person)
+            if person in visits:
+                continue
+            area = int(rng.integers(areas))
+            tracks = {}
+            for camera in range(area * cameras_per_area, (area + 1) * cameras_per_area):
+                if camera < cameras and rng.random() < visibility:
+                    tracks[camera] = next_track[camera]
+                    next_track[camera] += 1
+            if tracks:
+                visits[person] = (area, now + rng.uniform(20.0, 120.0), tracks)
+
+        for person, (area, leave, tracks) in visits.items():
+            for camera, track in tracks.items():
+                key = (camera, track)
+                encoding = None
+                if now - last_shot.get(key, -shot_interval) >= shot_interval:
+                    last_shot[key] = now
+                    encoding = base[person] + rng.normal(size=dimensions).astype(np.float32) * noise
+                reports[camera][0].append((track, encoding))
+        for camera, (tracks, ended) in reports.items():
+            for track in ended:
+                last_shot.pop((camera, track), None)
+            if tracks or ended:
+                started = time.perf_counter()
+                fusion.update(str(camera), tracks, ended, now)
+                update_seconds.append(time.perf_counter() - started)
+
+        counts = fusion.counts()
+        fused_error += abs(counts['present'] - len(visits))
+        summed_error += abs(counts['tracks'] - len(visits))
+        samples += 1
+        max_tracked = max(max_tracked, len(fusion._tracks))
+        max_identities = max(max_identities, counts['seen'])
+
+    times = np.array(update_seconds) * 1000.0
+    stats = fusion.get_stats()
+    return {
+        'cameras': cameras,
+        'people': people,
+        'seconds': seconds,
+        'updates': len(times),
+        'update_ms_mean': float(times.mean()) if len(times) else 0.0,
+        'update_ms_p99': float(np.percentile(times, 99)) if len(times) else 0.0,
+        'fused_error': fused_error / max(samples, 1),
+        'summed_error': summed_error / max(samples, 1),
+        'max_tracked': max_tracked,
+        'max_identities': max_identities,
+        'bytes': stats['bytes'],
+        'merges': stats['merges'],
+        'identities_created': stats['identities_created']
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Simulação de linha de comando: python src/reid_fusion.py --cameras 48 --seconds 3600
+    """
+    parser = argparse.ArgumentParser(description="Simulação da fusão entre câmeras")
+    parser.add_argument("--cameras", type=int, default=48)
+    parser.add_argument("--people", type=int, default=300)
+    parser.add_argument("--seconds", type=float, default=3600.0)
+    parser.add_argument("--noise", type=float, default=0.7)
+    parser.add_argument("--max-tracks", type=int, default=4096)
+    parser.add_argument("--max-identities", type=int, default=1024)
+    args = parser.parse_args(argv)
+
+    result = simulate(args.cameras, people=args.people, seconds=args.seconds, noise=args.noise,
+                      max_tracks=args.max_tracks, max_identities=args.max_identities)
+    print(f"{result['cameras']} câmeras, {result['people']} pessoas, {result['seconds']:.0f} s: "
+          f"{result['updates']} atualizações, {result['update_ms_mean']:.3f} ms em média "
+          f"(p99 {result['update_ms_p99']:.3f} ms); erro médio da contagem única "
+          f"{result['fused_error']:.2f}, da soma das câmeras {result['summed_error']:.2f}; "
+          f"máximo de {result['max_tracked']} trilhas e {result['max_identities']} identidades "
+          f"({result['bytes'] / 1024:.0f} KB), {result['merges']} uniões")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
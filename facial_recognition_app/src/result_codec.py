@@ -0,0 +1,295 @@
+import json
+import re
+import struct
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # Dependência opcional
+    msgpack = None
+
+
+MIME_JSON = "application/json"
+MIME_BINARY = "application/x-face-detection"
+MIME_MSGPACK = "application/msgpack"
+
+# Nomes aceitos no parâmetro ?format=
+FORMAT_ALIASES = {
+    "json": MIME_JSON,
+    "binary": MIME_BINARY,
+    "struct": MIME_BINARY,
+    "msgpack": MIME_MSGPACK
+}
+
+# Layout binário (little-endian):
+#   cabeçalho: magic "FD", versão, flags, sequência, timestamp, largura e
+#              altura do frame, quantidade de faces
+#   detecção anterior (se FLAG_LAST_DETECTION): contagem, timestamp
+#   face completa: id (uint32), confiança (0-255), x, y, largura, altura
+#   face em delta (se FLAG_DELTA): id, tipo, e em seguida a face completa
+#              (tipo 0) ou diferenças de 1 byte em relação ao frame base (tipo 1)
+MAGIC = b"FD"
+# Versão 2: id da face em 32 bits (os IDs de trilha crescem sem limite)
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<2sBBIdHHH")
+LAST_DETECTION = struct.Struct("<Hd")
+FACE = struct.Struct("<IBhhHH")
+FACE_KIND = struct.Struct("<IB")
+FACE_DELTA = struct.Struct("<bbbbb")
+DELTA_BASE = struct.Struct("<I")
+
+FLAG_FACES_DETECTED = 0x01
+FLAG_CAMERA_ACTIVE = 0x02
+FLAG_LAST_DETECTION = 0x04
+FLAG_DELTA = 0x08
+
+KIND_FULL = 0
+KIND_DELTA = 1
+
+_FACE_ID_PATTERN = re.compile(r"(\d+)$")
+
+
+def negotiate(accept: Optional[str], format_param: Optional[str] = None) -> str:
+    """
+    Escolhe o formato de resposta a partir do parâmetro ?format= ou do cabeçalho Accept.
+
+    Args:
+        accept: Valor do cabeçalho Accept
+        format_param: Valor do parâmetro format (json, binary, msgpack)
+
+    Returns:
+        MIME type escolhido (JSON quando nada for reconhecido)
+    """
+    if format_param:
+        mime = FORMAT_ALIASES.get(format_param.lower(), MIME_JSON)
+        return mime if mime != MIME_MSGPACK or msgpack is not None else MIME_JSON
+
+    for item in (accept or "").split(","):
+        mime = item.split(";")[0].strip().lower()
+        if mime == MIME_BINARY:
+            return MIME_BINARY
+        if mime in (MIME_MSGPACK, "application/x-msgpack") and msgpack is not None:
+            return MIME_MSGPACK
+        if mime in (MIME_JSON, "*/*"):
+            return MIME_JSON
+
+    return MIME_JSON
+
+
+def encode_payload(payload: dict, mime: str, previous: Optional[dict] = None) -> bytes:
+    """
+    Serializa o resultado de detecção no formato negociado.
+
+    Args:
+        payload: Resultado de detecção (ver api_server.get_detection_payload)
+        mime: Formato retornado por negotiate()
+        previous: Resultado anterior para codificação em delta (apenas binário)
+
+    Returns:
+        Bytes da resposta
+    """
+    if mime == MIME_BINARY:
+        return encode_binary(payload, previous)
+    if mime == MIME_MSGPACK:
+        return encode_msgpack(payload)
+    return json.dumps(payload).encode()
+
+
+def encode_binary(payload: dict, previous: Optional[dict] = None) -> bytes:
+    """
+    Codifica o resultado no layout binário compacto.
+
+    Args:
+        payload: Resultado de detecção
+        previous: Resultado anterior; se informado, faces com o mesmo ID são
+                  gravadas como diferenças de 1 byte sempre que couberem
+
+    Returns:
+        Bytes no layout binário
+    """
+    faces = payload.get("faces") or []
+    last_detection = payload.get("last_detection")
+    frame_w, frame_h = payload.get("frame_size") or (0, 0)
+
+    flags = 0
+    if payload.get("faces_detected"):
+        flags |= FLAG_FACES_DETECTED
+    if payload.get("camera_active"):
+        flags |= FLAG_CAMERA_ACTIVE
+    if last_detection:
+        flags |= FLAG_LAST_DETECTION
+    if previous is not None:
+        flags |= FLAG_DELTA
+
+    parts = [HEADER.pack(MAGIC, FORMAT_VERSION, flags,
+                         payload.get("sequence", 0),
+                         payload.get("timestamp") or 0.0,
+                         frame_w, frame_h, len(faces))]
+
+    if last_detection:
+        parts.append(LAST_DETECTION.pack(last_detection["count"], last_detection["timestamp"]))
+
+    if previous is None:
+        # Todas as faces em uma única chamada de pack
+        values = [v for face in faces for v in _quantize_face(face)]
+        parts.append(_faces_struct(len(faces)).pack(*values))
+        return b"".join(parts)
+
+    parts.append(DELTA_BASE.pack(previous.get("sequence", 0)))
+    base = {q[0]: q for q in map(_quantize_face, previous.get("faces") or [])}
+
+    for face in faces:
+        quantized = _quantize_face(face)
+        reference = base.get(quantized[0])
+        if reference is not None:
+            diffs = [a - b for a, b in zip(quantized[1:], reference[1:])]
+            if all(-128 <= d <= 127 for d in diffs):
+                parts.append(FACE_KIND.pack(quantized[0], KIND_DELTA))
+                parts.append(FACE_DELTA.pack(*diffs))
+                continue
+        parts.append(FACE_KIND.pack(quantized[0], KIND_FULL))
+        parts.append(FACE.pack(*quantized))
+
+    return b"".join(parts)
+
+
+def decode_binary(data: bytes, previous: Optional[dict] = None) -> dict:
+    """
+    Decodifica o layout binário.
+
+    Args:
+        data: Bytes produzidos por encode_binary
+        previous: Resultado decodificado usado como base, obrigatório se os dados estiverem em delta
+
+    Returns:
+        Resultado de detecção (confiança e coordenadas quantizadas)
+    """
+    magic, version, flags, sequence, timestamp, frame_w, frame_h, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Dados binários de detecção inválidos")
+    offset = HEADER.size
+
+    last_detection = None
+    if flags & FLAG_LAST_DETECTION:
+        last_count, last_ts = LAST_DETECTION.unpack_from(data, offset)
+        last_detection = {"count": last_count, "timestamp": last_ts}
+        offset += LAST_DETECTION.size
+
+    faces = []
+    if flags & FLAG_DELTA:
+        base_sequence, = DELTA_BASE.unpack_from(data, offset)
+        offset += DELTA_BASE.size
+        if previous is None or previous.get("sequence") != base_sequence:
+            raise ValueError(f"Delta requer o resultado base de sequência {base_sequence}")
+        base = {q[0]: q for q in map(_quantize_face, previous.get("faces") or [])}
+
+        for _ in range(count):
+            face_id, kind = FACE_KIND.unpack_from(data, offset)
+            offset += FACE_KIND.size
+            if kind == KIND_DELTA:
+                diffs = FACE_DELTA.unpack_from(data, offset)
+                offset += FACE_DELTA.size
+                reference = base[face_id]
+                quantized = (face_id,) + tuple(a + d for a, d in zip(reference[1:], diffs))
+            else:
+                quantized = FACE.unpack_from(data, offset)
+                offset += FACE.size
+            faces.append(_dequantize_face(quantized))
+    else:
+        values = _faces_struct(count).unpack_from(data, offset)
+        faces = [_dequantize_face(values[i:i + 6]) for i in range(0, len(values), 6)]
+
+    return {
+        "faces_detected": bool(flags & FLAG_FACES_DETECTED),
+        "face_count": count,
+        "timestamp": timestamp or None,
+        "last_detection": last_detection,
+        "camera_active": bool(flags & FLAG_CAMERA_ACTIVE),
+        "sequence": sequence,
+        "frame_size": [frame_w, frame_h],
+        "faces": faces
+    }
+
+
+def encode_msgpack(payload: dict) -> bytes:
+    """
+    Codifica o resultado em MessagePack com as faces quantizadas em listas.
+    """
+    if msgpack is None:
+        raise RuntimeError("msgpack não está instalado")
+
+    last_detection = payload.get("last_detection")
+    return msgpack.packb([
+        payload.get("sequence", 0),
+        payload.get("timestamp"),
+        bool(payload.get("faces_detected")),
+        bool(payload.get("camera_active")),
+        list(payload.get("frame_size") or (0, 0)),
+        [last_detection["count"], last_detection["timestamp"]] if last_detection else None,
+        [list(_quantize_face(face)) for face in payload.get("faces") or []]
+    ])
+
+
+def payload_faces(faces_info: List[dict]) -> List[dict]:
+    """
+    Converte a saída de FaceDetector.detect_faces no formato publicado pela API.
+
+    A identidade e o ID global da fusão entre câmeras (se houver) só são
+    incluídos no JSON; os formatos compactos carregam apenas o ID da trilha.
+    """
+    if not faces_info:
+        return []
+
+    # Arredondamento e conversão para int de todas as faces de uma vez
+    confidences = np.round(np.array([face["confidence"] for face in faces_info], dtype=np.float64), 3)
+    boxes = np.array([face["bbox"] for face in faces_info], dtype=np.float64).astype(np.int64)
+
+    faces = []
+    for face, confidence, bbox in zip(faces_info, confidences.tolist(), boxes.tolist()):
+        item = {"id": face["id"], "confidence": confidence, "bbox": bbox}
+        if face.get("identity") is not None:
+            item["identity"] = face["identity"]
+        if face.get("global_id") is not None:
+            item["global_id"] = face["global_id"]
+        faces.append(item)
+    return faces
+
+
+_faces_structs = {}
+
+
+def _faces_struct(count: int) -> struct.Struct:
+    packer = _faces_structs.get(count)
+    if packer is None:
+        packer = struct.Struct("<" + "IBhhHH" * count)
+        if count <= 64:
+            _faces_structs[count] = packer
+    return packer
+
+
+def _quantize_face(face: dict) -> Tuple[int, int, int, int, int, int]:
+    x, y, w, h = face["bbox"]
+    confidence = face["confidence"]
+    score = 255 if confidence >= 1.0 else 0 if confidence <= 0.0 else int(confidence * 255 + 0.5)
+    # IDs acima de 32 bits dão a volta (nunca ocorre com o rastreador, mas não falha)
+    return (_numeric_id(face["id"]) & 0xFFFFFFFF, score, x, y, w, h)
+
+
+def _dequantize_face(quantized) -> dict:
+    face_id, score, x, y, w, h = quantized
+    return {
+        "id": f"Face_{face_id}",
+        "confidence": round(score / 255, 3),
+        "bbox": [x, y, w, h]
+    }
+
+
+def _numeric_id(face_id) -> int:
+    if isinstance(face_id, int):
+        return face_id
+    if face_id.startswith("Face_"):
+        return int(face_id[5:])
+    match = _FACE_ID_PATTERN.search(str(face_id))
+    return int(match.group(1)) if match else 0
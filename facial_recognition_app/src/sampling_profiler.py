@@ -0,0 +1,183 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+
+# Threads sem nome próprio: "Thread-12 (process_request_thread)" vira
+# "process_request_thread" e pools ("asyncio_3", "detection-tile_1") perdem o
+# índice, de modo que as threads de um mesmo papel somam as amostras
+_TARGET_NAME = re.compile(r'^Thread-\d+ \((.+)\)$')
+_POOL_INDEX = re.compile(r'_\d+$')
+
+
+def thread_label(name: str) -> str:
+    """
+    Nome usado como raiz das pilhas de uma thread (papel, não a instância).
+    """
+    match = _TARGET_NAME.match(name)
+    if match:
+        return match.group(1)
+    return _POOL_INDEX.sub('', name)
+
+
+class SamplingProfiler:
+    """
+    Profiler por amostragem de todas as threads do processo.
+
+    Uma thread própria lê sys._current_frames() `rate` vezes por segundo e
+    conta cada pilha, com o papel da thread (ver thread_label) como raiz.
+    Nada é instrumentado: parado, o profiler não tem custo algum, e em
+    execução o custo fica na sua thread (proporcional às threads e à
+    profundidade das pilhas). collapsed() gera o formato de pilhas
+    colapsadas ("raiz;f1;f2 contagem") aceito por flamegraph.pl, speedscope
+    e inferno.
+    """
+
+    def __init__(self, rate: float = 100.0, max_depth: int = 64, max_duration: float = 300.0):
+        """
+        Inicializa o profiler (parado).
+
+        Args:
+            rate: Amostras por segundo
+            max_depth: Quadros mantidos de cada pilha (os mais internos)
+            max_duration: Segundos até parar sozinho (0 desativa o limite)
+        """
+        self.rate = rate
+        self.max_depth = max_depth
+        self.max_duration = max_duration
+
+        self._counts: Counter = Counter()
+        self._labels: Dict[object, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.started_at = None
+        self.stopped_at = None
+        self.samples = 0
+        self.sample_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, rate: Optional[float] = None, duration: Optional[float] = None) -> bool:
+        """
+        Descarta as amostras anteriores e inicia a amostragem.
+
+        Args:
+            rate: Amostras por segundo (padrão: o configurado)
+            duration: Segundos até parar sozinho (padrão e limite: max_duration)
+
+        Returns:
+            False se já estiver em execução
+        """
+        if self.running:
+            return False
+        if rate is not None:
+            if not 0 < rate <= 1000:
+                raise ValueError("A taxa de amostragem deve estar entre 0 e 1000 por segundo")
+            self.rate = float(rate)
+        limit = self.max_duration
+        if duration is not None:
+            if not duration > 0:
+                raise ValueError("A duração deve ser maior que zero")
+            # Um pedido não desativa nem estende o limite configurado
+            limit = min(duration, limit) if limit > 0 else duration
+
+        with self._lock:
+            self._counts = Counter()
+        self.samples = 0
+        self.sample_seconds = 0.0
+        self.started_at = time.time()
+        self.stopped_at = None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(limit,), name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> str:
+        """
+        Para a amostragem (se ainda estiver ativa).
+
+        Returns:
+            Pilhas colapsadas da última execução
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        return self.collapsed()
+
+    def collapsed(self) -> str:
+        """
+        Pilhas colapsadas ("thread;externa;...;interna contagem"), mais frequentes primeiro.
+        """
+        with self._lock:
+            counts = self._counts.most_common()
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in counts)
+
+    def get_stats(self) -> dict:
+        """
+        Retorna o estado do profiler e as amostras por thread.
+        """
+        with self._lock:
+            counts = list(self._counts.items())
+        threads = Counter()
+        for stack, count in counts:
+            threads[stack[0]] += count
+        end = time.time() if self.running else self.stopped_at
+        return {
+            'running': self.running,
+            'rate': self.rate,
+            'samples': self.samples,
+            'stacks': len(counts),
+            'threads': dict(threads.most_common()),
+            'elapsed': round(end - self.started_at, 1) if self.started_at and end else None,
+            'sample_ms': round(self.sample_seconds * 1000.0 / self.samples, 3) if self.samples else None
+        }
+
+    def _run(self, duration: float):
+        interval = 1.0 / self.rate
+        own = threading.get_ident()
+        next_sample = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                if duration and time.time() - self.started_at >= duration:
+                    break
+                started = time.perf_counter()
+                self._sample(own)
+                self.sample_seconds += time.perf_counter() - started
+                self.samples += 1
+                # Intervalo medido do início de cada amostra; atrasos não acumulam
+                next_sample = max(next_sample + interval, time.perf_counter())
+                self._stop.wait(next_sample - time.perf_counter())
+        finally:
+            self.stopped_at = time.time()
+
+    def _sample(self, own: int):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(thread_label(names.get(ident, f'thread-{ident}')))
+            stacks.append(tuple(reversed(stack)))
+        with self._lock:
+            self._counts.update(stacks)
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            # Por função (primeira linha), não por linha executada: menos pilhas distintas
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
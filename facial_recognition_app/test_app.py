@@ -6,6 +6,7 @@ Testa os componentes principais sem interface gráfica.
 
 import sys
 import os
+import time
 import cv2
 import numpy as np
 
@@ -13,7 +14,28 @@ import numpy as np
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
 from face_detector import FaceDetector
-from camera_manager import CameraManager
+from camera_manager import CameraManager, SynchronizedCapture, fourcc_to_str
+from detector_pool import DetectorPool
+from motion_gate import MotionGate
+from event_publisher import EventPublisher, InProcessMqttClient, MqttTransport, UdpMulticastTransport
+from face_quality import BestShotSelector, FaceQualityScorer
+from face_tracker import FaceTracker
+from face_gallery import FaceGallery, correlation
+from face_encoder import REFERENCE_SHAPE, FaceEncoder
+from identity_cache import IdentityCache
+from presence_analytics import PresenceAnalytics
+from face_redactor import FaceRedactor, benchmark as redaction_benchmark
+from clip_recorder import ClipRecorder
+from multiscale_detection import MultiScaleDetector
+from pipeline import (DEFAULT_PIPELINES, DetectStage, EncodeStage, FuseStage, OverloadController,
+                      PipelineFrame, PublishStage, build_pipeline, load_pipeline_config)
+from detections import (DETECTION_DTYPE, clip_boxes, empty_detections, iou_matrix, match_boxes,
+                        nms, to_faces_info)
+from enrollment import GalleryImporter, deduplicate
+from memory_monitor import MemoryMonitor, native_graph_counts, rss_bytes, soak
+from sampling_profiler import SamplingProfiler, thread_label
+from reid_fusion import CrossCameraFusion, simulate as fusion_simulate
+from result_codec import MIME_BINARY, MIME_JSON, decode_binary, encode_binary, negotiate
 
 
 def test_face_detector():
@@ -93,6 +115,1545 @@ def test_camera_manager():
         return False
 
 
+def test_camera_capture():
+    """
+    Testa a negociação de captura e a medição de FPS/decodificação com um
+    arquivo de vídeo como fonte (sem câmera).
+    """
+    print("\n=== Testando Captura por Arquivo ===")
+    
+    try:
+        import tempfile
+        assert fourcc_to_str(cv2.VideoWriter_fourcc(*"MJPG")) == "MJPG", "FOURCC mal convertido"
+        
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "captura.avi")
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (320, 240))
+            for i in range(40):
+                frame = np.full((240, 320, 3), i * 5, dtype=np.uint8)
+                cv2.circle(frame, (i * 8, 120), 20, (255, 255, 255), -1)
+                writer.write(frame)
+            writer.release()
+            
+            camera = CameraManager(path, 320, 240)
+            assert camera.start_camera(), "arquivo de vídeo não abriu"
+            frames = 0
+            while camera.read_frame()[0]:
+                frames += 1
+            info = camera.get_camera_info()
+            camera.stop_camera()
+            
+            assert frames == 40 and info["fourcc"] == "MJPG", f"captura incorreta: {frames} frames, {info}"
+            assert info["fps_measured"] > 0 and info["decode_time_ms"] > 0, "medição não registrada"
+            assert camera.probe_modes() == [], "arquivo não tem modos de câmera"
+            print(f"✓ {frames} frames MJPG: {info['fps_measured']:.0f} fps medidos, "
+                  f"{info['decode_time_ms']:.2f} ms por decodificação")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste de captura: {e}")
+        return False
+
+
+def test_synchronized_capture():
+    """
+    Testa a thread de captura (grab contínuo, decodificação sob demanda) e a
+    captura sincronizada de duas fontes.
+    """
+    print("\n=== Testando Captura Sincronizada ===")
+    
+    try:
+        import tempfile
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "captura.avi")
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 100, (320, 240))
+            for i in range(30):
+                writer.write(np.full((240, 320, 3), i * 8, dtype=np.uint8))
+            writer.release()
+            
+            # Consumidor lento: os frames obtidos no intervalo não são decodificados
+            camera = CameraManager(path, 320, 240)
+            assert camera.start_camera() and camera.start_capture_thread(), "captura não iniciou"
+            used = 0
+            while True:
+                ret, frame = camera.read_frame()
+                if not ret:
+                    break
+                assert camera.last_frame_time is not None, "frame sem instante de captura"
+                used += 1
+                time.sleep(0.03)
+            camera.stop_camera()
+            assert camera.frames_grabbed == 30, f"{camera.frames_grabbed} frames obtidos"
+            assert camera.frames_decoded == used < 30 and camera.frames_skipped == 30 - used, \
+                "frames descartados foram decodificados"
+            print(f"✓ {camera.frames_grabbed} frames obtidos, {used} decodificados")
+            
+            # Duas fontes: cada conjunto traz um frame por câmera com o instante da captura
+            sync = SynchronizedCapture([CameraManager(path, 320, 240), CameraManager(path, 320, 240)])
+            assert sync.start(), "câmeras não iniciaram"
+            for _ in range(5):
+                frames = sync.read()
+                assert all(ret for ret, _, _ in frames), "conjunto incompleto"
+                assert np.array_equal(frames[0][1], frames[1][1]), "frames fora de sincronia"
+            stats = sync.get_stats()
+            sync.stop()
+            assert stats["sets_captured"] == 5, f"conjuntos incorretos: {stats}"
+            print(f"✓ {stats['sets_captured']} conjuntos sincronizados, "
+                  f"diferença máxima {stats['max_skew_ms']:.2f} ms")
+            
+            # Fonte que termina antes: sem grab, a câmera não repete o frame anterior
+            short = os.path.join(root, "curto.avi")
+            writer = cv2.VideoWriter(short, cv2.VideoWriter_fourcc(*"MJPG"), 100, (320, 240))
+            for i in range(2):
+                writer.write(np.full((240, 320, 3), 50, dtype=np.uint8))
+            writer.release()
+            sync = SynchronizedCapture([CameraManager(path, 320, 240), CameraManager(short, 320, 240)])
+            assert sync.start(), "câmeras não iniciaram"
+            sets = [sync.read() for _ in range(3)]
+            info = sync.cameras[0].get_camera_info()
+            sync.stop()
+            assert sets[1][1][0] and sets[2][0][0], "conjunto incompleto"
+            assert sets[2][1] == (False, None, None), "frame anterior repetido após falha do grab"
+            assert info["width"] == 320, f"informações incorretas: {info}"
+            print("✓ Câmera sem grab marcada como falha no conjunto")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste de captura sincronizada: {e}")
+        return False
+
+
+def test_detector_pool():
+    """
+    Testa o pool de detectores pré-aquecidos e a pausa da câmera.
+    """
+    print("\n=== Testando Pool de Detectores ===")
+    
+    try:
+        pool = DetectorPool(size=1)
+        created = pool.warm_up()
+        print(f"✓ Pool pré-aquecido com {created} detector(es)")
+        
+        # O detector devolvido deve ser reaproveitado no próximo acquire
+        detector = pool.acquire()
+        pool.release(detector)
+        assert pool.acquire() is detector, "detector não foi reaproveitado"
+        assert pool.get_stats()['created'] == 1, "pool criou detectores extras"
+        print("✓ Detector reaproveitado sem recriar grafos")
+        
+        # Com o pool cheio, o detector excedente é liberado
+        pool.release(detector)
+        pool.release(DetectorPool(size=0).acquire())
+        assert pool.idle_count() == 1, "pool excedeu o tamanho configurado"
+        pool.close()
+        print("✓ Pool respeita o tamanho máximo")
+        
+        # Pausa/retomada sem câmera aberta não deve alterar o estado
+        camera = CameraManager()
+        camera.pause_camera()
+        assert not camera.is_paused and not camera.resume_camera(), "pausa sem câmera aberta"
+        print("✓ Pausa da câmera validada")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste do pool de detectores: {e}")
+        return False
+
+
+def test_motion_gate():
+    """
+    Testa o filtro de movimento com frames sintéticos.
+    """
+    print("\n=== Testando Filtro de Movimento ===")
+    
+    try:
+        gate = MotionGate(recheck_interval=1.0)
+        static_frame = np.full((480, 640, 3), 80, dtype=np.uint8)
+        
+        # Primeiro frame sempre é processado; frames idênticos são pulados
+        assert gate.should_process(static_frame, now=0.0), "primeiro frame não processado"
+        assert not gate.should_process(static_frame.copy(), now=0.1), "frame estático processado"
+        print("✓ Frame estático pulado")
+        
+        # Movimento na cena libera a inferência
+        moved_frame = static_frame.copy()
+        cv2.rectangle(moved_frame, (200, 150), (440, 330), (255, 255, 255), -1)
+        assert gate.should_process(moved_frame, now=0.2), "movimento não detectado"
+        print("✓ Movimento detectado")
+        
+        # Após o intervalo, a inferência é forçada mesmo sem movimento
+        assert gate.should_process(moved_frame, now=1.5), "reverificação não forçada"
+        
+        stats = gate.get_stats()
+        assert stats['frames_skipped'] == 1 and stats['forced_rechecks'] == 1, f"contadores incorretos: {stats}"
+        print(f"✓ Contadores: {stats}")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste do filtro de movimento: {e}")
+        return False
+
+
+def test_asgi_server():
+    """
+    Testa os endpoints da versão assíncrona da API sem abrir a câmera.
+    """
+    print("\n=== Testando Servidor ASGI ===")
+    
+    try:
+        import asyncio
+        import json
+        sys.path.insert(0, os.path.dirname(__file__))
+        import asgi_server
+        
+        async def call(method, path, query=b""):
+            sent = []
+            
+            async def receive():
+                return {"type": "http.request", "body": b"", "more_body": False}
+            
+            async def send(message):
+                sent.append(message)
+            
+            scope = {"type": "http", "method": method, "path": path, "query_string": query}
+            await asgi_server.app(scope, receive, send)
+            return sent[0]["status"], json.loads(sent[1]["body"])
+        
+        async def run():
+            status, body = await call("GET", "/api/health")
+            assert status == 200 and body["status"] == "healthy", f"health inválido: {body}"
+            print("✓ /api/health respondeu")
+            
+            # Long-poll sem novos resultados retorna após o tempo limite
+            status, body = await call("GET", "/api/detection", b"wait=0.05")
+            assert status == 200 and "version" in body, f"detecção inválida: {body}"
+            print("✓ /api/detection com long-poll respondeu")
+            
+            # Sem long-poll: o mesmo resultado do servidor Flask, inclusive o instante
+            # atualizado por frames que não chegam ao broadcaster
+            original_timestamp = asgi_server.core.face_detection_data["timestamp"]
+            asgi_server.core.face_detection_data["timestamp"] = 1234.5
+            status, body = await call("GET", "/api/detection")
+            expected = asgi_server.core.get_detection_payload()
+            asgi_server.core.face_detection_data["timestamp"] = original_timestamp
+            assert status == 200 and body == expected, f"detecção divergente: {body}"
+            print("✓ /api/detection sem long-poll igual ao do servidor Flask")
+            
+            status, body = await call("GET", "/api/stats", b"window=60&step=30")
+            assert status == 200 and len(body["occupancy_series"]) == 2, f"estatísticas inválidas: {body}"
+            status, _ = await call("GET", "/api/stats", b"window=abc")
+            assert status == 400, "janela inválida aceita"
+            print("✓ /api/stats respondeu")
+            
+            status, _ = await call("GET", "/api/inexistente")
+            assert status == 404, "rota inexistente não retornou 404"
+            print("✓ Rota inexistente retorna 404")
+            
+            # /api/status espera o lock da captura (aqui preso por 1 s) fora do event loop
+            import threading
+            held, release = threading.Event(), threading.Event()
+            
+            def hold_capture_lock():
+                with camera._capture_lock:
+                    held.set()
+                    release.wait(1.0)
+            
+            holder = threading.Thread(target=hold_capture_lock, daemon=True)
+            holder.start()
+            held.wait()
+            status_call = asyncio.ensure_future(call("GET", "/api/status"))
+            await asyncio.sleep(0.05)
+            started = time.perf_counter()
+            status, _ = await call("GET", "/api/health")
+            assert status == 200 and not status_call.done() and time.perf_counter() - started < 0.5, \
+                "health bloqueado pelo /api/status"
+            release.set()
+            status, body = await asyncio.wait_for(status_call, 2.0)
+            assert status == 200 and body["camera"]["width"] == 320, f"status inválido: {body}"
+            print("✓ /api/health responde enquanto /api/status espera a câmera")
+        
+        import tempfile
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "status.avi")
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (320, 240))
+            for _ in range(3):
+                writer.write(np.zeros((240, 320, 3), dtype=np.uint8))
+            writer.release()
+            camera = CameraManager(path, 320, 240)
+            assert camera.start_camera(), "câmera não iniciou"
+            asgi_server.core.camera_manager = camera
+            try:
+                asyncio.run(run())
+            finally:
+                asgi_server.core.camera_manager = None
+                camera.stop_camera()
+        asgi_server.broadcaster.detach()
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste do servidor ASGI: {e}")
+        return False
+
+
+def test_result_codec():
+    """
+    Testa a codificação binária dos resultados de detecção.
+    """
+    print("\n=== Testando Codificação Binária ===")
+    
+    try:
+        payload = {
+            "faces_detected": True,
+            "face_count": 2,
+            "timestamp": 1700000000.5,
+            "last_detection": {"count": 2, "timestamp": 1700000000.5},
+            "camera_active": True,
+            "sequence": 10,
+            "frame_size": [640, 480],
+            "faces": [
+                {"id": "Face_1", "confidence": 0.913, "bbox": [120, 80, 150, 160]},
+                {"id": "Face_2", "confidence": 0.654, "bbox": [-5, 300, 90, 100]}
+            ]
+        }
+        
+        assert negotiate("application/json, */*") == MIME_JSON, "JSON não é o padrão"
+        assert negotiate(MIME_BINARY) == MIME_BINARY, "formato binário não negociado"
+        
+        def same_faces(decoded_faces, faces):
+            # Confiança é quantizada em 1/255
+            return all(a["id"] == b["id"] and a["bbox"] == b["bbox"]
+                       and abs(a["confidence"] - b["confidence"]) <= 1 / 255
+                       for a, b in zip(decoded_faces, faces)) and len(decoded_faces) == len(faces)
+        
+        data = encode_binary(payload)
+        decoded = decode_binary(data)
+        assert same_faces(decoded["faces"], payload["faces"]), f"faces divergentes: {decoded['faces']}"
+        print(f"✓ Ida e volta binária ({len(data)} bytes)")
+        
+        # Delta: pequenos deslocamentos cabem em 1 byte por campo
+        moved = dict(payload, sequence=11, faces=[
+            {"id": "Face_1", "confidence": 0.913, "bbox": [123, 81, 150, 161]},
+            payload["faces"][1]
+        ])
+        delta = encode_binary(moved, previous=payload)
+        assert len(delta) < len(encode_binary(moved)), "delta não reduziu o tamanho"
+        assert same_faces(decode_binary(delta, previous=decoded)["faces"], moved["faces"]), "delta incorreto"
+        print(f"✓ Codificação em delta ({len(delta)} bytes)")
+        
+        # IDs de trilha crescem sem limite: acima de 65535 ainda cabem no binário
+        large = dict(moved, sequence=12, faces=[{"id": "Face_70000", "confidence": 0.8, "bbox": [1, 2, 3, 4]}])
+        assert decode_binary(encode_binary(large))["faces"][0]["id"] == "Face_70000"
+        large_delta = dict(large, sequence=13)
+        assert decode_binary(encode_binary(large_delta, previous=large),
+                             previous=decode_binary(encode_binary(large)))["faces"][0]["id"] == "Face_70000"
+        print("✓ ID Face_70000 no formato binário (inclusive em delta)")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste da codificação binária: {e}")
+        return False
+
+
+def test_event_publisher():
+    """
+    Testa a publicação de eventos com um cliente MQTT em memória e UDP local.
+    """
+    print("\n=== Testando Publicador de Eventos ===")
+    
+    try:
+        import json
+        import socket
+        
+        client = InProcessMqttClient(connected=False)
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.settimeout(1.0)
+        udp = UdpMulticastTransport("127.0.0.1", receiver.getsockname()[1])
+        publisher = EventPublisher([MqttTransport(client), udp])
+        
+        def payload(sequence, count):
+            return {"faces_detected": count > 0, "face_count": count, "camera_active": True,
+                    "sequence": sequence, "timestamp": float(sequence), "faces": []}
+        
+        # Broker fora do ar: presença fica no buffer, estado das faces é descartado
+        publisher.on_detection(payload(1, 1))
+        publisher.flush()
+        assert not client.messages, "mensagem enviada sem conexão"
+        
+        # Vários frames entre lotes viram um único evento de faces
+        client.connected = True
+        for sequence in range(2, 6):
+            publisher.on_detection(payload(sequence, 1))
+        publisher.on_detection(payload(6, 0))
+        publisher.flush()
+        
+        topics = [m['topic'] for m in client.messages]
+        assert topics == ["facial_recognition/presence", "facial_recognition/presence",
+                          "facial_recognition/faces"], f"tópicos inesperados: {topics}"
+        assert client.messages[0]['qos'] == 1 and client.messages[0]['payload']['present'], "presença incorreta"
+        print(f"✓ MQTT: {len(client.messages)} mensagens para 6 frames")
+        
+        datagram, _ = receiver.recvfrom(65536)
+        datagram, _ = receiver.recvfrom(65536)
+        events = json.loads(datagram)
+        assert [e['type'] for e in events] == ["presence", "faces"], f"lote UDP inesperado: {events}"
+        print("✓ UDP: lote recebido em um datagrama")
+        
+        publisher.stop()
+        receiver.close()
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste do publicador de eventos: {e}")
+        return False
+
+
+def test_face_quality():
+    """
+    Testa o rastreamento, a nota de qualidade e a seleção da melhor captura.
+    """
+    print("\n=== Testando Qualidade e Melhor Captura ===")
+    
+    try:
+        rng = np.random.default_rng(0)
+        sharp = rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)
+        blurred = cv2.GaussianBlur(sharp, (21, 21), 0)
+        
+        # IDs estáveis entre frames para a mesma face
+        tracker = FaceTracker()
+        face = {'id': 'Face_1', 'confidence': 0.9, 'bbox': (200, 150, 120, 140), 'center': (260, 220)}
+        first = tracker.update([dict(face)], now=0.0)[0]['track_id']
+        moved = dict(face, bbox=(205, 152, 120, 140))
+        assert tracker.update([moved], now=0.1)[0]['track_id'] == first, "ID mudou entre frames"
+        print("✓ ID estável entre frames")
+        
+        scorer = FaceQualityScorer()
+        sharp_quality = scorer.score(sharp, face)['quality']
+        blurred_quality = scorer.score(blurred, face)['quality']
+        tiny_quality = scorer.score(sharp, dict(face, bbox=(10, 10, 20, 20)))['quality']
+        cut_quality = scorer.score(sharp, dict(face, bbox=(-80, 150, 120, 140)))['quality']
+        assert sharp_quality > blurred_quality, "face borrada com nota maior"
+        assert tiny_quality == 0 and cut_quality == 0, "face pequena/cortada não descartada"
+        print(f"✓ Notas: nítida {sharp_quality:.2f}, borrada {blurred_quality:.2f}")
+        
+        # Só a melhor captura da janela segue para codificação
+        selector = BestShotSelector(window=1.0, min_quality=0.1)
+        shots = []
+        for i, image in enumerate([blurred, sharp, blurred]):
+            shots += selector.update(image, [dict(face, track_id=1)], now=i * 0.3)
+        shots += selector.update(blurred, [dict(face, track_id=1)], now=1.2)
+        assert len(shots) == 1 and abs(shots[0].quality - sharp_quality) < 1e-6, "melhor captura incorreta"
+        assert selector.update(blurred, [], ended_tracks=[1], now=1.3) == [], "janela vazia liberou captura"
+        print("✓ Uma captura por janela, a de maior nota")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste de qualidade: {e}")
+        return False
+
+
+def test_identity_cache():
+    """
+    Testa o cache de identidade por trilha sobre a galeria.
+    """
+    print("\n=== Testando Cache de Identidade ===")
+    
+    try:
+        rng = np.random.default_rng(1)
+        alice, bob = rng.random(256, dtype=np.float32), rng.random(256, dtype=np.float32)
+        
+        gallery = FaceGallery(threshold=0.6)
+        gallery.add("alice", alice)
+        gallery.add("bob", bob)
+        name, score = gallery.identify(alice + rng.normal(0, 0.01, 256).astype(np.float32))
+        assert name == "alice" and score > 0.9, "identificação incorreta"
+        print(f"✓ Galeria identifica 'alice' (similaridade {score:.2f})")
+        
+        cache = IdentityCache(gallery.identify, max_entries=2, ttl=5.0,
+                              reverify_interval=10.0, drift_threshold=0.8)
+        assert cache.get(1, now=0.0) is None, "trilha nova não deveria estar em cache"
+        cache.resolve(1, alice, now=0.0)
+        for i in range(1, 30):
+            assert cache.get(1, now=i * 0.1).identity == "alice", "identidade perdida"
+        # Mesma aparência: não consulta a galeria de novo
+        cache.resolve(1, alice, now=3.0)
+        assert gallery.identify_calls == 2, "galeria consultada sem necessidade"
+        # Aparência mudou: verifica de novo
+        assert cache.resolve(1, bob, now=3.1).identity == "bob", "deriva não reverificada"
+        stats = cache.get_stats()
+        assert stats['drift_reverifications'] == 1 and stats['hits'] == 29, "contadores incorretos"
+        print(f"✓ Taxa de acerto {stats['hit_rate']:.2f}, {stats['identifications']} identificações")
+        
+        # Trilha encerrada, TTL e limite LRU
+        cache.evict([1])
+        assert cache.get(1, now=3.2) is None, "trilha encerrada ainda em cache"
+        cache.resolve(2, alice, now=4.0)
+        assert cache.get(2, now=10.0) is None, "entrada expirada ainda em cache"
+        for track_id in (3, 4, 5):
+            cache.resolve(track_id, alice, now=11.0)
+        assert cache.get_stats()['entries'] == 2 and cache.get(3, now=11.0) is None, "LRU não respeitado"
+        print("✓ Remoção por fim de trilha, TTL e LRU")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste de cache de identidade: {e}")
+        return False
+
+
+def test_face_encoder():
+    """
+    Testa o alinhamento pelos landmarks e a codificação compacta.
+    """
+    print("\n=== Testando Codificador Alinhado ===")
+    
+    try:
+        rng = np.random.default_rng(2)
+        texture = cv2.resize(rng.integers(0, 255, (10, 10), dtype=np.uint8), (400, 400),
+                             interpolation=cv2.INTER_CUBIC)
+        other = cv2.resize(rng.integers(0, 255, (10, 10), dtype=np.uint8), (400, 400),
+                           interpolation=cv2.INTER_CUBIC)
+        image = cv2.cvtColor(texture, cv2.COLOR_GRAY2BGR)
+        landmarks = REFERENCE_SHAPE * 120 + 140
+        other_landmarks = landmarks + rng.normal(0, 3, landmarks.shape).astype(np.float32)
+        
+        # Mesma face girada e deslocada: os landmarks acompanham a imagem
+        M = cv2.getRotationMatrix2D((200, 200), 12, 1.1)
+        M[:, 2] += (8, -5)
+        rotated = cv2.warpAffine(image, M, (400, 400), borderMode=cv2.BORDER_REPLICATE)
+        rotated_landmarks = landmarks @ M[:, :2].T + M[:, 2]
+        
+        encoder = FaceEncoder()
+        chips, _, _ = encoder.align(image, [landmarks, rotated_landmarks])
+        assert chips.shape == (2, encoder.chip_size, encoder.chip_size), "recortes com formato incorreto"
+        
+        encodings = encoder.encode(image, [landmarks])
+        assert encodings.dtype == np.float16 and encodings.shape == (1, encoder.dimensions), "formato incorreto"
+        same = float(correlation(encodings, encoder.encode(rotated, [rotated_landmarks])[0])[0])
+        different = float(correlation(encodings, encoder.encode(other, [other_landmarks])[0])[0])
+        assert same > 0.95 and different < 0.5, "separação insuficiente"
+        print(f"✓ {encoder.dimensions} valores em {encodings.nbytes} bytes; "
+              f"mesma face {same:.2f}, outra {different:.2f}")
+        
+        assert encoder.encode_face(image, {'bbox': (0, 0, 10, 10)}) is None, "face sem landmarks codificada"
+        print("✓ Face sem landmarks ignorada")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste do codificador: {e}")
+        return False
+
+
+def test_gallery_storage():
+    """
+    Testa a galeria quantizada (int8/float16) contra o armazenamento float32.
+    """
+    print("\n=== Testando Galeria Quantizada ===")
+    
+    try:
+        rng = np.random.default_rng(3)
+        encodings = rng.standard_normal((2000, 204)).astype(np.float32)
+        names = [f"pessoa_{i}" for i in range(len(encodings))]
+        queries = encodings[:50] + rng.normal(0, 0.5, (50, 204)).astype(np.float32)
+        
+        galleries = {storage: FaceGallery(storage=storage, block_rows=256)
+                     for storage in ("float32", "float16", "int8")}
+        for gallery in galleries.values():
+            gallery.add_many(names, encodings)
+        
+        sizes = {storage: gallery.get_stats()['bytes'] for storage, gallery in galleries.items()}
+        assert sizes["int8"] * 3 < sizes["float32"] and sizes["float16"] * 2 == sizes["float32"], \
+            "armazenamento não reduziu a memória"
+        print(f"✓ Memória: float32 {sizes['float32']} B, float16 {sizes['float16']} B, int8 {sizes['int8']} B")
+        
+        for i, query in enumerate(queries):
+            expected = float(correlation(encodings[i], query)[0])
+            for storage, gallery in galleries.items():
+                name, score = gallery.search(query, 1)[0]
+                assert name == names[i], f"{storage}: candidato incorreto"
+                assert abs(score - expected) < 0.01, f"{storage}: similaridade imprecisa"
+        print("✓ Mesmo resultado que a correlação em float32")
+        
+        try:
+            galleries["int8"].add("outra", np.zeros(10))
+            return False
+        except ValueError:
+            print("✓ Codificação com dimensão diferente rejeitada")
+        
+        # Buscas concorrentes com inserções e remoções: nomes e códigos sempre da mesma versão
+        import threading
+        gallery = FaceGallery(storage="int8")
+        gallery.add_many(names[:100], encodings[:100])
+        stop = threading.Event()
+        
+        def churn():
+            while not stop.is_set():
+                gallery.add_many(["temporario"] * 50, encodings[100:150])
+                gallery.remove("temporario")
+        
+        writer = threading.Thread(target=churn, daemon=True)
+        writer.start()
+        try:
+            for i in range(300):
+                name, _ = gallery.search(encodings[i % 100], 1)[0]
+                assert name == names[i % 100], f"busca concorrente incorreta: {name}"
+        finally:
+            stop.set()
+            writer.join()
+        print("✓ Busca concorrente com add_many/remove")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste da galeria: {e}")
+        return False
+
+
+def test_enrollment():
+    """
+    Testa a deduplicação, a persistência da galeria e o cache da importação.
+    """
+    print("\n=== Testando Cadastro e Importação ===")
+    
+    try:
+        import tempfile
+        rng = np.random.default_rng(4)
+        
+        base = rng.standard_normal((3, 204)).astype(np.float32)
+        near = base[0] + rng.normal(0, 0.01, 204).astype(np.float32)
+        kept = deduplicate(np.vstack([base, near]), existing=None, threshold=0.99)
+        assert kept == [0, 1, 2], f"duplicata não removida: {kept}"
+        assert deduplicate(base[:1], existing=base[:1], threshold=0.99) == [], "duplicata da galeria mantida"
+        print("✓ Codificações quase idênticas descartadas")
+        
+        with tempfile.TemporaryDirectory() as root:
+            gallery = FaceGallery()
+            gallery.add_many(["ana", "ana", "bruno"], base)
+            path = os.path.join(root, "gallery.npz")
+            gallery.save(path)
+            loaded = FaceGallery.load(path)
+            assert loaded.names == gallery.names and loaded.search(base[2])[0][0] == "bruno", "galeria não restaurada"
+            print("✓ Galeria gravada e carregada")
+            
+            # Fotos sem faces: processadas uma vez, reaproveitadas na segunda importação
+            photos = os.path.join(root, "fotos", "ana")
+            os.makedirs(photos)
+            for i in range(3):
+                cv2.imwrite(os.path.join(photos, f"{i}.png"), rng.integers(0, 255, (64, 64, 3), dtype=np.uint8))
+            manifest = os.path.join(root, "gallery.manifest.npz")
+            
+            first = GalleryImporter(loaded, manifest_path=manifest, workers=1).run(os.path.join(root, "fotos"))
+            assert first.get("processed") == 3 and first.get("no_face") == 3, f"importação incorreta: {first}"
+            second = GalleryImporter(loaded, manifest_path=manifest, workers=1).run(os.path.join(root, "fotos"))
+            assert second.get("cached") == 3 and not second.get("processed"), f"manifesto ignorado: {second}"
+            print(f"✓ Reimportação usa o manifesto ({second['cached']} fotos em cache)")
+            
+            # Cada lote grava a galeria antes do manifesto: uma interrupção não perde fotos
+            gallery_path = os.path.join(root, "lotes.npz")
+            importer = GalleryImporter(FaceGallery(), manifest_path=os.path.join(root, "lotes.manifest.npz"),
+                                       gallery_path=gallery_path, workers=1)
+            importer._write_batch([("carla", base[1])], {"added": 0, "duplicate": 0})
+            assert FaceGallery.load(gallery_path).names == ["carla"], "lote não gravado na galeria"
+            print("✓ Galeria gravada junto com o manifesto a cada lote")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste de cadastro: {e}")
+        return False
+
+
+def test_presence_analytics():
+    """
+    Testa os agregados incrementais de presença contra uma varredura simples
+    do histórico, a expiração do buffer e a persistência.
+    """
+    print("\n=== Testando Estatísticas de Presença ===")
+    
+    try:
+        import tempfile
+        rng = np.random.default_rng(5)
+        analytics = PresenceAnalytics(retention=120, max_gap=1.0, exit_grace=0.5)
+        
+        # 300 s de resultados a 2 fps com 0 a 3 pessoas; retenção de 120 s
+        start, samples = 1_000_000.0, []
+        for i in range(600):
+            now = start + i * 0.5
+            count = int(rng.integers(0, 4)) if (i // 40) % 3 else 0
+            faces = [{"id": f"Face_{(i // 40) * 10 + k}"} for k in range(count)]
+            analytics.on_detection({"camera_active": True, "sequence": i, "timestamp": now, "faces": faces})
+            samples.append((now, count))
+        
+        end = samples[-1][0]
+        for window in (1, 10, 60, 120):
+            stats = analytics.stats(window, now=end)
+            recent = [c for t, c in samples if t >= int(end) - window + 1]
+            assert stats["frames"] == len(recent), f"frames incorretos na janela {window}: {stats['frames']}"
+            assert stats["peak_faces"] == max(recent), f"pico incorreto na janela {window}"
+        print("✓ Frames e picos iguais aos da varredura do histórico")
+        
+        stats = analytics.stats(60, now=end)
+        assert stats["entries"] > 0 and stats["exits"] > 0 and stats["max_dwell"] > 0, f"trilhas não contadas: {stats}"
+        assert analytics.stats(600, now=end)["window"] == 120, "janela além da retenção"
+        print(f"✓ Ocupação média {stats['mean_occupancy']}, {stats['entries']} entradas, "
+              f"permanência média {stats['mean_dwell']} s")
+        
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "presence.npz")
+            analytics.save(path)
+            restored = PresenceAnalytics(retention=120, path=path)
+            for window in (10, 120):
+                a, b = analytics.stats(window, now=end), restored.stats(window, now=end)
+                assert (a["frames"], a["peak_faces"], a["entries"]) == (b["frames"], b["peak_faces"], b["entries"]), \
+                    "histórico restaurado difere"
+            print(f"✓ Histórico gravado em {os.path.getsize(path)} bytes e restaurado")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste de estatísticas de presença: {e}")
+        return False
+
+
+def test_face_redactor():
+    """
+    Testa a anonimização das faces, a retenção das caixas após falhas de
+    detecção e o custo em 1080p.
+    """
+    print("\n=== Testando Anonimização de Faces ===")
+    
+    try:
+        rng = np.random.default_rng(6)
+        original = rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)
+        face = {"id": "Face_1", "bbox": (200, 150, 120, 120)}
+        
+        for mode in ("pixelate", "blur"):
+            redactor = FaceRedactor(mode=mode, padding=0.25, hold_frames=2)
+            frame = original.copy()
+            redactor.redact(frame, [face])
+            region = frame[150:270, 200:320].astype(np.float32)
+            # Textura destruída dentro da caixa, resto do frame intacto
+            assert region.std() < original[150:270, 200:320].std() / 3, f"{mode}: face ainda visível"
+            assert np.array_equal(frame[:100], original[:100]), f"{mode}: fora da face alterado"
+            
+            # Detecção perdida por dois frames: a caixa continua aplicada
+            for _ in range(2):
+                frame = original.copy()
+                redactor.redact(frame, [])
+                assert not np.array_equal(frame[150:270, 200:320], original[150:270, 200:320]), \
+                    f"{mode}: face exposta após falha de detecção"
+            frame = original.copy()
+            redactor.redact(frame, [])
+            assert np.array_equal(frame, original), f"{mode}: caixa mantida além do limite"
+        print("✓ Pixelização e desfoque cobrem a face e mantêm a caixa por 2 frames")
+        
+        try:
+            FaceRedactor(mode="invalido")
+            assert False, "modo inválido aceito"
+        except ValueError:
+            pass
+        
+        result = redaction_benchmark(frames=30)
+        assert result["ms_per_frame"] < 33.3, f"abaixo de 30 fps em 1080p: {result}"
+        print(f"✓ 1080p com {result['faces']} faces: {result['ms_per_frame']:.2f} ms por frame")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste de anonimização: {e}")
+        return False
+
+
+def test_clip_recorder():
+    """
+    Testa a gravação de clipes com pré/pós-gravação, a fusão de eventos
+    próximos e o limite de memória do buffer.
+    """
+    print("\n=== Testando Gravação de Clipes ===")
+    
+    try:
+        import glob
+        import tempfile
+        frame = np.random.default_rng(7).integers(0, 256, (120, 160, 3), dtype=np.uint8)
+        face = [{"id": "Face_1", "bbox": (40, 30, 50, 50)}]
+        
+        with tempfile.TemporaryDirectory() as root:
+            recorder = ClipRecorder(root, pre_roll=1.0, post_roll=1.0, record_fps=10)
+            recorder.start()
+            # 10 s a 30 fps: faces em 3-4 s e 4.5-5 s (um clipe) e em 8-8.2 s (outro)
+            for i in range(300):
+                second = i / 30
+                present = 3 <= second < 4 or 4.5 <= second < 5 or 8 <= second < 8.2
+                recorder.submit(frame, 1000.0 + second, face if present else [])
+                time.sleep(0.002)
+            recorder.stop()
+            
+            stats = recorder.get_stats()
+            clips = sorted(glob.glob(os.path.join(root, "*.avi")))
+            counts = [int(cv2.VideoCapture(path).get(cv2.CAP_PROP_FRAME_COUNT)) for path in clips]
+            assert stats["frames_sampled"] == 100, f"amostragem incorreta: {stats}"
+            assert len(clips) == 2 and stats["events_merged"] == 1, f"eventos não fundidos: {stats}"
+            # Pré (1 s) + evento (2 s) + pós (1 s) a 10 fps; depois pré + 0.2 s + pós
+            assert 38 <= counts[0] <= 43 and 20 <= counts[1] <= 25, f"clipes com {counts} frames"
+            print(f"✓ 2 clipes ({counts[0]} e {counts[1]} frames), eventos próximos fundidos")
+            
+            # Buffer limitado em bytes: frames antigos saem antes de completar a pré-gravação
+            small = ClipRecorder(root, pre_roll=10.0, record_fps=10, max_buffer_bytes=50000)
+            for i in range(40):
+                small._process(frame, 2000.0 + i / 10, [])
+            assert small.get_stats()["buffer_bytes"] <= 50000 and small.frames_evicted > 0, "buffer sem limite"
+            assert small.clips_written == 0, "clipe gravado sem evento"
+            print(f"✓ Buffer limitado a {small.get_stats()['buffer_bytes']} bytes")
+            
+            # Frames pulados pelo filtro de movimento (faces_info None) continuam anonimizados
+            redacted = ClipRecorder(root, record_fps=10, redactor=FaceRedactor(hold_frames=2))
+            written = []
+            redacted._put_frame = written.append
+            redacted._process(frame, 3000.0, face)
+            for i in range(1, 21):
+                redacted._process(frame, 3000.0 + i / 10, None)
+            last = cv2.imdecode(np.frombuffer(written[-1], np.uint8), cv2.IMREAD_COLOR)
+            region = last[30:80, 40:90].astype(np.float32)
+            original = frame[30:80, 40:90].astype(np.float32)
+            assert len(written) == 21 and np.abs(region - original).mean() > 20, "face exposta em frame pulado"
+            print("✓ Caixas mantidas reaplicadas em 20 frames sem detecção")
+            
+            # Disco lento: a fila de escrita é limitada e os excedentes são contados
+            slow = ClipRecorder(root, pre_roll=0.5, record_fps=10, write_queue_size=5)
+            for i in range(30):
+                slow._process(frame, 4000.0 + i / 10, face)
+            assert slow._writes.qsize() == 5 and slow.get_stats()["frames_write_dropped"] > 0
+            print(f"✓ Fila de escrita limitada ({slow.frames_write_dropped} frames descartados)")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste de gravação de clipes: {e}")
+        return False
+
+
+def test_detections():
+    """
+    Testa as operações vetorizadas sobre detecções: NMS, associação,
+    recorte ao frame e conversão para o formato do detector.
+    """
+    print("\n=== Testando Operações sobre Detecções ===")
+    
+    try:
+        boxes = np.array([[0, 0, 100, 100], [10, 10, 100, 100], [20, 20, 40, 40], [300, 300, 50, 50]],
+                         dtype=np.float32)
+        scores = np.array([0.6, 0.9, 0.8, 0.7], dtype=np.float32)
+        # IoU: a caixa interna pequena sobrevive; IoM: é engolida pela maior
+        assert nms(boxes, scores, 0.5).tolist() == [1, 2, 3], nms(boxes, scores, 0.5)
+        assert nms(boxes, scores, 0.5, metric='iom').tolist() == [1, 3]
+        assert len(nms(np.empty((0, 4)), np.empty(0))) == 0
+        assert np.isclose(iou_matrix(boxes[:1], boxes[1:2])[0, 0], 8100 / 11900)
+        print("✓ NMS por IoU e por interseção sobre a menor caixa")
+        
+        # Associação um-para-um: o par de maior IoU vence a disputa pela mesma trilha
+        overlaps = np.array([[0.9, 0.0], [0.8, 0.6], [0.0, 0.1]], dtype=np.float32)
+        rows, cols = match_boxes(overlaps, 0.3)
+        assert sorted(zip(rows.tolist(), cols.tolist())) == [(0, 0), (1, 1)]
+        assert len(match_boxes(np.zeros((0, 3)), 0.3)[0]) == 0
+        
+        clipped = clip_boxes([[-10, -5, 50, 50], [600, 400, 100, 100], [700, 500, 10, 10]], 640, 480)
+        assert clipped.tolist() == [[0, 0, 40, 45], [600, 400, 40, 80], [640, 480, 0, 0]]
+        print("✓ Associação gulosa e recorte ao frame")
+        
+        detections = empty_detections(2)
+        detections['box'] = [[10.4, 20.6, 30.2, 40.0], [100, 100, 51, 51]]
+        detections['score'] = [0.75, 0.5]
+        faces = to_faces_info(detections)
+        assert detections.dtype == DETECTION_DTYPE and detections['keypoints'].shape == (2, 6, 2)
+        assert faces[0] == {'id': 'Face_1', 'confidence': 0.75, 'bbox': (10, 21, 30, 40), 'center': (25, 41)}
+        assert faces[1]['bbox'] == (100, 100, 51, 51) and faces[1]['center'] == (125, 125)
+        assert all(isinstance(v, int) for v in faces[0]['bbox'])
+        print("✓ Detecções convertidas para o formato do detector")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste de detecções: {e}")
+        return False
+
+
+def test_multiscale_detection():
+    """
+    Testa a cobertura dos recortes e o processamento apenas dos recortes
+    com movimento.
+    """
+    print("\n=== Testando Detecção Multiescala ===")
+    
+    try:
+        detector = MultiScaleDetector(mode='tiled', tile_size=480, tile_overlap=0.25)
+        try:
+            tiles = detector.tile_layout(1920, 1080)
+            coverage = np.zeros((1080, 1920), dtype=bool)
+            for x0, y0, x1, y1 in tiles:
+                assert x1 - x0 == 480 and y1 - y0 == 480
+                coverage[y0:y1, x0:x1] = True
+            assert coverage.all(), "recortes não cobrem o frame"
+            assert detector.tile_layout(480, 360) == []
+            print(f"✓ {len(tiles)} recortes de 480 px cobrem um frame 1080p")
+            
+            rng = np.random.default_rng(7)
+            frame = rng.integers(40, 80, (1080, 1920, 3), dtype=np.uint8)
+            detector.detect(frame, now=0.0)
+            assert detector.tiles_processed == len(tiles)
+            
+            # Sem movimento nenhum recorte é reprocessado; movimento no canto só
+            # reprocessa os recortes que o contêm
+            detector.detect(frame, now=0.1)
+            assert detector.tiles_processed == len(tiles), detector.get_stats()
+            moved = frame.copy()
+            moved[:200, :200] = 220
+            detections = detector.detect(moved, now=0.2)
+            assert detector.tiles_processed == len(tiles) + 1, detector.get_stats()
+            assert detections.dtype == DETECTION_DTYPE
+            
+            # Recortes parados voltam a ser processados após o intervalo máximo
+            detector.detect(moved, now=5.0)
+            assert detector.tiles_processed == 2 * len(tiles) + 1, detector.get_stats()
+            print(f"✓ Apenas recortes com movimento processados: {detector.get_stats()}")
+        finally:
+            detector.close()
+        
+        try:
+            MultiScaleDetector(mode="invalido")
+            assert False, "modo inválido aceito"
+        except ValueError:
+            pass
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste de detecção multiescala: {e}")
+        return False
+
+
+def test_pipeline():
+    """
+    Testa a leitura da configuração do pipeline, a validação dos estágios e
+    a execução com um estágio em thread própria sobre um arquivo de vídeo.
+    """
+    print("\n=== Testando Pipeline Configurável ===")
+    
+    try:
+        import tempfile
+        with tempfile.TemporaryDirectory() as root:
+            toml_path = os.path.join(root, "pipeline.toml")
+            with open(toml_path, "w") as f:
+                f.write('[[api.stages]]\ntype = "source"\n\n'
+                        '[[api.stages]]\ntype = "detect"\nplacement = "thread"\nqueue_size = 1\ndrop = "block"\n\n'
+                        '[[gui.stages]]\ntype = "source"\n')
+            json_path = os.path.join(root, "pipeline.json")
+            with open(json_path, "w") as f:
+                f.write('{"stages": [{"type": "source"}, {"type": "publish"}]}')
+            
+            assert load_pipeline_config(toml_path, "api")[1] == {
+                "type": "detect", "placement": "thread", "queue_size": 1, "drop": "block"}
+            assert load_pipeline_config(toml_path, "gui") == [{"type": "source"}]
+            assert load_pipeline_config(json_path, "api")[1]["type"] == "publish"
+            print("✓ Configuração lida de TOML (seções por ponto de entrada) e JSON")
+            
+            services = {"camera": object(), "detector": object(), "publish": lambda item: None}
+            for stages in ([{"type": "detect"}],
+                           [{"type": "source"}, {"type": "desconhecido"}],
+                           [{"type": "source"}, {"type": "encode"}],
+                           [{"type": "source"}, {"type": "detect", "placement": "process"}],
+                           [{"type": "source"}, {"type": "detect", "drop": "aleatorio"}],
+                           [{"type": "source"}, {"type": "detect", "limite": 3}]):
+                try:
+                    build_pipeline(stages, services)
+                    assert False, f"configuração inválida aceita: {stages}"
+                except ValueError:
+                    pass
+            print("✓ Estágios, serviços e políticas inválidos recusados")
+            
+            path = os.path.join(root, "pipeline.avi")
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (320, 240))
+            for i in range(20):
+                frame = np.full((240, 320, 3), 60, dtype=np.uint8)
+                cv2.circle(frame, (40 + i * 12, 120), 20, (255, 255, 255), -1)
+                writer.write(frame)
+            writer.release()
+            
+            camera = CameraManager(path, 320, 240)
+            detector = FaceDetector()
+            published = []
+            assert camera.start_camera(), "arquivo de vídeo não abriu"
+            stages = [{"type": "source"},
+                      {"type": "detect", "placement": "thread", "queue_size": 1, "drop": "block"}] + \
+                DEFAULT_PIPELINES["gui"][2:]
+            pipeline = build_pipeline(stages, {"camera": camera, "detector": detector,
+                                               "publish": published.append})
+            pipeline.start()
+            try:
+                while pipeline.step():
+                    pass
+                deadline = time.time() + 5.0
+                while len(published) < 20 and time.time() < deadline:
+                    time.sleep(0.01)
+                stats = pipeline.get_stats()
+            finally:
+                pipeline.stop()
+                camera.stop_camera()
+                detector.release()
+            
+            # 'block': nenhum frame perdido, na ordem de captura, desenhados pelo render
+            assert [item.sequence for item in published] == list(range(1, 21)), \
+                [item.sequence for item in published]
+            assert all(item.faces_info is not None and item.annotated is not None for item in published)
+            detect = next(stage for stage in stats["stages"] if stage["type"] == "detect")
+            assert detect["placement"] == "thread" and detect["processed"] == 20 and detect["dropped"] == 0, stats
+            print(f"✓ 20 frames pelo pipeline com detecção em thread: "
+                  f"{detect['avg_ms']:.2f} ms por detecção")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste do pipeline: {e}")
+        return False
+
+
+class ScriptedCamera:
+    """
+    Câmera de teste com a semântica de frame mais recente: entrega um frame a
+    cada `interval` segundos e conta como perdidos os que o consumidor não leu.
+    """
+    
+    def __init__(self, interval=0.0):
+        self.interval = interval
+        self.frame = np.zeros((120, 160, 3), dtype=np.uint8)
+        self.frames_skipped = 0
+        self.last_frame_time = None
+        self._start = None
+        self._tick = 0
+    
+    def read_frame(self):
+        if self.interval > 0:
+            now = time.monotonic()
+            if self._start is None:
+                self._start = now
+            tick = max(int((now - self._start) / self.interval) + 1, self._tick + 1)
+            time.sleep(max(0.0, self._start + tick * self.interval - time.monotonic()))
+            self.frames_skipped += tick - self._tick - 1
+            self._tick = tick
+        self.last_frame_time = time.time()
+        return True, self.frame
+
+
+class ScriptedDetector:
+    """
+    Detector de teste: faces de um roteiro (ou nenhuma) e custo simulado, com
+    e sem o FaceMesh.
+    """
+    
+    def __init__(self, script=None, cost=0.0, cost_without_mesh=0.0):
+        self.script = list(script or [])
+        self.cost = cost
+        self.cost_without_mesh = cost_without_mesh
+        self.tracker = FaceTracker(max_age=0.0)
+        self.calls_without_mesh = 0
+    
+    def analyze(self, frame, landmarks=True):
+        if not landmarks:
+            self.calls_without_mesh += 1
+        time.sleep(self.cost if landmarks else self.cost_without_mesh)
+        boxes = self.script.pop(0) if self.script else []
+        faces_info = [{"id": f"Face_{i + 1}", "confidence": 0.9, "bbox": box,
+                       "center": (box[0] + box[2] // 2, box[1] + box[3] // 2)}
+                      for i, box in enumerate(boxes)]
+        return faces_info, []
+
+
+def test_overload():
+    """
+    Testa as políticas de descarte, a degradação por prioridade e a latência
+    do pipeline sob o dobro da carga que ele consegue processar.
+    """
+    print("\n=== Testando Sobrecarga do Pipeline ===")
+    
+    try:
+        # keep_new_tracks: com a fila cheia de frames que trazem trilhas novas, o
+        # frame que só continua uma trilha é descartado e entrega as encerradas
+        box_a, box_b = (10, 10, 40, 40), (100, 60, 40, 40)
+        detector = ScriptedDetector([[box_a], [box_b], [box_b], []])
+        published = []
+        pipeline = build_pipeline([{"type": "source"}, {"type": "detect"}, {"type": "track"},
+                                   {"type": "publish", "placement": "thread", "queue_size": 2,
+                                    "drop": "keep_new_tracks"}],
+                                  {"camera": ScriptedCamera(), "detector": detector, "publish": published.append})
+        for _ in range(4):
+            time.sleep(0.002)
+            pipeline.step()
+        pipeline.start()
+        deadline = time.time() + 2.0
+        while len(published) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        publish = pipeline.get_stats()["stages"][-1]
+        pipeline.stop()
+        assert [item.sequence for item in published] == [1, 2], [item.sequence for item in published]
+        first = published[0].faces_info[0]["track_id"]
+        assert publish["dropped"] == 2 and sorted(published[1].ended_tracks) == [first, first + 1], \
+            (publish, published[1].ended_tracks)
+        print("✓ keep_new_tracks preserva frames com trilhas novas e não perde trilhas encerradas")
+        
+        # Antes do rastreamento nenhum frame traz trilhas novas: a política seria drop_oldest
+        try:
+            build_pipeline([{"type": "source"}, {"type": "detect", "placement": "thread", "drop": "keep_new_tracks"},
+                            {"type": "track"}, {"type": "publish"}],
+                           {"camera": ScriptedCamera(), "detector": detector, "publish": published.append})
+            return False
+        except ValueError:
+            print("✓ keep_new_tracks antes do estágio track rejeitado")
+        
+        services = {"camera": object(), "detector": object(), "publish": lambda item: None}
+        for stages in ([{"type": "source"}, {"type": "track", "shed_priority": 1}],
+                       [{"type": "source"}, {"type": "publish", "drop": "keep_all"}]):
+            try:
+                build_pipeline(stages, services)
+                assert False, f"configuração inválida aceita: {stages}"
+            except ValueError:
+                pass
+        
+        # Degradação em ordem de prioridade, restauração com folga e espera dobrada na recaída
+        services["best_shot"] = object()
+        stages = [PublishStage(services), DetectStage(services), EncodeStage(services)]
+        controller = OverloadController(stages, max_latency=0.1, evaluate_interval=0.5, recovery_time=2.0)
+        controller.evaluate(0.0, 0, 0, 0)
+        controller.observe_latency(0.3)
+        controller.evaluate(0.5, 10, 0, 0)
+        # A malha é consumida pela codificação: a codificação degrada primeiro
+        assert controller.state == "overloaded" and stages[2].shedding and not stages[1].shedding
+        # A avaliação seguinte a uma mudança só recomeça a contagem
+        controller.evaluate(1.0, 15, 0, 5)
+        controller.evaluate(1.5, 20, 0, 10)
+        assert controller.get_stats()["shed"] == ["encoding", "mesh"]
+        for _ in range(30):
+            controller.observe_latency(0.01)
+        controller.evaluate(2.0, 40, 0, 10)
+        controller.evaluate(2.5, 60, 0, 10)
+        assert controller.state == "shedding" and controller.level == 2
+        controller.evaluate(4.5, 110, 0, 10)
+        assert controller.level == 1 and not stages[1].shedding and stages[2].shedding
+        controller.evaluate(5.0, 120, 0, 10)
+        controller.evaluate(5.5, 130, 2, 10)
+        stats = controller.get_stats()
+        assert stats["level"] == 2 and stats["recovery_time"] == 4.0 and stats["restore_events"] == 1, stats
+        print("✓ Estágios degradados por prioridade e restaurados com histerese")
+        
+        # Codificação que nunca degrada protege a malha; frames pulados só contam se configurado
+        protected = OverloadController([DetectStage(services), EncodeStage(services, shed_priority=0),
+                                        PublishStage(services)], max_latency=0.1)
+        assert protected.get_stats()["sheddable"] == ["streaming"] and protected.protected == ["mesh"]
+        for skip_limit, expected in ((None, "normal"), (0.1, "overloaded")):
+            skipping = OverloadController([PublishStage(services)], max_latency=0.1, max_skip_ratio=skip_limit)
+            skipping.evaluate(0.0, 0, 0, 0)
+            skipping.evaluate(0.5, 10, 0, 20)
+            assert skipping.state == expected, (skip_limit, skipping.get_stats())
+        print("✓ Malha protegida pela codificação; frames pulados na câmera não são sobrecarga por padrão")
+        
+        # Streaming degradado: só os consumidores de streaming deixam de receber o frame
+        import api_server
+        received = {"analytics": 0, "stream": 0}
+        analytics = lambda payload: received.__setitem__("analytics", received["analytics"] + 1)
+        stream = lambda payload: received.__setitem__("stream", received["stream"] + 1)
+        api_server.detection_listeners.append(analytics)
+        api_server.stream_listeners.append(stream)
+        try:
+            for streamed in (True, False, False):
+                item = PipelineFrame(np.zeros((48, 64, 3), np.uint8), time.time(), 0)
+                item.faces_info, item.stream = [], streamed
+                api_server.publish_result(item)
+        finally:
+            api_server.detection_listeners.remove(analytics)
+            api_server.stream_listeners.remove(stream)
+        assert received == {"analytics": 3, "stream": 1}, received
+        print("✓ Análise de presença recebe todos os frames com o streaming degradado")
+        
+        # 2x de sobrecarga: câmera a 50 fps, detecção com malha a 40 ms (12 ms sem malha)
+        results = {}
+        for shedding in (False, True):
+            camera = ScriptedCamera(interval=0.02)
+            detector = ScriptedDetector(cost=0.04, cost_without_mesh=0.012)
+            latencies = []
+            pipeline = build_pipeline(
+                [{"type": "source"}, {"type": "detect"}, {"type": "track"}, {"type": "publish"}],
+                {"camera": camera, "detector": detector,
+                 "publish": lambda item: latencies.append(time.time() - item.timestamp)},
+                overload={"max_latency": 0.1, "evaluate_interval": 0.2, "recovery_time": 1.0,
+                          "max_skip_ratio": 0.1, "shedding": shedding})
+            started = time.time()
+            while time.time() - started < 2.0:
+                pipeline.step()
+            results[shedding] = (len(latencies) / (time.time() - started), max(latencies),
+                                 pipeline.get_stats()["overload"])
+            pipeline.stop()
+        
+        plain_fps, plain_latency, plain_stats = results[False]
+        shed_fps, shed_latency, shed_stats = results[True]
+        assert plain_stats["state"] == "overloaded" and plain_stats["level"] == 0, plain_stats
+        assert shed_stats["shed_events"] >= 1 and shed_fps > plain_fps * 1.3, (plain_fps, shed_fps, shed_stats)
+        assert plain_latency < 0.1 and shed_latency < 0.1, (plain_latency, shed_latency)
+        print(f"✓ 2x de sobrecarga: {plain_fps:.0f} fps sem degradação ({plain_stats['state']}), "
+              f"{shed_fps:.0f} fps com a malha degradada; latência máxima {shed_latency * 1000:.0f} ms")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste de sobrecarga: {e}")
+        return False
+
+
+def test_profiler():
+    """
+    Testa o profiler por amostragem: pilhas colapsadas por thread, parada
+    automática e os endpoints /api/profile/start|stop.
+    """
+    print("\n=== Testando Profiler por Amostragem ===")
+    
+    try:
+        import threading
+        
+        assert thread_label("Thread-12 (process_request_thread)") == "process_request_thread"
+        assert thread_label("detection-tile_3") == "detection-tile"
+        assert thread_label("camera-capture") == "camera-capture"
+        
+        done = threading.Event()
+        
+        def busy_inference():
+            while not done.is_set():
+                sum(i * i for i in range(2000))
+        
+        worker = threading.Thread(target=busy_inference, name="pipeline-detect", daemon=True)
+        worker.start()
+        profiler = SamplingProfiler(rate=200)
+        assert profiler.start() and not profiler.start()
+        time.sleep(0.5)
+        collapsed = profiler.stop()
+        done.set()
+        worker.join()
+        
+        stats = profiler.get_stats()
+        stacks = [line.rpartition(" ") for line in collapsed.splitlines()]
+        assert all(count.isdigit() for _, _, count in stacks)
+        inference = [stack for stack, _, _ in stacks if stack.startswith("pipeline-detect;")]
+        assert inference and any("busy_inference (test_app.py:" in stack for stack in inference), collapsed[:500]
+        assert not any(stack.startswith("sampling-profiler") for stack, _, _ in stacks)
+        assert stats["samples"] > 20 and not stats["running"] and stats["threads"]["pipeline-detect"] > 0, stats
+        print(f"✓ {stats['samples']} amostras, {stats['stacks']} pilhas; "
+              f"{stats['sample_ms']:.3f} ms por amostra")
+        
+        profiler.start(duration=0.1)
+        time.sleep(0.3)
+        assert not profiler.running
+        print("✓ Parada automática após a duração máxima")
+        
+        import api_server
+        client = api_server.app.test_client()
+        assert client.post("/api/profile/start", json={"rate": 0}).status_code == 400
+        # Duração nula ou negativa não desativa o limite; acima dele é reduzida ao máximo
+        assert client.post("/api/profile/start", json={"duration": 0}).status_code == 400
+        assert client.post("/api/profile/start", json={"duration": -1}).status_code == 400
+        limited = SamplingProfiler(max_duration=0.1)
+        assert limited.start(duration=3600)
+        time.sleep(0.5)
+        assert not limited.running, "duração acima de max_duration não foi limitada"
+        response = client.post("/api/profile/start", json={"rate": 100, "duration": 5})
+        assert response.status_code == 200 and response.get_json()["profiler"]["running"]
+        assert client.post("/api/profile/start").status_code == 400
+        time.sleep(0.2)
+        response = client.post("/api/profile/stop")
+        assert response.status_code == 200 and response.mimetype == "text/plain"
+        assert "MainThread;" in response.get_data(as_text=True)
+        assert not api_server.get_status_payload()["profiler"]["running"]
+        print("✓ /api/profile/start e /api/profile/stop (pilhas colapsadas em text/plain)")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste do profiler: {e}")
+        return False
+
+
+def test_memory_monitor():
+    """
+    Testa a contabilidade de memória: grafos nativos liberados por
+    update_parameters, escalonamento do orçamento, tracemalloc, reciclagem
+    do pool e um teste de resistência curto.
+    """
+    print("\n=== Testando Monitor de Memória ===")
+    
+    try:
+        assert rss_bytes() > 0
+        
+        before = native_graph_counts()["open"]
+        detector = FaceDetector()
+        created = native_graph_counts()["open"] - before
+        for i in range(5):
+            detector.update_parameters(min_detection_confidence=0.5 + 0.05 * i,
+                                       min_tracking_confidence=0.5 + 0.05 * i)
+        assert native_graph_counts()["open"] - before == created == 2, native_graph_counts()
+        detector.release()
+        assert native_graph_counts()["open"] == before
+        print("✓ update_parameters fecha os grafos substituídos (2 abertos por detector)")
+        
+        calls = []
+        monitor = MemoryMonitor(budget_bytes=1, check_interval=10.0,
+                                recycle=lambda: calls.append("recycle"),
+                                restart=lambda: calls.append("restart"))
+        assert monitor.check(now=0.0) == "recycle"
+        assert monitor.check(now=5.0) is None
+        assert monitor.check(now=25.0) == "restart" and monitor.check(now=50.0) == "restart"
+        monitor.budget_bytes = 1 << 50
+        assert monitor.check(now=80.0) is None and monitor._level == 0
+        stats = monitor.get_stats()
+        assert calls == ["recycle", "restart", "restart"] and stats["actions"] == {"recycle": 1, "restart": 2}
+        print("✓ Orçamento excedido: reciclagem, depois reinício, com intervalo entre ações")
+        
+        assert monitor.start_tracing(5)
+        leak = [bytes(1024) for _ in range(2000)]
+        top = monitor.top_allocations(5)
+        monitor.stop_tracing()
+        assert top and top[0]["location"].startswith("test_app.py:") and top[0]["size_diff_kb"] >= 1900, top
+        assert len(leak) == 2000 and monitor.top_allocations() == []
+        print(f"✓ tracemalloc sob demanda: {top[0]['location']} +{top[0]['size_diff_kb']:.0f} KB")
+        
+        class Disposable:
+            released = 0
+            
+            def release(self):
+                Disposable.released += 1
+        
+        pool = DetectorPool(size=1, factory=Disposable)
+        pool.warm_up()
+        assert pool.recycle() == 1 and Disposable.released == 1
+        assert pool.get_stats()["created"] == 2 and pool.get_stats()["recycled"] == 1
+        
+        # Detector recriado: IDs de trilha nunca se repetem e as trilhas do antigo saem dos caches
+        import api_server
+        face = {"id": "Face_1", "confidence": 0.9, "bbox": (10, 10, 50, 50)}
+        old, new = FaceTracker(), FaceTracker()
+        old_id = old.update([dict(face)], now=0.0)[0]["track_id"]
+        assert new.update([dict(face)], now=0.0)[0]["track_id"] != old_id
+        
+        class Retired:
+            tracker = old
+        
+        api_server.identity_cache.resolve(old_id, np.ones(8, np.float32), now=time.time())
+        api_server.retire_tracks(Retired())
+        assert api_server.identity_cache.get(old_id) is None and not old.tracks and old.ended_tracks == [old_id]
+        
+        # Um /api/stop durante o reinício do orçamento não é desfeito pela retomada
+        calls = []
+        original_start, original_recycle = api_server.start_face_detection, api_server.recycle_detectors
+        api_server.start_face_detection = lambda: calls.append("start")
+        api_server.recycle_detectors = lambda: api_server.stop_face_detection()
+        try:
+            api_server.detection_active.set()
+            api_server.restart_detection()
+        finally:
+            api_server.start_face_detection, api_server.recycle_detectors = original_start, original_recycle
+        assert calls == [] and not api_server.detection_active.is_set()
+        print("✓ IDs de trilha únicos, trilhas retiradas dos caches e stop respeitado no reinício")
+        
+        
+        result = soak(cycles=20, sample_every=5)
+        assert result["open_graphs"] == 2, result
+        print(f"✓ {result['cycles']} ciclos iniciar/parar: RSS {result['rss_warm_mb']:.0f} MB -> "
+              f"{result['rss_end_mb']:.0f} MB, {result['open_graphs']} grafos abertos")
+        
+        # Recortes sem pool: cada ciclo roda em uma thread nova e não pode abrir outro grafo
+        # (sem update_parameters, que recriaria os grafos e esconderia o acúmulo)
+        result = soak(cycles=10, sample_every=5, update_parameters=False, detection_mode="tiled")
+        assert result["open_graphs"] == 2, result
+        print(f"✓ {result['cycles']} ciclos no modo tiled: {result['open_graphs']} grafos abertos")
+        
+        # Liberação com a thread de detecção ativa: o lock não espera a thread,
+        # que devolve câmera e detector ao pool quando termina o frame atual
+        import tempfile
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "api.avi")
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (320, 240))
+            for i in range(300):
+                writer.write(np.full((240, 320, 3), i % 255, dtype=np.uint8))
+            writer.release()
+            
+            original_source = api_server.CAMERA_SOURCE
+            api_server.CAMERA_SOURCE = path
+            try:
+                assert api_server.start_face_detection(), "detecção não iniciada"
+                time.sleep(0.3)
+                thread = api_server.detection_thread
+                idle = api_server.detector_pool.idle_count()
+                with api_server.state_lock:
+                    api_server.release_resources()
+                    assert thread.is_alive() and thread.retired, "liberação esperou a thread"
+                api_server.wait_retired_thread()
+                assert not thread.is_alive() and thread.finished and not thread.retired
+                assert api_server.detector_pool.idle_count() == idle + 1, "detector não voltou ao pool"
+            finally:
+                api_server.CAMERA_SOURCE = original_source
+        print("✓ Detector devolvido ao pool pela thread ao terminar, sem esperar sob o lock")
+        
+        # Fim do vídeo: a detecção termina sozinha em vez de repetir leituras falhas
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "curto.avi")
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (320, 240))
+            for i in range(5):
+                writer.write(np.full((240, 320, 3), i * 40, dtype=np.uint8))
+            writer.release()
+            
+            original_source = api_server.CAMERA_SOURCE
+            api_server.CAMERA_SOURCE = path
+            try:
+                assert api_server.start_face_detection(), "detecção não iniciada"
+                thread = api_server.detection_thread
+                thread.join(timeout=5.0)
+                assert not thread.is_alive(), "detecção continuou após o fim do vídeo"
+                assert not api_server.face_detection_data["camera_active"] and api_server.camera_manager is None
+            finally:
+                api_server.CAMERA_SOURCE = original_source
+        print("✓ Fim do vídeo encerra a detecção e libera a câmera")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste do monitor de memória: {e}")
+        return False
+
+
+def test_reid_fusion():
+    """
+    Testa a fusão entre câmeras: mesma pessoa em várias câmeras contada uma
+    vez, exclusão por câmera, presença, expiração, união de identidades,
+    o estágio 'fuse' e os endpoints /api/fusion.
+    """
+    print("\n=== Testando Fusão entre Câmeras ===")
+    
+    try:
+        rng = np.random.default_rng(0)
+        people = rng.normal(size=(5, 204)).astype(np.float32)
+        
+        def shot(person, noise=0.5):
+            return people[person] + rng.normal(size=204).astype(np.float32) * noise
+        
+        events = []
+        fusion = CrossCameraFusion(window=30.0, presence_timeout=5.0)
+        fusion.listeners.append(events.append)
+        seen = {"A": [0, 1], "B": [1, 2], "C": [2, 3, 0]}
+        for camera, persons in seen.items():
+            fusion.update(camera, [(person, shot(person)) for person in persons], now=100.0)
+        counts = fusion.counts()
+        assert counts["present"] == 4 and counts["tracks"] == 7, counts
+        assert fusion.global_id("A", 0) == fusion.global_id("C", 0) != fusion.global_id("A", 1)
+        assert events[-1]["type"] == "unique_presence" and events[-1]["present"] == 4
+        print(f"✓ 3 câmeras, {counts['tracks']} trilhas: {counts['present']} pessoas únicas")
+        
+        # Duas trilhas vivas na mesma câmera são pessoas diferentes
+        fusion.update("A", [(9, shot(0))], now=101.0)
+        assert fusion.global_id("A", 9) not in (fusion.global_id("A", 0), None)
+        fusion.update("A", [], ended_tracks=[0, 1, 9], now=102.0)
+        assert fusion.counts()["present"] == 4 and "A" not in fusion.counts()["cameras"]
+        
+        # Trilhas sem atualização deixam de estar presentes; depois da janela, tudo expira
+        fusion.update("B", [(1, None), (2, None)], now=106.0)
+        fusion.sweep(now=108.0)
+        assert fusion.counts()["present"] == 2 and events[-1]["present"] == 2
+        fusion.sweep(now=200.0)
+        stats = fusion.get_stats()
+        assert stats["present"] == stats["seen"] == stats["tracked"] == 0 and stats["identities_evicted"] == 5
+        print("✓ Exclusão por câmera, trilhas encerradas, presença e expiração")
+        
+        # Capturas ruins fundam duas identidades; com capturas boas os centróides convergem e se unem
+        merged = CrossCameraFusion()
+        merged.update("A", [(1, shot(4, 1.5))], now=0.0)
+        merged.update("B", [(1, shot(4, 1.5))], now=0.0)
+        assert merged.counts()["present"] == 2
+        for t in range(1, 10):
+            merged.update("A", [(1, shot(4, 0.3))], now=float(t))
+            merged.update("B", [(1, shot(4, 0.3))], now=float(t))
+        assert merged.counts()["present"] == 1 and merged.merges == 1
+        assert merged.global_id("A", 1) == merged.global_id("B", 1)
+        print("✓ Identidades que convergem são unidas")
+        
+        bounded = CrossCameraFusion(max_identities=8, max_tracks=16)
+        for t in range(100):
+            bounded.update(str(t % 4), [(t, rng.normal(size=204))], now=float(t))
+        stats = bounded.get_stats()
+        assert stats["tracked"] <= 16 and stats["seen"] <= 8 and stats["identities_forced_out"] > 0, stats
+        
+        result = fusion_simulate(cameras=24, people=120, seconds=120.0)
+        assert result["fused_error"] < 0.5 and result["summed_error"] > 10 * result["fused_error"], result
+        print(f"✓ Simulação ({result['cameras']} câmeras): erro médio {result['fused_error']:.2f} "
+              f"(soma das câmeras {result['summed_error']:.1f}), {result['update_ms_mean']:.3f} ms por atualização")
+        
+        stage_fusion = CrossCameraFusion()
+        stage = FuseStage({"fusion": stage_fusion, "camera_id": "porta"})
+        item = PipelineFrame(np.zeros((10, 10, 3), np.uint8), 50.0, 1)
+        item.faces_info = [{"id": "Face_1", "track_id": 7}, {"id": "Face_2", "track_id": 8}]
+        
+        class Shot:
+            track_id = 7
+        
+        item.shots = [(Shot(), shot(1))]
+        assert stage.process(item)
+        assert item.faces_info[0]["global_id"] == stage_fusion.global_id("porta", 7)
+        assert "global_id" not in item.faces_info[1]
+        
+        # Codificação recusada: contada no estágio, sem interromper o pipeline nem alterar a fusão
+        bad = PipelineFrame(np.zeros((10, 10, 3), np.uint8), 51.0, 2)
+        bad.faces_info = [{"id": "Face_3", "track_id": 9}]
+        Shot.track_id = 9
+        bad.shots = [(Shot(), np.full(204, np.nan, np.float32))]
+        assert stage.process(bad) and stage.errors == 1 and stage_fusion.global_id("porta", 9) is None
+        bad.shots = [(Shot(), np.ones(3, np.float32))]
+        assert stage.process(bad) and stage.errors == 2
+        stage_fusion.clear()
+        assert stage_fusion.dimensions is None
+        assert CrossCameraFusion(dimensions=204).dimensions == 204
+        assert any(spec["type"] == "fuse" for spec in DEFAULT_PIPELINES["api"])
+        print("✓ Estágio 'fuse' anexa o ID global às faces")
+        
+        import api_server
+        client = api_server.app.test_client()
+        api_server.fusion.clear()
+        assert client.post("/api/fusion/tracks", json={"tracks": []}).status_code == 400
+        assert client.post("/api/fusion/tracks", json={"camera_id": "x", "tracks": [{"track_id": [1]}]}).status_code == 400
+        # A câmera local não pode ser alimentada nem ter trilhas encerradas por um envio remoto
+        assert client.post("/api/fusion/tracks", json={"camera_id": api_server.CAMERA_ID, "ended": [1]}).status_code == 400
+        assert client.post("/api/fusion/tracks", json={
+            "camera_id": "x", "ended": list(range(api_server.MAX_FUSION_TRACKS_PER_REQUEST + 1))}).status_code == 400
+        for encoding in ([1.0, 2.0, 3.0], [float("nan")] * 204):
+            response = client.post("/api/fusion/tracks", json={
+                "camera_id": "x", "tracks": [{"track_id": 1, "encoding": encoding}]})
+            assert response.status_code == 400, response.get_json()
+        assert api_server.fusion.dimensions == 204 and api_server.fusion.counts()["tracks"] == 0
+        for camera in ("entrada", "corredor"):
+            response = client.post("/api/fusion/tracks", json={
+                "camera_id": camera, "tracks": [{"track_id": 1, "encoding": shot(3).tolist()}]})
+            assert response.status_code == 200
+        body = client.get("/api/fusion").get_json()
+        assert body["present"] == 1 and body["tracks"] == 2, body
+        assert api_server.get_status_payload()["fusion"]["present"] == 1
+        api_server.fusion.clear()
+        print("✓ POST /api/fusion/tracks e GET /api/fusion")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Erro no teste da fusão entre câmeras: {e}")
+        return False
+
+
 def test_imports():
     """
     Testa se todas as dependências estão instaladas corretamente.
@@ -130,7 +1691,29 @@ def main():
     tests = [
         test_imports,
         test_face_detector,
-        test_camera_manager
+        test_camera_manager,
+        test_camera_capture,
+        test_synchronized_capture,
+        test_detector_pool,
+        test_motion_gate,
+        test_asgi_server,
+        test_result_codec,
+        test_event_publisher,
+        test_face_quality,
+        test_identity_cache,
+        test_face_encoder,
+        test_gallery_storage,
+        test_enrollment,
+        test_presence_analytics,
+        test_face_redactor,
+        test_clip_recorder,
+        test_detections,
+        test_multiscale_detection,
+        test_pipeline,
+        test_overload,
+        test_profiler,
+        test_memory_monitor,
+        test_reid_fusion
     ]
     
     passed = 0